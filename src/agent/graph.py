@@ -3,15 +3,51 @@ This module defines the stateful, multi-step workflow using LangGraph.
 It orchestrates the autonomous QA process from test generation to bug reporting.
 """
 
-import json
+import asyncio
 import os
-from typing import TypedDict, List, Annotated
+import orjson
+import httpx
+from typing import TypedDict, List, Annotated, Dict, Any, Optional
 from langgraph.graph import StateGraph, END
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, ToolMessage, HumanMessage
+from langchain_core.messages import AIMessageChunk, SystemMessage, ToolMessage, HumanMessage
 from langchain_community.vectorstores import Qdrant
 from langchain_openai import OpenAIEmbeddings
 from .tools import create_test_suite, execute_playwright_test, create_jira_ticket
+from ..rag.cache import SemanticCache, FuzzyTextCache
+from ..rag.centroids import (
+    CENTROID_COLLECTION, CENTROID_MIN_POINTS, SOURCE_COLLECTION, centroid_alias_exists
+)
+
+class _JsonObjectScanner:
+    """Incrementally detects when a streamed JSON object is syntactically complete"""
+    
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+    
+    def feed(self, text: str) -> bool:
+        """Consume the next fragment; returns True once the top-level object closes"""
+        for char in text:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+                self.started = True
+            elif char == "}":
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    return True
+        return False
 
 # Define the state for our graph
 class AgentState(TypedDict):
@@ -20,21 +56,62 @@ class AgentState(TypedDict):
     test_suite: List[dict]
     test_results: dict
     bugs_to_report: List[dict]
+    no_cache: bool
 
 class AutonomousQAAgent:
-    def __init__(self):
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
         """Initialize the agent with necessary components and build the workflow graph."""
-        self.llm = ChatOpenAI(model="gpt-4")  # Fixed typo in model name
+        self.config = config or {}
+        # One pooled HTTP/2 client so concurrent calls reuse connections
+        self.http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20)
+        )
+        self.llm = ChatOpenAI(
+            model="gpt-4",
+            max_retries=2,
+            timeout=60,
+            http_async_client=self.http_client
+        )
         self.tools = [create_test_suite, execute_playwright_test, create_jira_ticket]
         self.model_with_tools = self.llm.bind_tools(self.tools)
+        self.embeddings = OpenAIEmbeddings(chunk_size=512)
         self.qdrant = Qdrant.from_existing_collection(
-            embedding=OpenAIEmbeddings(),
+            embedding=self.embeddings,
             collection_name="historical_defects",
             url=os.getenv("QDRANT_URL", "http://localhost:6333"),
+            prefer_grpc=True
         )
         self.retriever = self.qdrant.as_retriever()
+        self.search_store = self._centroid_store() or self.qdrant
+        self.text_cache = FuzzyTextCache(
+            min_ratio=self.config.get("cache_min_text_ratio", 95),
+            ttl_seconds=self.config.get("cache_ttl_seconds", 3600)
+        )
+        self.context_cache = SemanticCache(
+            threshold=self.config.get("cache_similarity_threshold", 0.86),
+            ttl_seconds=self.config.get("cache_ttl_seconds", 3600)
+        )
         self.graph = self.build_graph()
 
+    def _centroid_store(self) -> Optional[Qdrant]:
+        """
+        Vector store over the published centroid collection.
+        Returns None if no centroids have been built or the source
+        collection is small enough to search directly.
+        """
+        min_points = self.config.get("centroid_min_points", CENTROID_MIN_POINTS)
+        client = self.qdrant.client
+        if client.count(SOURCE_COLLECTION, exact=False).count <= min_points:
+            return None
+        if not centroid_alias_exists(client):
+            return None
+        return Qdrant(
+            client=client,
+            collection_name=CENTROID_COLLECTION,
+            embeddings=self.embeddings
+        )
+
     def build_graph(self):
         """Build the workflow graph defining the agent's behavior."""
         workflow = StateGraph(AgentState)
@@ -56,8 +133,33 @@ class AutonomousQAAgent:
         """Retrieve relevant historical context for the user story."""
         print("--- RETRIEVING HISTORICAL CONTEXT ---")
         user_story = state["user_story"]
-        retrieved_docs = self.retriever.invoke(user_story)
-        context = "\n\n".join([doc.page_content for doc in retrieved_docs])
+        namespace = os.getenv("JIRA_PROJECT_KEY", "QA")
+        use_cache = not state.get("no_cache", False)
+        
+        # Textual near-duplicates (typo fixes, formatting) skip embedding entirely
+        context = None
+        if use_cache:
+            context = self.text_cache.lookup(namespace, user_story)
+        
+        if context is None:
+            # Embed once and reuse the vector for both the cache and the search
+            query_vector = self.embeddings.embed_query(user_story)
+            
+            # Semantically similar stories reuse the previously retrieved context
+            if use_cache:
+                context = self.context_cache.lookup(namespace, query_vector)
+            
+            if context is None:
+                retrieved_docs = self.search_store.similarity_search_by_vector(
+                    query_vector,
+                    k=self.config.get("retrieval_k", 4)
+                )
+                context = "\n\n".join([doc.page_content for doc in retrieved_docs])
+                if use_cache:
+                    self.context_cache.insert(namespace, query_vector, context)
+            
+            if use_cache:
+                self.text_cache.insert(namespace, user_story, context)
         
         messages = [
             SystemMessage(content="You are an expert QA engineer. Generate a comprehensive test suite based on the user story and historical context."),
@@ -65,43 +167,104 @@ class AutonomousQAAgent:
         ]
         return {"messages": messages}
 
-    def generate_tests(self, state: AgentState):
+    async def generate_tests(self, state: AgentState):
         """Generate test cases based on the user story and historical context."""
         print("--- GENERATING TEST SUITE ---")
-        response = self.model_with_tools.invoke(state["messages"])
-        test_suite_json = response.tool_calls[0].args['test_suite']
-        test_suite = json.loads(test_suite_json)['test_suite']
+        
+        # Stream the response and stop as soon as the first tool call's
+        # arguments form a complete JSON object
+        scanner = _JsonObjectScanner()
+        args_buffer = []
+        response = AIMessageChunk(content="")
+        complete = False
+        
+        stream = self.model_with_tools.astream(state["messages"])
+        try:
+            async for chunk in stream:
+                response = response + chunk
+                for tool_chunk in chunk.tool_call_chunks:
+                    if (tool_chunk.get("index") or 0) != 0:
+                        # A second tool call started, so the first is done
+                        complete = True
+                        break
+                    fragment = tool_chunk.get("args") or ""
+                    args_buffer.append(fragment)
+                    if scanner.feed(fragment):
+                        complete = True
+                        break
+                if complete:
+                    break
+        finally:
+            await stream.aclose()
+        
+        if complete:
+            tool_args = orjson.loads("".join(args_buffer))
+        elif response.tool_calls:
+            tool_args = response.tool_calls[0]["args"]
+        else:
+            tool_args = {}
+        if "test_suite" not in tool_args:
+            raise ValueError("The model returned no test_suite tool call")
+        
+        test_suite = orjson.loads(tool_args['test_suite'])['test_suite']
         return {"test_suite": test_suite}
 
-    def execute_tests(self, state: AgentState):
-        """Execute the generated test cases and identify failures."""
+    async def execute_tests(self, state: AgentState):
+        """Execute the generated test cases concurrently and identify failures."""
         print("--- EXECUTING TESTS ---")
         test_suite = state["test_suite"]
         results = {}
         bugs = []
         
-        for test in test_suite:
-            result = execute_playwright_test.invoke(json.dumps(test))
+        # Bound concurrency to respect browser/worker limits
+        semaphore = asyncio.Semaphore(self.config.get("max_parallel", 8))
+        
+        async def run_test(test: dict) -> str:
+            async with semaphore:
+                # The tool is synchronous, so run it off the event loop
+                return await asyncio.to_thread(
+                    execute_playwright_test.invoke,
+                    orjson.dumps(test).decode()
+                )
+        
+        outcomes = await asyncio.gather(
+            *(run_test(test) for test in test_suite),
+            return_exceptions=True
+        )
+        
+        for test, result in zip(test_suite, outcomes):
+            if isinstance(result, Exception):
+                result = f"FAIL: {str(result)}"
             results[test['id']] = result
             if "FAIL" in result:
                 bugs.append({"test": test, "reason": result})
         
         return {"test_results": results, "bugs_to_report": bugs}
 
-    def report_bugs(self, state: AgentState):
+    async def report_bugs(self, state: AgentState):
         """Report any test failures as bugs in Jira."""
         print("--- REPORTING BUGS ---")
         bugs = state["bugs_to_report"]
+        tickets = []
         for bug in bugs:
             summary = f"Test Failure: {bug['test']['id']} - {bug['test']['title']}"
-            description = f"Test failed with reason: {bug['reason']}\n\nSteps to Reproduce:\n"
-            for i, step in enumerate(bug['test']['steps']):
-                description += f"{i+1}. {step}\n"
-            description += f"\nExpected Result: {bug['test']['expected_result']}"
+            steps = "".join(
+                f"{i+1}. {step}\n" for i, step in enumerate(bug['test']['steps'])
+            )
+            description = (
+                f"Test failed with reason: {bug['reason']}\n\n"
+                f"Steps to Reproduce:\n{steps}"
+                f"\nExpected Result: {bug['test']['expected_result']}"
+            )
             
-            create_jira_ticket.invoke({
+            tickets.append({
                 "project_key": os.getenv("JIRA_PROJECT_KEY", "QA"),
                 "summary": summary,
                 "description": description
             })
+        
+        # The Jira tool is synchronous, so create the tickets from worker threads
+        await asyncio.gather(
+            *(asyncio.to_thread(create_jira_ticket.invoke, ticket) for ticket in tickets)
+        )
         return {}
@@ -4,12 +4,64 @@ Advanced test prioritization system for optimizing test execution order.
 
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from collections import defaultdict
+import heapq
+from dataclasses import dataclass
+from pydantic import BaseModel, ConfigDict, Field
 import numpy as np
 from ..rag.analysis import RiskAnalyzer
 from ..reporting.metrics import QualityMetrics
 
-class TestPriority(BaseModel):
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is an optional speedup
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _weighted_failure(ages: np.ndarray, failed: np.ndarray) -> float:
+        """Time-decayed failure rate (decay over 30 days) in a single fused loop"""
+        weighted = 0.0
+        total = 0.0
+        for i in range(ages.shape[0]):
+            weight = 1.0 / (1.0 + ages[i] / 30.0)
+            weighted += weight * failed[i]
+            total += weight
+        return weighted / total if total > 0 else 0.0
+else:
+    def _weighted_failure(ages: np.ndarray, failed: np.ndarray) -> float:
+        """Time-decayed failure rate (decay over 30 days)"""
+        weights = 1.0 / (1.0 + ages / 30.0)
+        total = weights.sum()
+        return float((weights * failed).sum() / total) if total > 0 else 0.0
+
+def _priority_score(
+    risk: float,
+    impact: float,
+    normalized_time: float,
+    failure_prob: float,
+    coverage: float,
+    weights: np.ndarray
+) -> float:
+    """Weighted combination of the priority factors"""
+    return (
+        weights[0] * risk +
+        weights[1] * impact +
+        weights[2] * (1.0 - normalized_time) +
+        weights[3] * failure_prob +
+        weights[4] * coverage
+    )
+
+if NUMBA_AVAILABLE:
+    _priority_score = njit(cache=True, fastmath=True)(_priority_score)
+    
+    # Warm the JIT so the first prioritization doesn't pay compile cost
+    _weighted_failure(np.zeros(1), np.zeros(1))
+    _priority_score(0.0, 0.0, 0.0, 0.0, 0.0, np.zeros(5))
+
+@dataclass(slots=True)
+class TestPriority:
     """Priority score and factors for a test case"""
     test_id: str
     priority_score: float
@@ -20,7 +72,8 @@ class TestPriority(BaseModel):
     last_execution: Optional[datetime]
     dependencies: List[str]
 
-class TestDependency(BaseModel):
+@dataclass(slots=True)
+class TestDependency:
     """Dependency relationship between tests"""
     source_test: str
     target_test: str
@@ -29,21 +82,39 @@ class TestDependency(BaseModel):
 
 class PrioritizationConfig(BaseModel):
     """Configuration for test prioritization"""
-    risk_weight: float = 0.3
-    impact_weight: float = 0.2
-    time_weight: float = 0.15
-    failure_weight: float = 0.2
-    coverage_weight: float = 0.15
-    max_batch_size: int = 10
-    time_threshold: float = 3600  # 1 hour in seconds
-    min_priority_for_execution: float = 0.3
+    # Built once per prioritizer, so it keeps validation; frozen makes it hashable
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
+    risk_weight: float = Field(0.3, ge=0)
+    impact_weight: float = Field(0.2, ge=0)
+    time_weight: float = Field(0.15, ge=0)
+    failure_weight: float = Field(0.2, ge=0)
+    coverage_weight: float = Field(0.15, ge=0)
+    max_batch_size: int = Field(10, ge=1)
+    time_threshold: float = Field(3600, gt=0)  # 1 hour in seconds
+    min_priority_for_execution: float = Field(0.3, ge=0, le=1)
 
 class TestPrioritizer:
+    # Business impact level to score mapping
+    _IMPACT_LEVELS = {
+        "critical": 1.0,
+        "high": 0.8,
+        "medium": 0.5,
+        "low": 0.2
+    }
+    
     def __init__(
         self,
         config: Optional[PrioritizationConfig] = None
     ):
         self.config = config or PrioritizationConfig()
+        self.weights = np.array([
+            self.config.risk_weight,
+            self.config.impact_weight,
+            self.config.time_weight,
+            self.config.failure_weight,
+            self.config.coverage_weight
+        ], dtype=np.float64)
         self.risk_analyzer = RiskAnalyzer()
         self.quality_metrics = QualityMetrics()
     
@@ -65,10 +136,13 @@ class TestPrioritizer:
         Returns:
             Prioritized list of test cases
         """
+        # Index history by test ID once instead of re-filtering per test
+        history_by_id = self._group_history(execution_history)
+        
         # Calculate priority scores
         priority_scores = await self._calculate_priority_scores(
             test_suite,
-            execution_history
+            history_by_id
         )
         
         # Build dependency graph
@@ -86,41 +160,58 @@ class TestPrioritizer:
         
         return prioritized_tests
     
+    def _group_history(
+        self,
+        execution_history: Optional[List[Dict]]
+    ) -> Dict[str, List[Dict]]:
+        """Group execution history records by test ID, oldest first"""
+        history_by_id = defaultdict(list)
+        for history in execution_history or []:
+            history_by_id[history["test_id"]].append(history)
+        
+        for records in history_by_id.values():
+            records.sort(key=lambda h: h["timestamp"])
+        return history_by_id
+    
     async def _calculate_priority_scores(
         self,
         test_suite: List[Dict],
-        execution_history: Optional[List[Dict]]
+        history_by_id: Dict[str, List[Dict]]
     ) -> Dict[str, TestPriority]:
         """Calculate priority scores for each test"""
         priority_scores = {}
         
-        for test in test_suite:
-            # Get risk score
-            risk_score = await self._calculate_risk_score(test)
+        # Risk analysis hits the embedding API and vector store, so score
+        # the whole suite in one batch
+        risk_scores = await self._calculate_risk_scores(test_suite)
+        
+        for test, risk_score in zip(test_suite, risk_scores):
+            test_history = history_by_id.get(test["id"], [])
             
             # Get impact score
-            impact_score = await self._calculate_impact_score(test)
+            impact_score = self._calculate_impact_score(test)
             
             # Get execution metrics
-            execution_metrics = await self._get_execution_metrics(
+            execution_metrics = self._get_execution_metrics(
                 test,
-                execution_history
+                test_history
             )
             
             # Calculate failure probability
-            failure_prob = await self._calculate_failure_probability(
+            failure_prob = self._calculate_failure_probability(
                 test,
-                execution_history
+                test_history
             )
             
             # Calculate overall priority score
-            priority_score = (
-                self.config.risk_weight * risk_score +
-                self.config.impact_weight * impact_score +
-                self.config.time_weight * (1 - execution_metrics["normalized_time"]) +
-                self.config.failure_weight * failure_prob +
-                self.config.coverage_weight * execution_metrics["coverage_score"]
-            )
+            priority_score = float(_priority_score(
+                risk_score,
+                impact_score,
+                execution_metrics["normalized_time"],
+                failure_prob,
+                execution_metrics["coverage_score"],
+                self.weights
+            ))
             
             priority_scores[test["id"]] = TestPriority(
                 test_id=test["id"],
@@ -135,49 +226,29 @@ class TestPrioritizer:
         
         return priority_scores
     
-    async def _calculate_risk_score(self, test: Dict) -> float:
-        """Calculate risk score for a test"""
+    async def _calculate_risk_scores(self, test_suite: List[Dict]) -> List[float]:
+        """Calculate risk scores for all tests in one batch"""
         try:
-            risk_analysis = await self.risk_analyzer.calculate_risk_score(
-                test.get("feature", "")
+            risk_analyses = await self.risk_analyzer.calculate_risk_scores(
+                [test.get("feature", "") for test in test_suite]
             )
-            return risk_analysis.overall_score
-        except:
-            return 0.5  # Default medium risk
+            return [risk_analysis.overall_score for risk_analysis in risk_analyses]
+        except Exception:
+            return [0.5] * len(test_suite)  # Default medium risk
     
-    async def _calculate_impact_score(self, test: Dict) -> float:
+    def _calculate_impact_score(self, test: Dict) -> float:
         """Calculate business impact score for a test"""
-        impact_levels = {
-            "critical": 1.0,
-            "high": 0.8,
-            "medium": 0.5,
-            "low": 0.2
-        }
-        return impact_levels.get(test.get("impact", "medium"), 0.5)
+        return self._IMPACT_LEVELS.get(test.get("impact", "medium"), 0.5)
     
-    async def _get_execution_metrics(
+    def _get_execution_metrics(
         self,
         test: Dict,
-        execution_history: Optional[List[Dict]]
+        test_history: List[Dict]
     ) -> Dict:
-        """Get execution metrics for a test"""
-        if not execution_history:
-            return {
-                "execution_time": 300,  # Default 5 minutes
-                "normalized_time": 0.5,
-                "coverage_score": 0.5,
-                "last_execution": None
-            }
-        
-        # Filter history for this test
-        test_history = [
-            h for h in execution_history
-            if h["test_id"] == test["id"]
-        ]
-        
+        """Get execution metrics for a test from its own history records"""
         if not test_history:
             return {
-                "execution_time": 300,
+                "execution_time": 300,  # Default 5 minutes
                 "normalized_time": 0.5,
                 "coverage_score": 0.5,
                 "last_execution": None
@@ -185,7 +256,7 @@ class TestPrioritizer:
         
         # Calculate average execution time
         execution_times = [h["duration"] for h in test_history if "duration" in h]
-        avg_time = np.mean(execution_times) if execution_times else 300
+        avg_time = sum(execution_times) / len(execution_times) if execution_times else 300
         
         # Normalize execution time (0-1 scale)
         normalized_time = min(avg_time / self.config.time_threshold, 1.0)
@@ -193,11 +264,8 @@ class TestPrioritizer:
         # Calculate coverage score
         coverage = sum(1 for h in test_history if h.get("coverage")) / len(test_history)
         
-        # Get last execution time
-        last_execution = max(
-            (h["timestamp"] for h in test_history if "timestamp" in h),
-            default=None
-        )
+        # History is sorted by timestamp, so the last record is the latest run
+        last_execution = test_history[-1]["timestamp"]
         
         return {
             "execution_time": avg_time,
@@ -206,43 +274,37 @@ class TestPrioritizer:
             "last_execution": last_execution
         }
     
-    async def _calculate_failure_probability(
+    def _calculate_failure_probability(
         self,
         test: Dict,
-        execution_history: Optional[List[Dict]]
+        test_history: List[Dict]
     ) -> float:
-        """Calculate probability of test failure"""
-        if not execution_history:
+        """Calculate probability of test failure from its own history records"""
+        if not test_history:
             return 0.5  # Default medium probability
         
-        # Filter history for this test
-        test_history = [
-            h for h in execution_history
-            if h["test_id"] == test["id"]
-        ]
-        
-        if not test_history:
-            return 0.5
+        count = len(test_history)
+        now_ts = datetime.now().timestamp()
+        timestamps = np.fromiter(
+            (h["timestamp"].timestamp() for h in test_history),
+            dtype=np.float64,
+            count=count
+        )
+        failed = np.fromiter(
+            (h["status"] == "failed" for h in test_history),
+            dtype=np.float64,
+            count=count
+        )
         
         # Calculate failure rate
-        failures = sum(1 for h in test_history if h["status"] == "failed")
-        failure_rate = failures / len(test_history)
+        failure_rate = failed.mean()
         
         # Apply time decay to give more weight to recent failures
-        weighted_failure_rate = 0
-        total_weight = 0
-        
-        for history in sorted(test_history, key=lambda h: h["timestamp"]):
-            age_days = (datetime.now() - history["timestamp"]).days
-            weight = 1 / (1 + age_days/30)  # Decay over 30 days
-            weighted_failure_rate += weight * (1 if history["status"] == "failed" else 0)
-            total_weight += weight
-        
-        if total_weight > 0:
-            weighted_failure_rate /= total_weight
+        age_days = np.floor((now_ts - timestamps) / 86400.0)
+        weighted_failure_rate = _weighted_failure(age_days, failed)
         
         # Combine recent and overall failure rates
-        return 0.7 * weighted_failure_rate + 0.3 * failure_rate
+        return float(0.7 * weighted_failure_rate + 0.3 * failure_rate)
     
     def _build_dependency_graph(
         self,
@@ -268,59 +330,77 @@ class TestPrioritizer:
         priority_scores: Dict[str, TestPriority],
         dependency_graph: Dict[str, List[str]]
     ) -> List[Dict]:
-        """Create execution batches considering priorities and dependencies"""
-        # Sort tests by priority score
-        sorted_tests = sorted(
-            test_suite,
-            key=lambda t: priority_scores[t["id"]].priority_score,
-            reverse=True
-        )
+        """
+        Create execution batches considering priorities and dependencies.
+        
+        Tests are ordered with a single topological pass (Kahn's algorithm),
+        using a heap so the highest priority ready test is always scheduled
+        next. Tests below the minimum priority are deferred to the end.
+        """
+        tests_by_id = {test["id"]: test for test in test_suite}
+        order = {test_id: index for index, test_id in enumerate(tests_by_id)}
+        
+        # Count unmet prerequisites and record reverse edges once
+        indegree = {test_id: 0 for test_id in tests_by_id}
+        dependents: Dict[str, List[str]] = defaultdict(list)
+        for test_id, prerequisites in dependency_graph.items():
+            if test_id not in indegree:
+                continue
+            for prerequisite in prerequisites:
+                if prerequisite in tests_by_id:
+                    indegree[test_id] += 1
+                    dependents[prerequisite].append(test_id)
+        
+        def heap_key(test_id: str) -> Tuple[bool, float, int, str]:
+            score = priority_scores[test_id].priority_score
+            return (
+                score < self.config.min_priority_for_execution,
+                -score,
+                order[test_id],
+                test_id
+            )
+        
+        ready = [heap_key(test_id) for test_id, degree in indegree.items() if degree == 0]
+        heapq.heapify(ready)
         
-        # Initialize result list and tracking sets
         prioritized = []
-        executed = set()
-        blocked = set()
+        scheduled = set()
         
-        while sorted_tests:
-            # Create next batch
+        while len(scheduled) < len(tests_by_id):
+            if not ready:
+                # Dependency cycle: release the highest priority unscheduled test
+                test_id = min(
+                    (t for t in tests_by_id if t not in scheduled),
+                    key=heap_key
+                )
+                heapq.heappush(ready, heap_key(test_id))
+            
+            # Fill the next batch within size and time limits
             batch = []
             batch_time = 0
+            deferred = []
             
-            # Add tests to batch
-            for test in sorted_tests[:]:
-                test_id = test["id"]
+            while ready and len(batch) < self.config.max_batch_size:
+                key = heapq.heappop(ready)
+                test_id = key[-1]
                 test_time = priority_scores[test_id].execution_time
                 
-                # Skip if test is blocked or exceeds batch limits
-                if (
-                    test_id in blocked or
-                    len(batch) >= self.config.max_batch_size or
-                    batch_time + test_time > self.config.time_threshold or
-                    priority_scores[test_id].priority_score < self.config.min_priority_for_execution
-                ):
+                if batch and batch_time + test_time > self.config.time_threshold:
+                    deferred.append(key)
                     continue
                 
-                # Check if all dependencies are satisfied
-                dependencies = dependency_graph[test_id]
-                if all(dep in executed for dep in dependencies):
-                    batch.append(test)
-                    batch_time += test_time
-                    executed.add(test_id)
-                    sorted_tests.remove(test)
-                else:
-                    blocked.add(test_id)
+                batch.append(tests_by_id[test_id])
+                batch_time += test_time
+                scheduled.add(test_id)
+                
+                # Release dependents whose prerequisites are all scheduled
+                for dependent in dependents[test_id]:
+                    indegree[dependent] -= 1
+                    if indegree[dependent] == 0 and dependent not in scheduled:
+                        heapq.heappush(ready, heap_key(dependent))
             
-            # Add batch to result if not empty
-            if batch:
-                prioritized.extend(batch)
-            else:
-                # If no tests could be added, there might be a dependency cycle
-                # Add the highest priority non-executed test
-                for test in sorted_tests:
-                    if test["id"] not in executed:
-                        prioritized.append(test)
-                        executed.add(test["id"])
-                        sorted_tests.remove(test)
-                        break
+            prioritized.extend(batch)
+            for key in deferred:
+                heapq.heappush(ready, key)
         
         return prioritized
@@ -6,8 +6,8 @@ and other QA-related tasks.
 from langchain_core.prompts import PromptTemplate
 
 # This prompt guides the agent to act as a QA expert and generate a comprehensive test suite.
-TEST_GENERATION_PROMPT = PromptTemplate.from_template(
-    """
+# Literal braces in the example JSON are doubled so the template is safe for str.format.
+TEST_GENERATION_PROMPT_STR = """
 You are an expert Senior QA Engineer with over 15 years of experience in software testing. Your task is to create a comprehensive test suite based on the provided user story and historical defect data.
 
 **Persona:**
@@ -31,9 +31,9 @@ Based on our knowledge base, here are summaries of past defects in similar featu
 3.  **Format the Output:** Return the test suite as a structured JSON object. Each test case must have an `id`, `category`, `title`, `steps` (an array of strings), and an `expected_result`.
 
 **Example Output Format:**
-{
+{{
   "test_suite": [
-    {
+    {{
       "id": "LOGIN-001",
       "category": "positive",
       "title": "Successful login with valid credentials",
@@ -44,10 +44,11 @@ Based on our knowledge base, here are summaries of past defects in similar featu
         "Click login button"
       ],
       "expected_result": "User is successfully logged in and redirected to the dashboard."
-    }
+    }}
   ]
-}
+}}
 
 Now, begin. Generate the test suite.
 """
-)
+
+TEST_GENERATION_PROMPT = PromptTemplate.from_template(TEST_GENERATION_PROMPT_STR)
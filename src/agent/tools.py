@@ -2,12 +2,50 @@
 This module contains the tools that the agent can use to perform various QA-related actions.
 """
 
-import json
+import orjson
+import threading
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from langchain_core.tools import tool
 from atlassian import Jira
 from github import Github
 import os
 
+_jira_client: Optional[Jira] = None
+_jira_lock = threading.Lock()
+
+def _get_jira_client() -> Jira:
+    """
+    Return a process-wide Jira client backed by a pooled session.
+    Transient server errors are retried with backoff.
+    """
+    global _jira_client
+    if _jira_client is None:
+        with _jira_lock:
+            if _jira_client is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=10,
+                    pool_maxsize=10,
+                    max_retries=Retry(
+                        total=3,
+                        backoff_factor=0.2,
+                        status_forcelist=[500, 502, 503, 504]
+                    )
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                
+                _jira_client = Jira(
+                    url=os.environ.get('JIRA_URL'),
+                    username=os.environ.get('JIRA_USERNAME'),
+                    password=os.environ.get('JIRA_PASSWORD'),
+                    session=session
+                )
+    return _jira_client
+
 @tool
 def create_test_suite(user_story: str, historical_context: str) -> str:
     """
@@ -42,7 +80,7 @@ def create_test_suite(user_story: str, historical_context: str) -> str:
             }
         ]
     }
-    return json.dumps(mock_suite, indent=2)
+    return orjson.dumps(mock_suite, option=orjson.OPT_INDENT_2).decode()
 
 @tool
 def execute_playwright_test(test_case_json: str) -> str:
@@ -53,7 +91,7 @@ def execute_playwright_test(test_case_json: str) -> str:
     """
     # This is a placeholder. In a real system, this would invoke a Playwright runner.
     try:
-        test_case = json.loads(test_case_json)
+        test_case = orjson.loads(test_case_json)
         print(f"--- Executing test: {test_case['id']} - {test_case['title']} ---")
         # Simulate a test failure for demonstration purposes
         if "non-premium" in test_case["title"]:
@@ -71,12 +109,7 @@ def create_jira_ticket(project_key: str, summary: str, description: str, issue_t
     print(f"Summary: {summary}")
     
     try:
-        jira = Jira(
-            url=os.environ.get('JIRA_URL'),
-            username=os.environ.get('JIRA_USERNAME'),
-            password=os.environ.get('JIRA_PASSWORD')
-        )
-        
+        jira = _get_jira_client()
         jira.issue_create(
             fields={
                 "project": {"key": project_key},
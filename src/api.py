@@ -1,14 +1,15 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
+from uuid import uuid4
+import asyncio
+import os
+import time
+from pathlib import Path
 import uvicorn
 
-app = FastAPI(
-    title="Autonomous QA System",
-    description="AI-driven autonomous QA system for automated testing and analysis",
-    version="0.1.0"
-)
-
 # Pydantic models for request/response
 class TestRequest(BaseModel):
     url: str
@@ -21,6 +22,81 @@ class TestResult(BaseModel):
     message: str
     details: Optional[dict] = None
 
+# Finished results are kept this long, and at most this many of them
+STATUS_TTL_SECONDS = 3600
+MAX_FINISHED_STATUSES = 10_000
+
+# Pending test jobs and their latest known status
+test_queue: "asyncio.Queue[Dict]" = asyncio.Queue(maxsize=1000)
+test_status: Dict[str, TestResult] = {}
+# Finished test ids by completion time, oldest first
+_finished_at: "OrderedDict[str, float]" = OrderedDict()
+
+def _finish(result: TestResult):
+    """Record a final status and drop finished results past the TTL or cap"""
+    test_status[result.id] = result
+    now = time.monotonic()
+    _finished_at[result.id] = now
+    cutoff = now - STATUS_TTL_SECONDS
+    while _finished_at:
+        test_id, finished = next(iter(_finished_at.items()))
+        if finished >= cutoff and len(_finished_at) <= MAX_FINISHED_STATUSES:
+            break
+        del _finished_at[test_id]
+        test_status.pop(test_id, None)
+
+async def test_worker(agent):
+    """Pull queued tests and run them through the QA workflow"""
+    while True:
+        job = await test_queue.get()
+        test_id = job["id"]
+        test_status[test_id] = TestResult(
+            id=test_id,
+            status="running",
+            message=f"Test is running for {job['url']}",
+            details={"test_type": job["test_type"]}
+        )
+        try:
+            result = await agent.graph.ainvoke({"user_story": job["user_story"]})
+            _finish(TestResult(
+                id=test_id,
+                status="completed",
+                message=f"Test completed for {job['url']}",
+                details={
+                    "test_type": job["test_type"],
+                    "test_results": result.get("test_results", {})
+                }
+            ))
+        except Exception as e:
+            _finish(TestResult(
+                id=test_id,
+                status="failed",
+                message=f"Test failed: {str(e)}",
+                details={"test_type": job["test_type"]}
+            ))
+        finally:
+            test_queue.task_done()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Building the agent connects to Qdrant and OpenAI, so keep it off the loop
+    from src.agent.graph import AutonomousQAAgent
+    agent = await asyncio.to_thread(AutonomousQAAgent)
+    worker = asyncio.create_task(test_worker(agent))
+    yield
+    worker.cancel()
+    with suppress(asyncio.CancelledError):
+        await worker
+    from src.healing.service import flush_healing_service
+    await flush_healing_service()
+
+app = FastAPI(
+    title="Autonomous QA System",
+    description="AI-driven autonomous QA system for automated testing and analysis",
+    version="0.1.0",
+    lifespan=lifespan
+)
+
 # API endpoints
 @app.get("/")
 async def root():
@@ -28,25 +104,47 @@ async def root():
 
 @app.post("/test", response_model=TestResult)
 async def create_test(request: TestRequest):
+    test_id = uuid4().hex
+    job = {
+        "id": test_id,
+        "url": request.url,
+        "test_type": request.test_type,
+        "user_story": request.description or f"Run {request.test_type} tests against {request.url}"
+    }
+
     try:
-        # This is a placeholder - we'll implement actual test execution later
-        return TestResult(
-            id="test_123",
-            status="queued",
-            message=f"Test queued for {request.url}",
-            details={"test_type": request.test_type}
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        test_queue.put_nowait(job)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Test queue is full, try again later")
 
-@app.get("/test/{test_id}", response_model=TestResult)
-async def get_test_status(test_id: str):
-    # This is a placeholder - we'll implement actual status checking later
-    return TestResult(
+    result = TestResult(
         id=test_id,
-        status="pending",
-        message="Test is being processed",
+        status="queued",
+        message=f"Test queued for {request.url}",
+        details={"test_type": request.test_type}
     )
+    test_status[test_id] = result
+    return result
+
+@app.get("/test/{test_id}", response_model=TestResult)
+async def get_test_status(test_id: str):
+    result = test_status.get(test_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Test {test_id} not found")
+    return result
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Job status lives in process memory, so only scale out workers
+    # (API_WORKERS) behind a shared status store or sticky routing.
+    # "auto" picks uvloop and httptools when they are installed. app_dir
+    # makes "src" importable when the file is run as `python src/api.py`.
+    uvicorn.run(
+        "src.api:app",
+        app_dir=str(Path(__file__).resolve().parent.parent),
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="auto",
+        workers=int(os.getenv("API_WORKERS", "1")),
+        log_level="info"
+    )
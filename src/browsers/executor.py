@@ -2,8 +2,11 @@
 Parallel test execution service for multi-browser testing.
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 import asyncio
+import orjson
+import random
+import time
 from datetime import datetime
 from .models import (
     BrowserType, BrowserConfig, BrowserContextConfig,
@@ -11,8 +14,17 @@ from .models import (
     DEVICE_PROFILES
 )
 from .manager import BrowserManager
+from .pool import ContextPool
 from ..healing.integration import HealingTestExecutor
 
+# Error signatures that fail the same way on every attempt
+NON_RETRYABLE = ("net::ERR_NAME_NOT_RESOLVED", "AuthError", "404")
+
+def _is_non_retryable(result: BrowserTestResult) -> bool:
+    """Check whether a failed result should skip retries"""
+    error_message = result.error_message or ""
+    return any(signature in error_message for signature in NON_RETRYABLE)
+
 class ParallelTestExecutor:
     """Executes tests in parallel across multiple browsers"""
     
@@ -23,8 +35,23 @@ class ParallelTestExecutor:
     ):
         self.config = config or ParallelConfig()
         self.browser_manager = BrowserManager(artifacts_path)
+        self.context_pool = ContextPool(
+            self.browser_manager,
+            max_idle_per_key=self.config.max_parallel_instances
+        )
         self.healing_executor = HealingTestExecutor()
     
+    @classmethod
+    async def start(
+        cls,
+        config: Optional[ParallelConfig] = None,
+        artifacts_path: str = "./artifacts"
+    ) -> "ParallelTestExecutor":
+        """Create an executor with its artifact directories ready"""
+        executor = cls(config, artifacts_path)
+        await executor.browser_manager.setup()
+        return executor
+    
     async def _execute_test_case(
         self,
         test_case: Dict[str, Any],
@@ -32,57 +59,69 @@ class ParallelTestExecutor:
         device_config: Optional[DeviceConfig] = None
     ) -> BrowserTestResult:
         """Execute a single test case in a specific browser"""
+        start_ns = time.monotonic_ns()
         started_at = datetime.now()
-        context = None
         
         try:
-            # Create browser context
-            context = await self.browser_manager.create_context(
+            # Check out a warm context; it is reset and returned to the pool afterwards
+            async with self.context_pool.acquire(
                 browser_type,
                 device_config=device_config
-            )
-            
-            # Start tracing
-            await self.browser_manager.start_tracing(
-                context,
-                browser_type,
-                f"test_{test_case['id']}"
-            )
-            
-            # Execute test with healing capability
-            success = await self.healing_executor.execute_test_case(
-                context.pages[0],
-                test_case
-            )
-            
-            # Take screenshot
-            screenshot_path = await self.browser_manager.take_screenshot(
-                context,
-                f"test_{test_case['id']}",
-                browser_type
-            )
-            
-            # Stop tracing
-            trace_path = await self.browser_manager.stop_tracing(
-                context,
-                browser_type,
-                f"test_{test_case['id']}"
-            )
-            
-            # Get video path if recording enabled
-            video_path = self.browser_manager.get_video_path(context.id)
+            ) as context:
+                context_id = self.browser_manager.get_context_id(context)
+                await self.healing_executor.prepare_context(context)
+                video = context.pages[0].video
+                
+                # Start tracing
+                await self.browser_manager.start_tracing(
+                    context,
+                    browser_type,
+                    f"test_{test_case['id']}"
+                )
+                
+                # Execute test with healing capability
+                success = await self.healing_executor.execute_test_case(
+                    context.pages[0],
+                    test_case
+                )
+                
+                # Only keep traces and videos of failing runs unless configured otherwise
+                retain = not (success and self.config.retain_on_failure)
+                
+                # Take screenshot and stop tracing concurrently
+                screenshot_path, trace_path = await asyncio.gather(
+                    self.browser_manager.take_screenshot(
+                        context,
+                        f"test_{test_case['id']}",
+                        browser_type
+                    ),
+                    self.browser_manager.stop_tracing(
+                        context,
+                        browser_type,
+                        f"test_{test_case['id']}",
+                        save=retain
+                    )
+                )
+                
+                # Get video path if recording enabled
+                video_path = await self.browser_manager.get_video_path(context_id)
+                
+                # Get HAR path if recording enabled
+                har_path = self.browser_manager.get_har_path(context_id)
             
-            # Get HAR path if recording enabled
-            har_path = self.browser_manager.get_har_path(context.id)
+            # Videos are only finalized once the context has closed
+            if video and not retain:
+                await video.delete()
+                video_path = None
             
+            duration_ms = (time.monotonic_ns() - start_ns) // 1_000_000
             completed_at = datetime.now()
-            duration = (completed_at - started_at).total_seconds() * 1000
             
             return BrowserTestResult(
                 browser_type=browser_type,
                 device_name=device_config.name if device_config else None,
                 status="passed" if success else "failed",
-                duration_ms=int(duration),
+                duration_ms=duration_ms,
                 screenshot_path=screenshot_path,
                 video_path=video_path,
                 trace_path=trace_path,
@@ -92,22 +131,18 @@ class ParallelTestExecutor:
             )
             
         except Exception as e:
+            duration_ms = (time.monotonic_ns() - start_ns) // 1_000_000
             completed_at = datetime.now()
-            duration = (completed_at - started_at).total_seconds() * 1000
             
             return BrowserTestResult(
                 browser_type=browser_type,
                 device_name=device_config.name if device_config else None,
                 status="error",
-                duration_ms=int(duration),
+                duration_ms=duration_ms,
                 error_message=str(e),
                 started_at=started_at,
                 completed_at=completed_at
             )
-            
-        finally:
-            if context:
-                await self.browser_manager.close_context(context.id)
     
     async def _execute_with_retry(
         self,
@@ -124,8 +159,16 @@ class ParallelTestExecutor:
             and self.config.max_retries > 0
         ):
             for retry in range(self.config.max_retries):
-                # Wait before retry
-                await asyncio.sleep(self.config.retry_delay_ms / 1000)
+                # Deterministic failures won't pass on a rerun
+                if _is_non_retryable(result):
+                    return result
+                
+                # Exponential backoff with jitter so retries don't stampede
+                delay_ms = min(
+                    self.config.retry_delay_ms * (2 ** retry),
+                    self.config.max_retry_delay_ms
+                )
+                await asyncio.sleep(delay_ms / 1000 * random.uniform(0.8, 1.2))
                 
                 retry_result = await self._execute_test_case(
                     test_case,
@@ -144,24 +187,37 @@ class ParallelTestExecutor:
         self,
         test_cases: List[Dict[str, Any]],
         browser_types: Optional[List[BrowserType]] = None,
-        device_profiles: Optional[List[str]] = None
+        device_profiles: Optional[List[str]] = None,
+        on_result: Optional[Callable[[str, BrowserTestResult], None]] = None
     ) -> Dict[str, List[BrowserTestResult]]:
         """
         Execute a test suite across multiple browsers and devices in parallel.
-        Returns results grouped by test case ID.
+        Returns results grouped by test case ID. `on_result` is called with
+        each result as soon as it completes.
         """
         browser_types = browser_types or [BrowserType.CHROMIUM]
         device_profiles = device_profiles or ["Desktop HD"]
         
         results: Dict[str, List[BrowserTestResult]] = {}
         
+        # Resolve device profiles once so typos fail before any browser work
+        unknown_profiles = [name for name in device_profiles if name not in DEVICE_PROFILES]
+        if unknown_profiles:
+            raise ValueError(f"Unknown device profiles: {', '.join(unknown_profiles)}")
+        device_configs = [DEVICE_PROFILES[name] for name in device_profiles]
+        
+        # Launch every browser up front so the first wave of tests doesn't
+        # serialize on browser startup; contexts then share these browsers
+        await self.browser_manager.setup()
+        await self.browser_manager.warmup(browser_types)
+        
         # Create all test combinations
-        test_combinations = []
-        for test_case in test_cases:
-            for browser_type in browser_types:
-                for profile_name in device_profiles:
-                    device_config = DEVICE_PROFILES.get(profile_name)
-                    test_combinations.append((test_case, browser_type, device_config))
+        test_combinations = [
+            (test_case, browser_type, device_config)
+            for test_case in test_cases
+            for browser_type in browser_types
+            for device_config in device_configs
+        ]
         
         # Execute tests in parallel with concurrency limit
         semaphore = asyncio.Semaphore(self.config.max_parallel_instances)
@@ -180,20 +236,30 @@ class ParallelTestExecutor:
         
         # Run all test combinations
         execution_tasks = [
-            execute_with_semaphore(combination)
+            asyncio.create_task(execute_with_semaphore(combination))
             for combination in test_combinations
         ]
         
-        execution_results = await asyncio.gather(*execution_tasks)
-        
-        # Group results by test case ID
-        for test_id, result in execution_results:
-            if test_id not in results:
-                results[test_id] = []
-            results[test_id].append(result)
+        # Group results by test case ID as they arrive
+        for next_result in asyncio.as_completed(execution_tasks):
+            test_id, result = await next_result
+            results.setdefault(test_id, []).append(result)
+            if on_result:
+                on_result(test_id, result)
         
         return results
     
+    @staticmethod
+    def dump_results(results: Dict[str, List[BrowserTestResult]]) -> bytes:
+        """Serialize suite results to JSON in a single pass"""
+        return orjson.dumps(
+            {test_id: [result.to_dict() for result in test_results]
+             for test_id, test_results in results.items()},
+            option=orjson.OPT_NON_STR_KEYS
+        )
+    
     async def cleanup(self):
         """Clean up browser instances and contexts"""
+        await self.healing_executor.healing_service.flush()
+        await self.context_pool.close()
         await self.browser_manager.close_all()
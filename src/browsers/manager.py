@@ -2,17 +2,81 @@
 Browser management service for handling multiple browser instances.
 """
 
-from typing import Dict, Optional, List
-from playwright.async_api import async_playwright, Browser, BrowserContext
+from typing import Dict, Optional, List, Set, Tuple, Any
+from playwright.async_api import async_playwright, Playwright, Browser, BrowserContext, Route
 import asyncio
+import functools
+import itertools
 import os
-from datetime import datetime
+import time
 from pathlib import Path
 from .models import (
-    BrowserType, BrowserConfig, BrowserContextConfig,
+    BrowserType, BrowserConfig, BrowserContextConfig, ViewportSize,
     DeviceConfig, BrowserTestResult, DEFAULT_BROWSER_CONFIGS
 )
 
+_BROWSER_VALUES: Tuple[str, ...] = tuple(b.value for b in BrowserType)
+
+# Re-requests images that never loaded (blocked ones) and waits for them,
+# bounded so lazy or broken images can't stall the screenshot
+_REFETCH_IMAGES_JS = """(timeoutMs) => Promise.race([
+    Promise.all([...document.images]
+        .filter(img => (img.currentSrc || img.src) && (!img.complete || img.naturalWidth === 0))
+        .map(img => new Promise(resolve => {
+            img.addEventListener('load', resolve, { once: true });
+            img.addEventListener('error', resolve, { once: true });
+            if (img.srcset) img.srcset = img.srcset;
+            img.src = img.src;
+        }))),
+    new Promise(resolve => setTimeout(resolve, timeoutMs))
+])"""
+_REFETCH_TIMEOUT_MS = 3000
+
+@functools.lru_cache(maxsize=64)
+def _build_context_options(
+    video_dir: Optional[str],
+    har_dir: Optional[str],
+    bypass_csp: bool,
+    offline: bool,
+    color_scheme: str,
+    reduced_motion: str,
+    viewport: Optional[ViewportSize],
+    user_agent: Optional[str],
+    device_scale_factor: Optional[float],
+    is_mobile: Optional[bool],
+    has_touch: Optional[bool]
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Build the new_context keyword arguments for a profile.
+    
+    Returns the shared options (callers must not mutate them) and a HAR path
+    template to format with the context ID, or None when HAR is off.
+    """
+    context_options = {
+        "record_video_dir": video_dir,
+        "ignore_https_errors": True,
+        "bypass_csp": bypass_csp,
+        "offline": offline,
+        "color_scheme": color_scheme,
+        "reduced_motion": reduced_motion
+    }
+    
+    # Add device emulation if specified
+    if viewport:
+        context_options.update({
+            "viewport": {
+                "width": viewport.width,
+                "height": viewport.height
+            },
+            "user_agent": user_agent,
+            "device_scale_factor": device_scale_factor,
+            "is_mobile": is_mobile,
+            "has_touch": has_touch
+        })
+    
+    har_template = f"{har_dir}/{{context_id}}.har" if har_dir else None
+    return context_options, har_template
+
 class BrowserManager:
     """Manages browser instances and contexts"""
     
@@ -20,13 +84,62 @@ class BrowserManager:
         self.artifacts_path = Path(artifacts_path)
         self.browsers: Dict[BrowserType, Browser] = {}
         self.contexts: Dict[str, BrowserContext] = {}
+        self._context_ids: Dict[BrowserContext, str] = {}
+        self._har_paths: Dict[str, str] = {}
+        self._blocked_types: Dict[BrowserContext, frozenset] = {}
+        
+        # Monotonic sequence keeps artifact names unique under parallel runs
+        self._seq = itertools.count()
+        
+        # A single Playwright driver is shared by every browser instance
+        self._pw: Optional[Playwright] = None
+        self._pw_lock = asyncio.Lock()
+        self._browser_locks: Dict[BrowserType, asyncio.Lock] = {
+            browser_type: asyncio.Lock() for browser_type in BrowserType
+        }
         
-        # Create artifact directories
-        for browser_type in BrowserType:
-            (self.artifacts_path / "screenshots" / browser_type).mkdir(parents=True, exist_ok=True)
-            (self.artifacts_path / "videos" / browser_type).mkdir(parents=True, exist_ok=True)
-            (self.artifacts_path / "traces" / browser_type).mkdir(parents=True, exist_ok=True)
-            (self.artifacts_path / "har" / browser_type).mkdir(parents=True, exist_ok=True)
+        # Artifact directories, stringified once per browser type and
+        # created on disk by setup()
+        self._screenshot_dir: Dict[str, str] = {}
+        self._video_dir: Dict[str, str] = {}
+        self._trace_dir: Dict[str, str] = {}
+        self._har_dir: Dict[str, str] = {}
+        self._artifact_dirs: List[Path] = []
+        for browser_value in _BROWSER_VALUES:
+            for kind, dirs in (
+                ("screenshots", self._screenshot_dir),
+                ("videos", self._video_dir),
+                ("traces", self._trace_dir),
+                ("har", self._har_dir)
+            ):
+                path = self.artifacts_path / kind / browser_value
+                self._artifact_dirs.append(path)
+                dirs[browser_value] = str(path)
+        self._is_setup = False
+    
+    async def setup(self):
+        """Create the artifact directories without blocking the event loop"""
+        if self._is_setup:
+            return
+        
+        def make_dirs():
+            for path in self._artifact_dirs:
+                path.mkdir(parents=True, exist_ok=True)
+        
+        await asyncio.to_thread(make_dirs)
+        self._is_setup = True
+    
+    def _unique_suffix(self) -> str:
+        """Collision-free suffix for artifact file names"""
+        return f"{time.time_ns()}_{next(self._seq)}"
+    
+    async def _ensure_pw(self) -> Playwright:
+        """Start the Playwright driver once and reuse it"""
+        if self._pw is None:
+            async with self._pw_lock:
+                if self._pw is None:
+                    self._pw = await async_playwright().start()
+        return self._pw
     
     async def initialize_browser(
         self,
@@ -37,9 +150,13 @@ class BrowserManager:
         if browser_type in self.browsers:
             return self.browsers[browser_type]
         
-        config = config or DEFAULT_BROWSER_CONFIGS[browser_type]
-        
-        async with async_playwright() as playwright:
+        # Serialize launches per browser type so concurrent callers share one browser
+        async with self._browser_locks[browser_type]:
+            if browser_type in self.browsers:
+                return self.browsers[browser_type]
+            
+            config = config or DEFAULT_BROWSER_CONFIGS[browser_type]
+            playwright = await self._ensure_pw()
             browser_launcher = getattr(playwright, browser_type.value)
             
             browser = await browser_launcher.launch(
@@ -53,6 +170,12 @@ class BrowserManager:
             self.browsers[browser_type] = browser
             return browser
     
+    async def warmup(self, browser_types: List[BrowserType]):
+        """Launch the given browsers in parallel ahead of the first test"""
+        await asyncio.gather(
+            *(self.initialize_browser(browser_type) for browser_type in set(browser_types))
+        )
+    
     async def create_context(
         self,
         browser_type: BrowserType,
@@ -65,42 +188,69 @@ class BrowserManager:
         device = device_config or None
         
         # Generate unique context ID
-        context_id = f"{browser_type.value}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        browser_value = browser_type.value
+        context_id = f"{browser_value}_{self._unique_suffix()}"
         
-        # Prepare context options
-        context_options = {
-            "record_video_dir": str(self.artifacts_path / "videos" / browser_type.value) if config.record_video else None,
-            "record_har_path": str(self.artifacts_path / "har" / browser_type.value / f"{context_id}.har") if config.record_har else None,
-            "ignore_https_errors": True,
-            "bypass_csp": config.bypass_csp,
-            "offline": config.offline,
-            "color_scheme": config.color_scheme,
-            "reduced_motion": config.reduced_motion,
-            "force_dark": config.force_dark_mode
-        }
-        
-        # Add device emulation if specified
-        if device:
-            context_options.update({
-                "viewport": {
-                    "width": device.viewport.width,
-                    "height": device.viewport.height
-                },
-                "user_agent": device.user_agent,
-                "device_scale_factor": device.device_scale_factor,
-                "is_mobile": device.is_mobile,
-                "has_touch": device.has_touch
-            })
+        # Options only depend on the profile, so they are built once per combination
+        context_options, har_template = _build_context_options(
+            self._video_dir[browser_value] if config.record_video else None,
+            self._har_dir[browser_value] if config.record_har else None,
+            config.bypass_csp,
+            config.offline,
+            "dark" if config.force_dark_mode else config.color_scheme,
+            config.reduced_motion,
+            device.viewport if device else None,
+            device.user_agent if device else None,
+            device.device_scale_factor if device else None,
+            device.is_mobile if device else None,
+            device.has_touch if device else None
+        )
+        har_path = har_template.format(context_id=context_id) if har_template else None
+        if har_path:
+            context_options = {**context_options, "record_har_path": har_path}
         
         context = await browser.new_context(**context_options)
+        if config.block_resources:
+            await self.block_resources(context, config.blocked_resource_types)
+        await context.new_page()
         self.contexts[context_id] = context
+        self._context_ids[context] = context_id
+        if har_path:
+            self._har_paths[context_id] = har_path
         return context
     
+    async def block_resources(self, context: BrowserContext, resource_types: Set[str]):
+        """Abort requests for the given resource types in a context"""
+        blocked = frozenset(resource_types)
+        
+        async def handle_route(route: Route):
+            if route.request.resource_type in blocked:
+                await route.abort()
+            else:
+                await route.continue_()
+        
+        await context.route("**/*", handle_route)
+        self._blocked_types[context] = blocked
+    
+    async def allow_resources(self, context: BrowserContext) -> Optional[frozenset]:
+        """Stop blocking resources in a context and return what was blocked"""
+        blocked = self._blocked_types.pop(context, None)
+        if blocked is not None:
+            await context.unroute("**/*")
+        return blocked
+    
+    def get_context_id(self, context: BrowserContext) -> Optional[str]:
+        """Get the ID under which a context was registered"""
+        return self._context_ids.get(context)
+    
     async def close_context(self, context_id: str):
         """Close a browser context"""
         if context_id in self.contexts:
-            await self.contexts[context_id].close()
-            del self.contexts[context_id]
+            context = self.contexts.pop(context_id)
+            self._context_ids.pop(context, None)
+            self._har_paths.pop(context_id, None)
+            self._blocked_types.pop(context, None)
+            await context.close()
     
     async def close_all(self):
         """Close all browser instances and contexts"""
@@ -113,6 +263,11 @@ class BrowserManager:
             await browser.close()
         
         self.browsers.clear()
+        
+        # Stop the shared Playwright driver
+        if self._pw:
+            await self._pw.stop()
+            self._pw = None
     
     async def take_screenshot(
         self,
@@ -121,10 +276,13 @@ class BrowserManager:
         browser_type: BrowserType
     ) -> str:
         """Take a screenshot in the given context"""
+        # Let assets load so the capture is representative; images aborted
+        # during the test are requested again without reloading the page
+        blocked = await self.allow_resources(context)
         page = context.pages[0]
-        screenshot_path = str(
-            self.artifacts_path / "screenshots" / browser_type.value / f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        )
+        if blocked and "image" in blocked:
+            await page.evaluate(_REFETCH_IMAGES_JS, _REFETCH_TIMEOUT_MS)
+        screenshot_path = f"{self._screenshot_dir[browser_type.value]}/{name}_{self._unique_suffix()}.png"
         await page.screenshot(path=screenshot_path, full_page=True)
         return screenshot_path
     
@@ -132,13 +290,15 @@ class BrowserManager:
         self,
         context: BrowserContext,
         browser_type: BrowserType,
-        name: str
+        name: str,
+        snapshots: bool = False,
+        sources: bool = False
     ):
-        """Start browser tracing"""
+        """Start browser tracing, with DOM snapshots and sources off by default"""
         await context.tracing.start(
             screenshots=True,
-            snapshots=True,
-            sources=True,
+            snapshots=snapshots,
+            sources=sources,
             name=name
         )
     
@@ -146,24 +306,25 @@ class BrowserManager:
         self,
         context: BrowserContext,
         browser_type: BrowserType,
-        name: str
-    ) -> str:
-        """Stop browser tracing and save the trace"""
-        trace_path = str(
-            self.artifacts_path / "traces" / browser_type.value / f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        )
+        name: str,
+        save: bool = True
+    ) -> Optional[str]:
+        """Stop browser tracing and save the trace, or discard it if `save` is off"""
+        if not save:
+            await context.tracing.stop()
+            return None
+        
+        trace_path = f"{self._trace_dir[browser_type.value]}/{name}_{self._unique_suffix()}.zip"
         await context.tracing.stop(path=trace_path)
         return trace_path
     
     def get_har_path(self, context_id: str) -> Optional[str]:
         """Get the HAR file path for a context"""
-        if context_id in self.contexts:
-            return str(self.artifacts_path / "har" / f"{context_id}.har")
-        return None
+        return self._har_paths.get(context_id)
     
-    def get_video_path(self, context_id: str) -> Optional[str]:
+    async def get_video_path(self, context_id: str) -> Optional[str]:
         """Get the video recording path for a context"""
         if context_id in self.contexts:
             page = self.contexts[context_id].pages[0]
-            return page.video.path() if page.video else None
+            return await page.video.path() if page.video else None
         return None
@@ -3,7 +3,8 @@ Models for multi-browser test execution configuration.
 """
 
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set
+from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime
 
@@ -19,7 +20,8 @@ class DeviceType(str, Enum):
     TABLET = "tablet"
     MOBILE = "mobile"
 
-class ViewportSize(BaseModel):
+@dataclass(frozen=True, slots=True)
+class ViewportSize:
     """Viewport dimensions"""
     width: int
     height: int
@@ -61,6 +63,9 @@ class BrowserContextConfig(BaseModel):
     color_scheme: str = "light"
     reduced_motion: str = "no-preference"
     force_dark_mode: bool = False
+    # Abort requests for these resource types; re-enabled for screenshots
+    block_resources: bool = True
+    blocked_resource_types: Set[str] = {"image", "media", "font"}
 
 class ParallelConfig(BaseModel):
     """Configuration for parallel test execution"""
@@ -68,22 +73,43 @@ class ParallelConfig(BaseModel):
     retry_failed: bool = True
     max_retries: int = 2
     retry_delay_ms: int = 1000
+    max_retry_delay_ms: int = 10000
     timeout_ms: int = 30000
+    # Discard traces and videos of passing tests
+    retain_on_failure: bool = True
 
-class BrowserTestResult(BaseModel):
+@dataclass(slots=True)
+class BrowserTestResult:
     """Result of a browser test execution"""
     browser_type: BrowserType
     device_name: Optional[str]
     status: str
     duration_ms: int
+    started_at: datetime
+    completed_at: datetime
     error_message: Optional[str] = None
     screenshot_path: Optional[str] = None
     video_path: Optional[str] = None
     trace_path: Optional[str] = None
     har_path: Optional[str] = None
-    logs: List[str] = []
-    started_at: datetime
-    completed_at: datetime
+    logs: List[str] = field(default_factory=list)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a dict of JSON-native values"""
+        return {
+            "browser_type": self.browser_type.value,
+            "device_name": self.device_name,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "started_at": self.started_at.isoformat(),
+            "completed_at": self.completed_at.isoformat(),
+            "error_message": self.error_message,
+            "screenshot_path": self.screenshot_path,
+            "video_path": self.video_path,
+            "trace_path": self.trace_path,
+            "har_path": self.har_path,
+            "logs": self.logs
+        }
 
 # Pre-configured device profiles
 DEVICE_PROFILES = {
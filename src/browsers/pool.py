@@ -0,0 +1,140 @@
+"""
+Pool of warm browser contexts reused across test executions.
+"""
+
+from typing import Dict, List, Optional, Tuple, AsyncIterator
+from contextlib import asynccontextmanager
+import time
+from playwright.async_api import BrowserContext
+from .models import BrowserType, BrowserContextConfig, DeviceConfig
+from .manager import BrowserManager
+
+# Clears the current origin's local storage and IndexedDB databases
+_CLEAR_STORAGE_JS = """async () => {
+    try { localStorage.clear(); } catch (e) {}
+    try {
+        const dbs = await indexedDB.databases();
+        await Promise.all(dbs.map(db => new Promise(resolve => {
+            const request = indexedDB.deleteDatabase(db.name);
+            request.onsuccess = request.onerror = request.onblocked = () => resolve();
+        })));
+    } catch (e) {}
+}"""
+
+PoolKey = Tuple[BrowserType, Optional[str], bool, bool, Optional[frozenset]]
+
+class ContextPool:
+    """Checks out idle contexts and resets them on check-in instead of recreating"""
+    
+    def __init__(
+        self,
+        browser_manager: BrowserManager,
+        max_idle_per_key: int = 4,
+        idle_timeout: float = 60.0
+    ):
+        self.browser_manager = browser_manager
+        self.max_idle_per_key = max_idle_per_key
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[PoolKey, List[Tuple[str, float]]] = {}
+    
+    @staticmethod
+    def _key(
+        browser_type: BrowserType,
+        device_config: Optional[DeviceConfig],
+        context_config: BrowserContextConfig
+    ) -> PoolKey:
+        return (
+            browser_type,
+            device_config.name if device_config else None,
+            context_config.record_video,
+            context_config.record_har,
+            frozenset(context_config.blocked_resource_types) if context_config.block_resources else None
+        )
+    
+    async def _evict_expired(self):
+        """Close contexts that have been idle longer than the timeout"""
+        cutoff = time.monotonic() - self.idle_timeout
+        # Detach everything first; other checkouts can touch the pool while we close
+        expired = []
+        for key, idle in self._idle.items():
+            expired.extend(context_id for context_id, last_used in idle if last_used < cutoff)
+            self._idle[key] = [item for item in idle if item[1] >= cutoff]
+        for context_id in expired:
+            await self.browser_manager.close_context(context_id)
+    
+    async def _reset(self, context: BrowserContext, config: BrowserContextConfig):
+        """Clear per-test state so the next checkout starts clean; raises if some can't be"""
+        await context.pages[0].evaluate(_CLEAR_STORAGE_JS)
+        await context.clear_cookies()
+        
+        # A fresh page drops session storage and history for every origin
+        pages = context.pages
+        await context.new_page()
+        for page in pages:
+            await page.close()
+        
+        # Other origins the test visited may still hold storage this page can't reach
+        state = await context.storage_state(indexed_db=True)
+        if state["origins"]:
+            raise RuntimeError("Context still holds storage for visited origins")
+        
+        # Screenshots lift resource blocking; restore it for the next test
+        await self.browser_manager.allow_resources(context)
+        if config.block_resources:
+            await self.browser_manager.block_resources(context, config.blocked_resource_types)
+    
+    @asynccontextmanager
+    async def acquire(
+        self,
+        browser_type: BrowserType,
+        device_config: Optional[DeviceConfig] = None,
+        context_config: Optional[BrowserContextConfig] = None
+    ) -> AsyncIterator[BrowserContext]:
+        """Check out a context for the duration of the block"""
+        config = context_config or BrowserContextConfig()
+        key = self._key(browser_type, device_config, config)
+        
+        # Contexts that record video/HAR must be closed to flush their files
+        poolable = not (config.record_video or config.record_har)
+        
+        await self._evict_expired()
+        
+        context = None
+        idle = self._idle.get(key)
+        while poolable and idle and context is None:
+            context_id, _ = idle.pop()
+            context = self.browser_manager.contexts.get(context_id)
+        
+        if context is None:
+            context = await self.browser_manager.create_context(
+                browser_type,
+                context_config=config,
+                device_config=device_config
+            )
+        context_id = self.browser_manager.get_context_id(context)
+        
+        try:
+            yield context
+        except BaseException:
+            # Don't hand a context in an unknown state to the next test
+            await self.browser_manager.close_context(context_id)
+            raise
+        
+        idle = self._idle.setdefault(key, [])
+        if not poolable or len(idle) >= self.max_idle_per_key:
+            await self.browser_manager.close_context(context_id)
+            return
+        
+        try:
+            await self._reset(context, config)
+        except Exception:
+            await self.browser_manager.close_context(context_id)
+            return
+        idle.append((context_id, time.monotonic()))
+    
+    async def close(self):
+        """Close all idle contexts"""
+        idle_contexts = [context_id for idle in self._idle.values() for context_id, _ in idle]
+        self._idle.clear()
+        for context_id in idle_contexts:
+            await self.browser_manager.close_context(context_id)
@@ -2,50 +2,108 @@
 Integration of the self-healing mechanism with test execution.
 """
 
-from typing import Dict, Any, Optional
-from playwright.sync_api import Page
+from typing import Dict, Any, Optional, Tuple
+from playwright.async_api import Page, BrowserContext, Error as PlaywrightError
+import logging
 import re
-from .service import HealingService
+import weakref
+from .service import get_healing_service
 from .models import ElementSnapshot, ElementAttributes, LocatorType
 
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+_LOCATOR_RE = re.compile(r'(#[\w-]+|//[^"]+|\.[\w-]+|\[.*?\])')
+_LOCATOR_TYPE_BY_PREFIX = {'#': LocatorType.ID, '/': LocatorType.XPATH}
+
+# Reads the attributes used for healing plus an absolute XPath in one call
+_SNAPSHOT_JS = """e => {
+    const steps = [];
+    for (let node = e; node && node.nodeType === Node.ELEMENT_NODE; node = node.parentElement) {
+        let index = 1;
+        for (let sibling = node.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+            if (sibling.tagName === node.tagName) index++;
+        }
+        steps.unshift(`${node.tagName.toLowerCase()}[${index}]`);
+    }
+    return {
+        tagName: e.tagName.toLowerCase(),
+        id: e.id,
+        classList: [...e.classList],
+        name: e.getAttribute('name'),
+        textContent: e.textContent,
+        ariaLabel: e.getAttribute('aria-label'),
+        testId: e.getAttribute('data-testid'),
+        href: e.getAttribute('href'),
+        type: e.getAttribute('type'),
+        placeholder: e.getAttribute('placeholder'),
+        value: e.value,
+        role: e.getAttribute('role'),
+        xpath: '/' + steps.join('/')
+    };
+}"""
+
+# In-page helper that finds the step's element and runs the step in one
+# round trip, returning a snapshot of the element when the step fails
+_HELPER_JS = """(() => {
+    if (window.__ta) return;
+    const snapshot = __SNAPSHOT__;
+    const find = sel => sel.startsWith('/')
+        ? document.evaluate(sel, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+        : document.querySelector(sel);
+    window.__ta = {
+        snapshotAndRun: async (sel, src) => {
+            let element = null;
+            try { element = find(sel); } catch (e) {}
+            if (!element) return { ok: false, found: false };
+            try {
+                let result = (0, eval)(src);
+                if (typeof result === 'function') result = result();
+                await result;
+                return { ok: true };
+            } catch (e) {
+                // Pages whose CSP forbids eval need the step sent over CDP instead
+                if (e instanceof EvalError) return { ok: false, found: true, evalBlocked: true };
+                return { ok: false, found: true, error: String(e), snapshot: snapshot(element) };
+            }
+        }
+    };
+})()""".replace("__SNAPSHOT__", _SNAPSHOT_JS)
+
 class HealingTestExecutor:
     def __init__(self):
-        self.healing_service = HealingService()
+        self.healing_service = get_healing_service()
+        # Healed locators keyed by the broken locator and element fingerprint
+        self._heal_cache: Dict[Tuple, Tuple[str, float]] = {}
+        self._prepared_contexts: "weakref.WeakSet[BrowserContext]" = weakref.WeakSet()
+    
+    async def prepare_context(self, context: BrowserContext):
+        """Install the in-page step helper in every current and future page"""
+        if context in self._prepared_contexts:
+            return
+        await context.add_init_script(_HELPER_JS)
+        for page in context.pages:
+            await page.evaluate(_HELPER_JS)
+        self._prepared_contexts.add(context)
         
     async def _capture_element_snapshot(
         self,
         page: Page,
-        locator: str
+        locator: str,
+        element_info: Optional[Dict[str, Any]] = None
     ) -> Optional[ElementSnapshot]:
-        """Capture a snapshot of an element's state"""
+        """Capture a snapshot of an element's state, unless one was prefetched"""
         try:
-            # Get element information
-            element_info = await page.evaluate(f"""(locator) => {{
-                const element = document.querySelector(locator);
-                if (!element) return null;
-                
-                return {{
-                    tagName: element.tagName.toLowerCase(),
-                    id: element.id,
-                    classList: Array.from(element.classList),
-                    name: element.getAttribute('name'),
-                    textContent: element.textContent,
-                    ariaLabel: element.getAttribute('aria-label'),
-                    testId: element.getAttribute('data-testid'),
-                    href: element.getAttribute('href'),
-                    type: element.getAttribute('type'),
-                    placeholder: element.getAttribute('placeholder'),
-                    value: element.value,
-                    role: element.getAttribute('role'),
-                    xpath: document.evaluate(
-                        'ancestor-or-self::*',
-                        element,
-                        null,
-                        XPathResult.ORDERED_NODE_SNAPSHOT_TYPE,
-                        null
-                    )
-                }};
-            }}""", locator)
+            if element_info is None:
+                # Resolve the locator once and read everything from the handle
+                handle = await page.query_selector(locator)
+                if not handle:
+                    return None
+                try:
+                    element_info = await handle.evaluate(_SNAPSHOT_JS)
+                finally:
+                    # Release the remote object so long sessions don't accumulate handles
+                    await handle.dispose()
             
             if not element_info:
                 return None
@@ -54,7 +112,7 @@ class HealingTestExecutor:
             attributes = ElementAttributes(
                 tag_name=element_info["tagName"],
                 id=element_info["id"],
-                class_names=set(element_info["classList"]),
+                class_names=frozenset(element_info["classList"]),
                 name=element_info["name"],
                 text_content=element_info["textContent"],
                 aria_label=element_info["ariaLabel"],
@@ -67,12 +125,8 @@ class HealingTestExecutor:
             )
             
             # Determine locator type
-            locator_type = LocatorType.CSS
-            if locator.startswith("//"):
-                locator_type = LocatorType.XPATH
-            elif locator.startswith("#"):
-                locator_type = LocatorType.ID
-            elif locator.startswith("[data-testid="):
+            locator_type = _LOCATOR_TYPE_BY_PREFIX.get(locator[:1], LocatorType.CSS)
+            if locator.startswith("[data-testid="):
                 locator_type = LocatorType.TEST_ID
             
             return ElementSnapshot(
@@ -84,7 +138,7 @@ class HealingTestExecutor:
             )
             
         except Exception as e:
-            print(f"Error capturing element snapshot: {str(e)}")
+            logger.warning("Error capturing element snapshot for %s: %s", locator, e, exc_info=True)
             return None
     
     async def execute_test_step(
@@ -98,21 +152,36 @@ class HealingTestExecutor:
         Returns True if step executed successfully.
         """
         # Extract locator from step
-        locator_match = re.search(r'(#[\w-]+|//[^"]+|\.[\w-]+|\[.*?\])', step)
+        locator_match = _LOCATOR_RE.search(step)
         if not locator_match:
             # No locator in step, execute as is
             try:
                 await page.evaluate(f"() => {{ {step} }}")
                 return True
-            except:
+            except PlaywrightError as e:
+                logger.debug("No-locator step failed: %s", e)
                 return False
         
         original_locator = locator_match.group(1)
+        locator_start, locator_end = locator_match.span(1)
         
+        prefetched = None
         for attempt in range(retries + 1):
             try:
                 if attempt == 0:
-                    # Try original locator first
+                    # Find the element and run the step in a single round trip
+                    outcome = await page.evaluate(
+                        "([s, src]) => window.__ta ? window.__ta.snapshotAndRun(s, src) : null",
+                        [original_locator, step]
+                    )
+                    if outcome and outcome["ok"]:
+                        return True
+                    if outcome and outcome["found"] and not outcome.get("evalBlocked"):
+                        # The step itself failed; keep the snapshot for healing
+                        prefetched = outcome["snapshot"]
+                        raise PlaywrightError(outcome["error"])
+                    
+                    # Try original locator first, giving it time to render
                     element = await page.wait_for_selector(original_locator, timeout=1000)
                     if element:
                         # Execute step
@@ -120,25 +189,43 @@ class HealingTestExecutor:
                         return True
                 else:
                     # Capture element snapshot for healing
-                    snapshot = await self._capture_element_snapshot(page, original_locator)
+                    snapshot = await self._capture_element_snapshot(
+                        page, original_locator, prefetched
+                    )
+                    prefetched = None
                     if not snapshot:
                         continue
                     
-                    # Attempt to heal
-                    healed_locator, confidence = await self.healing_service.heal_locator(
-                        page, original_locator, snapshot
+                    # Reuse an earlier heal of the same element before healing again;
+                    # it is only put back once the healed step has run successfully
+                    attributes = snapshot.attributes
+                    cache_key = (
+                        original_locator,
+                        attributes.tag_name,
+                        attributes.id,
+                        attributes.class_names,
+                        attributes.test_id,
+                        attributes.aria_label
                     )
+                    cached = self._heal_cache.pop(cache_key, None)
+                    if cached:
+                        healed_locator, confidence = cached
+                    else:
+                        healed_locator, confidence = await self.healing_service.heal_locator(
+                            page, original_locator, snapshot
+                        )
                     
                     if healed_locator and confidence > 0.7:
                         # Update step with healed locator
-                        healed_step = step.replace(original_locator, healed_locator)
+                        healed_step = f"{step[:locator_start]}{healed_locator}{step[locator_end:]}"
                         
                         # Execute healed step
                         await page.evaluate(healed_step)
+                        self._heal_cache[cache_key] = (healed_locator, confidence)
                         return True
             
-            except Exception as e:
-                print(f"Error executing step (attempt {attempt + 1}): {str(e)}")
+            except (PlaywrightError, TimeoutError) as e:
+                logger.warning("Error executing step (attempt %d): %s", attempt + 1, e, exc_info=True)
                 if attempt == retries:
                     return False
                 continue
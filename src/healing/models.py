@@ -2,10 +2,12 @@
 Models for the self-healing test mechanism.
 """
 
-from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Set
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import List, Dict, Optional, FrozenSet
+from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime
+import time
 
 class LocatorType(str, Enum):
     """Types of element locators"""
@@ -18,11 +20,12 @@ class LocatorType(str, Enum):
     CLASS = "class"
     NAME = "name"
 
-class ElementAttributes(BaseModel):
+@dataclass(frozen=True, slots=True)
+class ElementAttributes:
     """Model for storing element attributes"""
     tag_name: str
     id: Optional[str] = None
-    class_names: Set[str] = Field(default_factory=set)
+    class_names: FrozenSet[str] = frozenset()
     name: Optional[str] = None
     text_content: Optional[str] = None
     aria_label: Optional[str] = None
@@ -33,14 +36,23 @@ class ElementAttributes(BaseModel):
     value: Optional[str] = None
     role: Optional[str] = None
 
-class ElementSnapshot(BaseModel):
+@dataclass(frozen=True, slots=True)
+class ElementSnapshot:
     """Snapshot of an element's state"""
     locator: str
     locator_type: LocatorType
     attributes: ElementAttributes
     xpath_path: str
     parent_chain: List[ElementAttributes]
-    timestamp: datetime = Field(default_factory=datetime.now)
+    timestamp: datetime = field(default_factory=datetime.now)
+
+def _to_unix_seconds(value):
+    """Convert datetimes and ISO-8601 strings to Unix seconds, passing others through"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
 
 class HealingAttempt(BaseModel):
     """Record of a healing attempt"""
@@ -49,7 +61,17 @@ class HealingAttempt(BaseModel):
     success: bool
     strategy_used: str
     confidence_score: float
-    timestamp: datetime = Field(default_factory=datetime.now)
+    # Unix seconds; formatted only when displayed
+    timestamp: float = Field(default_factory=time.time)
+    
+    @field_validator("timestamp", mode="before")
+    @classmethod
+    def _parse_timestamp(cls, value):
+        """Accept ISO-8601 strings written by older history files"""
+        return _to_unix_seconds(value)
+
+# Recent attempts kept per locator; the counters below cover all of them
+MAX_HEALING_ATTEMPTS = 256
 
 class HealingHistory(BaseModel):
     """History of healing attempts for a locator"""
@@ -57,7 +79,48 @@ class HealingHistory(BaseModel):
     element_snapshot: ElementSnapshot
     healing_attempts: List[HealingAttempt] = []
     last_successful_locator: Optional[str] = None
-    last_success_timestamp: Optional[datetime] = None
+    last_success_timestamp: Optional[float] = None
+    success_count: int = 0
+    failure_count: int = 0
+    sum_confidence: float = 0.0
+    # Strategy name -> [successes, attempts]
+    strategy_counts: Dict[str, List[int]] = Field(default_factory=dict)
+    
+    @field_validator("last_success_timestamp", mode="before")
+    @classmethod
+    def _parse_timestamp(cls, value):
+        """Accept ISO-8601 strings written by older history files"""
+        return _to_unix_seconds(value)
+    
+    @model_validator(mode="after")
+    def _backfill_counters(self):
+        """Derive the counters for histories saved before they existed"""
+        if self.healing_attempts and not (self.success_count or self.failure_count):
+            attempts, self.healing_attempts = self.healing_attempts, []
+            for attempt in attempts:
+                self.record(attempt)
+        return self
+    
+    @property
+    def attempt_count(self) -> int:
+        return self.success_count + self.failure_count
+    
+    def record(self, attempt: HealingAttempt):
+        """Add an attempt, keeping only the most recent ones"""
+        self.healing_attempts.append(attempt)
+        if len(self.healing_attempts) > MAX_HEALING_ATTEMPTS:
+            del self.healing_attempts[:-MAX_HEALING_ATTEMPTS]
+        
+        counts = self.strategy_counts.setdefault(attempt.strategy_used, [0, 0])
+        counts[1] += 1
+        if attempt.success:
+            counts[0] += 1
+            self.success_count += 1
+            self.last_successful_locator = attempt.healed_locator
+            self.last_success_timestamp = attempt.timestamp
+        else:
+            self.failure_count += 1
+        self.sum_confidence += attempt.confidence_score
 
 class HealingStats(BaseModel):
     """Statistics for healing attempts"""
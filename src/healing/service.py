@@ -3,24 +3,54 @@ Service layer for the self-healing test mechanism.
 """
 
 from typing import List, Optional, Dict, Tuple
-from playwright.sync_api import Page
+from playwright.async_api import Page, Error as PlaywrightError
 from .models import (
     ElementSnapshot, HealingAttempt, HealingHistory,
     HealingStats, LocatorType
 )
 from .strategies import (
+    DomSnapshot,
     TextSimilarityStrategy,
     AttributeBasedStrategy,
     XPathStrategy
 )
-import json
+import asyncio
+import functools
+import logging
+import os
+import orjson
 from pathlib import Path
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+def _json_default(obj):
+    """Serialize sets as lists and anything else as its string form"""
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    return str(obj)
+
+# Cheap page-change probe used to key the DOM snapshot cache
+_DOM_SIZE_JS = "() => document.body ? document.body.innerHTML.length : 0"
+
 class HealingService:
-    def __init__(self, storage_path: str = "./data/healing"):
+    def __init__(self, storage_path: str = "./data/healing", compact_every: int = 500):
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
+        self._history_path = self.storage_path / "healing_history.json"
+        self._attempts_path = self.storage_path / "healing_attempts.jsonl"
+        
+        # Attempts are appended to a JSON-Lines log by a background writer and
+        # folded into the history snapshot every `compact_every` writes
+        self.compact_every = compact_every
+        # Created on the running loop by _queue(), since the service outlives loops
+        self._write_queue: Optional["asyncio.Queue[bytes]"] = None
+        self._queue_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        # Lines from a failed write, retried with the next batch or on flush()
+        self._unwritten: List[bytes] = []
+        self._writes_since_compaction = 0
+        self._dom_cache: Optional[Tuple[Tuple[str, int], DomSnapshot]] = None
         
         # Initialize healing strategies
         self.strategies = [
@@ -31,55 +61,181 @@ class HealingService:
         
         # Load healing history
         self.healing_history: Dict[str, HealingHistory] = self._load_history()
-        self.stats = self._calculate_stats()
+        self._calculate_stats()
         
     def _load_history(self) -> Dict[str, HealingHistory]:
-        """Load healing history from storage"""
+        """Load the history snapshot and replay the attempts logged after it"""
         history = {}
-        if (self.storage_path / "healing_history.json").exists():
-            with open(self.storage_path / "healing_history.json", "r") as f:
-                data = json.load(f)
-                for item in data:
-                    history_item = HealingHistory(**item)
-                    history[history_item.original_locator] = history_item
+        if self._history_path.exists():
+            for item in orjson.loads(self._history_path.read_bytes()):
+                history_item = HealingHistory(**item)
+                history[history_item.original_locator] = history_item
+        
+        if self._attempts_path.exists():
+            with open(self._attempts_path, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        self._apply_logged_attempt(history, orjson.loads(line))
         return history
     
+    @staticmethod
+    def _apply_logged_attempt(history: Dict[str, HealingHistory], entry: Dict):
+        """Replay one line of the attempts log into the history"""
+        locator = entry["locator"]
+        if locator not in history:
+            if "snapshot" not in entry:
+                return
+            history[locator] = HealingHistory(
+                original_locator=locator,
+                element_snapshot=entry["snapshot"]
+            )
+        
+        history[locator].record(HealingAttempt(**entry["attempt"]))
+    
+    def _serialize_history(self) -> bytes:
+        """Serialize the full healing history"""
+        return orjson.dumps(
+            [history.model_dump() for history in self.healing_history.values()],
+            default=_json_default
+        )
+    
     def _save_history(self):
         """Save healing history to storage"""
-        with open(self.storage_path / "healing_history.json", "w") as f:
-            json.dump(
-                [history.dict() for history in self.healing_history.values()],
-                f,
-                default=str
-            )
+        self._history_path.write_bytes(self._serialize_history())
+    
+    def _log_attempt(self, locator: str, attempt: HealingAttempt, history: HealingHistory):
+        """Queue an attempt for the background writer"""
+        entry = {"locator": locator, "attempt": attempt.model_dump()}
+        if history.attempt_count == 1:
+            entry["snapshot"] = history.model_dump()["element_snapshot"]
+        queue = self._queue()
+        queue.put_nowait(orjson.dumps(entry, default=_json_default) + b"\n")
+        
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._writer_loop(queue))
+    
+    def _queue(self) -> "asyncio.Queue[bytes]":
+        """Write queue bound to the running loop, carrying over lines left on an old one"""
+        loop = asyncio.get_running_loop()
+        if self._queue_loop is not loop:
+            if self._write_queue is not None:
+                while not self._write_queue.empty():
+                    self._unwritten.append(self._write_queue.get_nowait())
+            self._write_queue = asyncio.Queue()
+            self._queue_loop = loop
+            self._writer_task = None
+        return self._write_queue
+    
+    def _append_lines(self, lines: List[bytes]):
+        """Append serialized attempts to the log"""
+        with open(self._attempts_path, "ab") as f:
+            f.write(b"".join(lines))
+    
+    def _compact(self, snapshot: bytes):
+        """Replace the snapshot and truncate the attempts log"""
+        tmp_path = self._history_path.with_suffix(".json.tmp")
+        tmp_path.write_bytes(snapshot)
+        os.replace(tmp_path, self._history_path)
+        self._attempts_path.write_bytes(b"")
+    
+    async def _write_batch(self, lines: List[bytes]):
+        """Append a batch, or compact when enough writes have accumulated"""
+        lines = self._unwritten + lines
+        self._unwritten = []
+        try:
+            if self._writes_since_compaction + len(lines) >= self.compact_every:
+                # The in-memory history already contains every queued
+                # attempt, so the snapshot supersedes the batch
+                snapshot = self._serialize_history()
+                await asyncio.to_thread(self._compact, snapshot)
+                self._writes_since_compaction = 0
+            else:
+                await asyncio.to_thread(self._append_lines, lines)
+                self._writes_since_compaction += len(lines)
+        except Exception:
+            # Keep the batch for the next write instead of losing it
+            self._unwritten = lines
+            raise
+    
+    async def _writer_loop(self, queue: "asyncio.Queue[bytes]"):
+        """Write queued attempts to disk off the healing path"""
+        while True:
+            lines = [await queue.get()]
+            while not queue.empty():
+                lines.append(queue.get_nowait())
+            
+            try:
+                await self._write_batch(lines)
+            except Exception:
+                logger.exception("Failed to write %d healing attempts; will retry", len(lines))
+            finally:
+                for _ in lines:
+                    queue.task_done()
+    
+    async def flush(self):
+        """Wait until all queued attempts are on disk; raises if they can't be written"""
+        if self._write_queue is not None and self._queue_loop is asyncio.get_running_loop():
+            await self._write_queue.join()
+        if self._unwritten:
+            await self._write_batch([])
     
     def _calculate_stats(self) -> HealingStats:
-        """Calculate healing statistics"""
-        stats = HealingStats()
+        """Calculate healing statistics from the full history"""
+        self.stats = HealingStats()
+        self._strategy_counts: Dict[str, List[int]] = {}
         
+        # Sum the per-locator counters; attempt lists are trimmed
+        stats = self.stats
+        total_confidence = 0.0
         for history in self.healing_history.values():
-            for attempt in history.healing_attempts:
-                stats.total_attempts += 1
-                if attempt.success:
-                    stats.successful_attempts += 1
-                else:
-                    stats.failed_attempts += 1
-                    
-                # Update strategy success rates
-                if attempt.strategy_used not in stats.strategy_success_rates:
-                    stats.strategy_success_rates[attempt.strategy_used] = 0
-                current_rate = stats.strategy_success_rates[attempt.strategy_used]
-                stats.strategy_success_rates[attempt.strategy_used] = (
-                    current_rate + (1 if attempt.success else 0)
-                ) / 2
-                
-                stats.average_confidence_score += attempt.confidence_score
-                
-        if stats.total_attempts > 0:
-            stats.average_confidence_score /= stats.total_attempts
-            
-        stats.healing_history = list(self.healing_history.values())
-        return stats
+            stats.successful_attempts += history.success_count
+            stats.failed_attempts += history.failure_count
+            total_confidence += history.sum_confidence
+            for strategy, (successes, attempts) in history.strategy_counts.items():
+                counts = self._strategy_counts.setdefault(strategy, [0, 0])
+                counts[0] += successes
+                counts[1] += attempts
+        
+        stats.total_attempts = stats.successful_attempts + stats.failed_attempts
+        if stats.total_attempts:
+            stats.average_confidence_score = total_confidence / stats.total_attempts
+        stats.strategy_success_rates = {
+            strategy: successes / attempts
+            for strategy, (successes, attempts) in self._strategy_counts.items()
+        }
+        
+        self.stats.healing_history = list(self.healing_history.values())
+        return self.stats
+    
+    def _record_attempt_stats(self, attempt: HealingAttempt):
+        """Fold a single attempt into the running statistics"""
+        stats = self.stats
+        stats.total_attempts += 1
+        if attempt.success:
+            stats.successful_attempts += 1
+        else:
+            stats.failed_attempts += 1
+        
+        # Update strategy success rates
+        counts = self._strategy_counts.setdefault(attempt.strategy_used, [0, 0])
+        counts[0] += 1 if attempt.success else 0
+        counts[1] += 1
+        stats.strategy_success_rates[attempt.strategy_used] = counts[0] / counts[1]
+        
+        # Running mean of the confidence score
+        stats.average_confidence_score += (
+            attempt.confidence_score - stats.average_confidence_score
+        ) / stats.total_attempts
+    
+    async def _get_dom_snapshot(self, page: Page) -> DomSnapshot:
+        """Capture the page DOM, reusing the last capture if the page is unchanged"""
+        key = (page.url, await page.evaluate(_DOM_SIZE_JS))
+        if self._dom_cache and self._dom_cache[0] == key:
+            return self._dom_cache[1]
+        
+        dom_snapshot = await DomSnapshot.capture(page)
+        self._dom_cache = (key, dom_snapshot)
+        return dom_snapshot
     
     async def heal_locator(
         self,
@@ -95,23 +251,38 @@ class HealingService:
         best_confidence = 0.0
         successful_strategy = None
         
-        # Try each strategy
-        for strategy in self.strategies:
-            healed_locator, confidence = await strategy.heal(page, snapshot)
-            
-            # Apply strategy weight
-            weighted_confidence = confidence * strategy.weight
-            
-            if healed_locator and weighted_confidence > best_confidence:
-                # Verify the healed locator works
-                try:
-                    element = await page.wait_for_selector(healed_locator, timeout=1000)
-                    if element:
-                        best_locator = healed_locator
-                        best_confidence = weighted_confidence
-                        successful_strategy = strategy.name
-                except:
+        # Walk the DOM once for all strategies
+        dom_snapshot = await self._get_dom_snapshot(page)
+        
+        # Run all strategies concurrently; they only read the page
+        results = await asyncio.gather(
+            *(strategy.heal(page, snapshot, dom_snapshot) for strategy in self.strategies),
+            return_exceptions=True
+        )
+        
+        # Apply strategy weights and rank the candidates
+        candidates = sorted(
+            (
+                (result[1] * strategy.weight, result[1], result[0], strategy.name)
+                for strategy, result in zip(self.strategies, results)
+                if not isinstance(result, BaseException) and result[0]
+            ),
+            key=lambda candidate: candidate[0],
+            reverse=True
+        )
+        
+        # Verify from the most confident down with a non-waiting count and
+        # stop at the first that matches; the DOM capture may be stale
+        for weighted_confidence, confidence, healed_locator, strategy_name in candidates:
+            try:
+                if not await page.locator(healed_locator).count():
                     continue
+            except PlaywrightError:
+                continue
+            best_locator = healed_locator
+            best_confidence = weighted_confidence
+            successful_strategy = strategy_name
+            break
         
         # Record healing attempt
         attempt = HealingAttempt(
@@ -128,17 +299,14 @@ class HealingService:
                 original_locator=locator,
                 element_snapshot=snapshot
             )
+            self.stats.healing_history.append(self.healing_history[locator])
         
         history = self.healing_history[locator]
-        history.healing_attempts.append(attempt)
-        
-        if best_locator:
-            history.last_successful_locator = best_locator
-            history.last_success_timestamp = datetime.now()
+        history.record(attempt)
         
         # Save and update stats
-        self._save_history()
-        self.stats = self._calculate_stats()
+        self._log_attempt(locator, attempt, history)
+        self._record_attempt_stats(attempt)
         
         return best_locator, best_confidence
     
@@ -149,3 +317,13 @@ class HealingService:
     def get_history(self, locator: str) -> Optional[HealingHistory]:
         """Get healing history for a specific locator"""
         return self.healing_history.get(locator)
+
+@functools.lru_cache(maxsize=1)
+def get_healing_service() -> HealingService:
+    """Process-wide HealingService, so history is loaded and scanned once"""
+    return HealingService()
+
+async def flush_healing_service():
+    """Flush the process-wide HealingService, if one was created"""
+    if get_healing_service.cache_info().currsize:
+        await get_healing_service().flush()
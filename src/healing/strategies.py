@@ -2,76 +2,154 @@
 Implementation of different healing strategies for test automation.
 """
 
-from typing import Optional, List, Tuple
-import difflib
+from typing import Optional, List, Tuple, Dict
+import asyncio
+import lxml.html
+import numpy as np
+from rapidfuzz import fuzz, process
 from playwright.sync_api import Page, Locator
 from .models import ElementSnapshot, LocatorType, ElementAttributes
+import json
 import re
 from bs4 import BeautifulSoup
 
+class DomSnapshot:
+    """Compact capture of every element on a page, shared by all strategies"""
+    TAG, ID, CLASSES, TEXT, NAME, ROLE, TEST_ID = range(7)
+    
+    def __init__(self, rows: List[list]):
+        self.rows = rows
+    
+    @classmethod
+    def from_html(cls, html: str) -> "DomSnapshot":
+        """Parse serialized HTML into [tag, id, classes, text, name, role, data-testid] rows"""
+        root = lxml.html.document_fromstring(html)
+        return cls([
+            [
+                el.tag.lower(),
+                el.get("id", ""),
+                el.get("class", "").split(),
+                el.text_content(),
+                el.get("name"),
+                el.get("role"),
+                el.get("data-testid")
+            ]
+            for el in root.iter()
+            if isinstance(el.tag, str)
+        ])
+    
+    @classmethod
+    async def capture(cls, page: Page) -> "DomSnapshot":
+        """Fetch the page HTML once and parse it off the event loop"""
+        return await asyncio.to_thread(cls.from_html, await page.content())
+
 class BaseStrategy:
     """Base class for healing strategies"""
     def __init__(self, name: str, weight: float = 1.0):
         self.name = name
         self.weight = weight
         
-    async def heal(self, page: Page, snapshot: ElementSnapshot) -> Tuple[Optional[str], float]:
+    async def heal(
+        self,
+        page: Page,
+        snapshot: ElementSnapshot,
+        dom_snapshot: DomSnapshot
+    ) -> Tuple[Optional[str], float]:
         """
         Attempt to heal a broken locator.
         Returns: (healed_locator, confidence_score)
         """
         raise NotImplementedError
 
+def css_id(value: str) -> str:
+    """Build a CSS selector for an exact id, escaping what a bare #id can't hold"""
+    escaped = re.sub(r'[\x00-\x1f\x7f"\\]', lambda m: f"\\{ord(m.group()):x} ", value)
+    return f'[id="{escaped}"]'
+
 class TextSimilarityStrategy(BaseStrategy):
     """Heal by finding elements with similar text content"""
     def __init__(self):
         super().__init__("text_similarity", weight=0.8)
     
-    async def heal(self, page: Page, snapshot: ElementSnapshot) -> Tuple[Optional[str], float]:
+    async def heal(
+        self,
+        page: Page,
+        snapshot: ElementSnapshot,
+        dom_snapshot: DomSnapshot
+    ) -> Tuple[Optional[str], float]:
         try:
-            # Get all text content from the page
-            all_text_content = await page.evaluate("""() => {
-                return Array.from(document.querySelectorAll('*'))
-                    .map(el => ({
-                        text: el.textContent,
-                        tag: el.tagName.toLowerCase(),
-                        id: el.id,
-                        classes: Array.from(el.classList)
-                    }));
-            }""")
-            
             target_text = snapshot.attributes.text_content
             if not target_text:
                 return None, 0.0
-                
-            # Find best match
-            best_match = None
-            best_score = 0.0
-            
-            for element in all_text_content:
-                if not element['text']:
-                    continue
-                    
-                score = difflib.SequenceMatcher(None, target_text, element['text']).ratio()
-                
-                # Boost score if tag name matches
-                if element['tag'] == snapshot.attributes.tag_name:
-                    score *= 1.2
-                    
-                # Boost score if some classes match
-                common_classes = set(element['classes']) & snapshot.attributes.class_names
-                if common_classes:
-                    score *= (1 + 0.1 * len(common_classes))
-                
-                if score > best_score:
-                    best_score = score
-                    best_match = element
-            
-            if best_match and best_score > 0.7:
-                # Create appropriate locator based on best match
-                if best_match['id']:
-                    return f"#{best_match['id']}", best_score
-                return f"//*[contains(text(), '{target_text}')]", best_score * 0.9
+            
+            TAG, ID, CLASSES, TEXT = (
+                DomSnapshot.TAG, DomSnapshot.ID, DomSnapshot.CLASSES, DomSnapshot.TEXT
+            )
+            candidates = [row for row in dom_snapshot.rows if row[TEXT]]
+            if not candidates:
+                return None, 0.0
+            
+            target_tag = snapshot.attributes.tag_name
+            target_classes = snapshot.attributes.class_names
+            
+            # Elements sharing a class list reuse one overlap count
+            overlap_by_classes: Dict[Tuple[str, ...], int] = {}
+            def boost(row: list) -> float:
+                """Boost score if tag name matches and if some classes match"""
+                key = tuple(row[CLASSES])
+                if key not in overlap_by_classes:
+                    overlap_by_classes[key] = len(target_classes.intersection(key))
+                return (1.2 if row[TAG] == target_tag else 1.0) * (1.0 + 0.1 * overlap_by_classes[key])
+            
+            def result(row: list, score: float) -> Tuple[str, float]:
+                """Locator for the winning row; boosts can push a score past 1.0"""
+                score = min(score, 1.0)
+                if row[ID]:
+                    return css_id(row[ID]), score
+                return f"//*[contains(text(), {xq(target_text)})]", score * 0.9
+            
+            # The same element re-rendered keeps its text and tag, so it
+            # scores a similarity of 1.0 without running the matcher
+            exact = [
+                row for row in candidates
+                if row[TEXT] == target_text and row[TAG] == target_tag
+            ]
+            if exact:
+                best_match = max(exact, key=boost)
+                return result(best_match, boost(best_match))
+            
+            # Scores below this can't reach the threshold even with every boost
+            max_boost = 1.2 * (1 + 0.1 * len(target_classes))
+            
+            # Score each distinct text once in a batched Levenshtein pass;
+            # repeated labels (list rows, buttons) share the result
+            texts = [row[TEXT] for row in candidates]
+            text_index = {text: i for i, text in enumerate(dict.fromkeys(texts))}
+            unique_similarities = process.cdist(
+                [target_text],
+                list(text_index),
+                scorer=fuzz.ratio,
+                score_cutoff=70 / max_boost,
+                workers=-1
+            )[0] / 100
+            similarities = unique_similarities[
+                np.fromiter((text_index[text] for text in texts), dtype=np.intp, count=len(texts))
+            ]
+            
+            # Only rows that passed the cutoff can win, so boost just those
+            hits = np.flatnonzero(similarities)
+            if not hits.size:
+                return None, 0.0
+            
+            boosts = np.fromiter(
+                (boost(candidates[i]) for i in hits), dtype=np.float64, count=hits.size
+            )
+            scores = similarities[hits] * boosts
+            
+            best_hit = int(np.argmax(scores))
+            best_score = float(scores[best_hit])
+            if best_score > 0.7:
+                return result(candidates[hits[best_hit]], best_score)
                 
             return None, 0.0
             
@@ -79,54 +157,69 @@ class TextSimilarityStrategy(BaseStrategy):
             print(f"Error in TextSimilarityStrategy: {str(e)}")
             return None, 0.0
 
+# Returns [selector, 1] when the selector is unique, [selector, 2] when it is
+# unique among elements containing the text, and [selector, 0] otherwise
+_ATTRIBUTE_SELECTOR_JS = """(args) => {
+    let sel = args.tag + args.classes.map(c => '.' + CSS.escape(c)).join('');
+    if (args.testId) sel += `[data-testid="${CSS.escape(args.testId)}"]`;
+    if (args.name) sel += `[name="${CSS.escape(args.name)}"]`;
+    if (args.role) sel += `[role="${CSS.escape(args.role)}"]`;
+    let els;
+    try { els = document.querySelectorAll(sel); } catch (e) { return [sel, 0]; }
+    if (els.length === 1) return [sel, 1];
+    if (els.length > 1 && args.txt) {
+        // Match the way :has-text() does: case-insensitive, whitespace collapsed
+        const norm = s => s.replace(/\\s+/g, ' ').trim().toLowerCase();
+        const txt = norm(args.txt);
+        const filtered = [...els].filter(e => norm(e.textContent).includes(txt));
+        if (filtered.length === 1) return [sel, 2];
+    }
+    return [sel, 0];
+}"""
+
 class AttributeBasedStrategy(BaseStrategy):
     """Heal by matching element attributes"""
     def __init__(self):
         super().__init__("attribute_based", weight=0.9)
     
-    async def heal(self, page: Page, snapshot: ElementSnapshot) -> Tuple[Optional[str], float]:
+    async def heal(
+        self,
+        page: Page,
+        snapshot: ElementSnapshot,
+        dom_snapshot: DomSnapshot
+    ) -> Tuple[Optional[str], float]:
+        # Needs live selector matching, so it queries the page directly
         try:
-            # Build a complex CSS selector based on available attributes
-            selectors = []
-            confidence = 0.0
-            
-            # Start with tag name
-            selector_parts = [snapshot.attributes.tag_name]
-            confidence += 0.1
-            
-            # Add class names
-            if snapshot.attributes.class_names:
-                selector_parts.extend(f".{cls}" for cls in snapshot.attributes.class_names)
+            # Confidence grows with the attributes available for the selector
+            attributes = snapshot.attributes
+            confidence = 0.1
+            if attributes.class_names:
                 confidence += 0.2
-            
-            # Add other attributes
-            if snapshot.attributes.test_id:
-                selector_parts.append(f"[data-testid='{snapshot.attributes.test_id}']")
+            if attributes.test_id:
                 confidence += 0.3
-                
-            if snapshot.attributes.name:
-                selector_parts.append(f"[name='{snapshot.attributes.name}']")
+            if attributes.name:
                 confidence += 0.2
-                
-            if snapshot.attributes.role:
-                selector_parts.append(f"[role='{snapshot.attributes.role}']")
+            if attributes.role:
                 confidence += 0.2
-                
-            # Combine into CSS selector
-            selector = ''.join(selector_parts)
             
-            # Verify the selector finds exactly one element
-            count = await page.evaluate(f"document.querySelectorAll('{selector}').length")
+            # Build, count and text-disambiguate the selector in one round trip
+            selector, match = await page.evaluate(_ATTRIBUTE_SELECTOR_JS, {
+                "tag": attributes.tag_name,
+                "classes": sorted(attributes.class_names),
+                "testId": attributes.test_id,
+                "name": attributes.name,
+                "role": attributes.role,
+                "txt": attributes.text_content or ""
+            })
             
-            if count == 1:
+            if match == 1:
                 return selector, min(confidence, 1.0)
-            elif count > 1:
-                # Try to make it more specific
-                if snapshot.attributes.text_content:
-                    selector += f":contains('{snapshot.attributes.text_content}')"
-                    count = await page.evaluate(f"document.querySelectorAll('{selector}').length")
-                    if count == 1:
-                        return selector, min(confidence * 0.9, 1.0)
+            elif match == 2:
+                # Unique only among elements containing the snapshot's text
+                return (
+                    f"{selector}:has-text({json.dumps(attributes.text_content)})",
+                    min(confidence * 0.9, 1.0)
+                )
                         
             return None, 0.0
             
@@ -134,16 +227,54 @@ class AttributeBasedStrategy(BaseStrategy):
             print(f"Error in AttributeBasedStrategy: {str(e)}")
             return None, 0.0
 
+_XPATH_COUNT_JS = """(xp) => document.evaluate(
+    'count(' + xp + ')', document, null, XPathResult.NUMBER_TYPE, null
+).numberValue"""
+
+def xq(value: str) -> str:
+    """Quote a string as an XPath 1.0 literal"""
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    # XPath 1.0 has no escape sequences, so split on single quotes
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in value.split("'")) + ")"
+
+def _xpath_conditions(attributes: ElementAttributes) -> List[str]:
+    """Build the class and text predicates for one XPath step"""
+    conditions = [
+        f"contains(@class, {xq(name)})" for name in sorted(attributes.class_names)
+    ]
+    if attributes.text_content:
+        conditions.append(f"contains(text(), {xq(attributes.text_content)})")
+    return conditions
+
+def _xpath_step(tag_name: str, conditions: List[str]) -> str:
+    """Join a descendant step and its predicates"""
+    if not conditions:
+        return f"//{tag_name}"
+    return f"//{tag_name}[{' and '.join(conditions)}]"
+
 class XPathStrategy(BaseStrategy):
     """Heal by generating relative XPath"""
     def __init__(self):
         super().__init__("xpath", weight=0.7)
     
-    async def heal(self, page: Page, snapshot: ElementSnapshot) -> Tuple[Optional[str], float]:
+    async def heal(
+        self,
+        page: Page,
+        snapshot: ElementSnapshot,
+        dom_snapshot: DomSnapshot
+    ) -> Tuple[Optional[str], float]:
+        # Needs live selector matching, so it queries the page directly
         try:
-            # Start with the most specific attributes
-            if snapshot.attributes.id:
-                xpath = f"//{snapshot.attributes.tag_name}[@id='{snapshot.attributes.id}']"
+            # Start with the most specific attributes, if that element is still on the page
+            if snapshot.attributes.id and any(
+                row[DomSnapshot.ID] == snapshot.attributes.id
+                and row[DomSnapshot.TAG] == snapshot.attributes.tag_name
+                for row in dom_snapshot.rows
+            ):
+                xpath = f"//{snapshot.attributes.tag_name}[@id={xq(snapshot.attributes.id)}]"
                 return xpath, 1.0
                 
             # Build XPath based on parent chain
@@ -151,44 +282,26 @@ class XPathStrategy(BaseStrategy):
             confidence = 0.0
             
             for parent in snapshot.parent_chain:
-                part = f"//{parent.tag_name}"
-                conditions = []
-                
+                conditions = _xpath_conditions(parent)
                 if parent.class_names:
-                    conditions.append(f"contains(@class, '{' '.join(parent.class_names)}')")
                     confidence += 0.1
-                    
                 if parent.text_content:
-                    conditions.append(f"contains(text(), '{parent.text_content}')")
                     confidence += 0.2
-                    
-                if conditions:
-                    part += f"[{' and '.join(conditions)}]"
-                    
-                xpath_parts.append(part)
+                xpath_parts.append(_xpath_step(parent.tag_name, conditions))
             
             # Add target element
-            target_part = f"//{snapshot.attributes.tag_name}"
-            conditions = []
-            
+            conditions = _xpath_conditions(snapshot.attributes)
             if snapshot.attributes.class_names:
-                conditions.append(f"contains(@class, '{' '.join(snapshot.attributes.class_names)}')")
                 confidence += 0.2
-                
             if snapshot.attributes.text_content:
-                conditions.append(f"contains(text(), '{snapshot.attributes.text_content}')")
                 confidence += 0.3
-                
-            if conditions:
-                target_part += f"[{' and '.join(conditions)}]"
-                
-            xpath_parts.append(target_part)
+            xpath_parts.append(_xpath_step(snapshot.attributes.tag_name, conditions))
             
             # Combine XPath parts
             xpath = "".join(xpath_parts)
             
             # Verify uniqueness
-            count = await page.evaluate(f"document.evaluate('count({xpath})', document, null, XPathResult.NUMBER_TYPE, null).numberValue")
+            count = await page.evaluate(_XPATH_COUNT_JS, xpath)
             
             if count == 1:
                 return xpath, min(confidence, 1.0)
@@ -7,11 +7,26 @@ for the RAG system.
 """
 
 from typing import Dict, Any
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, ConfigDict
 from .agent.graph import AutonomousQAAgent
 from .rag.ingestion import ingest_data
 from .review.api import router as review_router
+from .review.service import ReviewService
+from .healing.service import flush_healing_service
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create one QA agent and review service per worker process for the app's lifetime"""
+    # Loading stored reviews is file I/O, so it runs in a thread instead of at import
+    review = asyncio.create_task(asyncio.to_thread(ReviewService))
+    app.state.agent = await asyncio.to_thread(AutonomousQAAgent)
+    app.state.review = await review
+    yield
+    await flush_healing_service()
+    await asyncio.to_thread(app.state.review.close)
 
 # Initialize FastAPI application with metadata
 app = FastAPI(
@@ -19,30 +34,31 @@ app = FastAPI(
     description="An API to trigger the AI-driven QA workflow.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Include the review system router
 app.include_router(review_router)
 
-# Initialize the QA agent
-agent = AutonomousQAAgent()
-
 class TestRequest(BaseModel):
     """
     Request model for the QA workflow endpoint.
     
     Attributes:
         user_story (str): The user story or requirement to generate and execute tests for.
+        no_cache (bool): Skip the retrieval cache and always query the knowledge base.
     """
     user_story: str
+    no_cache: bool = False
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "user_story": "As a premium user, I want to export my dashboard as a PDF."
             }
         }
+    )
 
 class WorkflowResponse(BaseModel):
     """
@@ -65,7 +81,7 @@ class IngestionResponse(BaseModel):
     message: str
 
 @app.post("/run-qa-workflow", response_model=WorkflowResponse)
-async def run_qa_workflow(request: TestRequest) -> WorkflowResponse:
+async def run_qa_workflow(request: TestRequest, http_request: Request) -> WorkflowResponse:
     """
     Triggers the full QA workflow for a given user story.
     
@@ -77,6 +93,7 @@ async def run_qa_workflow(request: TestRequest) -> WorkflowResponse:
     
     Args:
         request (TestRequest): The request containing the user story.
+        http_request (Request): The incoming request, used to reach the shared agent.
         
     Returns:
         WorkflowResponse: The workflow execution results.
@@ -85,8 +102,12 @@ async def run_qa_workflow(request: TestRequest) -> WorkflowResponse:
         HTTPException: If the workflow execution fails.
     """
     try:
-        inputs = {"user_story": request.user_story}
-        result = agent.graph.invoke(inputs)
+        inputs = {
+            "user_story": request.user_story,
+            "no_cache": request.no_cache
+        }
+        agent = http_request.app.state.agent
+        result = await agent.graph.ainvoke(inputs)
         
         return WorkflowResponse(
             message="QA workflow completed successfully.",
@@ -116,7 +137,7 @@ async def run_ingestion() -> IngestionResponse:
         HTTPException: If the ingestion process fails.
     """
     try:
-        ingest_data()
+        await ingest_data()
         return IngestionResponse(message="Data ingestion completed successfully.")
     except Exception as e:
         raise HTTPException(
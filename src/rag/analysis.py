@@ -2,14 +2,25 @@
 Risk analysis system for test prioritization and quality assessment.
 """
 
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Set, Tuple
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import asyncio
+import time
 from pydantic import BaseModel
 import numpy as np
 from langchain_community.vectorstores import Qdrant
 from langchain_openai import OpenAIEmbeddings
 import os
 
+_IMPACT_SCORES = {
+    "critical": 1.0,
+    "high": 0.7,
+    "medium": 0.4,
+    "low": 0.1
+}
+
 class DefectMetrics(BaseModel):
     """Metrics for defect analysis"""
     total_defects: int
@@ -38,14 +49,40 @@ class RiskScore(BaseModel):
     last_updated: datetime
     confidence_score: float
 
+@dataclass(slots=True)
+class PreprocessedDefects:
+    """Defect metadata extracted once and shared by the risk calculations"""
+    total: int
+    severities: np.ndarray
+    fix_times: np.ndarray  # NaN where no fix time was recorded
+    regressions: np.ndarray
+    commit_ids: Set[Optional[str]]
+    months: Set[Optional[str]]
+    impact_levels: List[str]
+    latest_date: Optional[datetime]
+
 class RiskAnalyzer:
-    def __init__(self):
+    def __init__(
+        self,
+        history_ttl_seconds: float = 300,
+        history_cache_size: int = 1024,
+        embedding_cache_size: int = 10000
+    ):
         self.embeddings = OpenAIEmbeddings()
         self.qdrant = Qdrant.from_existing_collection(
             embedding=self.embeddings,
             collection_name="historical_defects",
-            url=os.getenv("QDRANT_URL", "http://localhost:6333")
+            url=os.getenv("QDRANT_URL", "http://localhost:6333"),
+            prefer_grpc=True
         )
+        
+        # Feature names repeat across risk computations, so keep their
+        # embeddings (LRU) and recent defect searches (LRU with TTL)
+        self.history_ttl_seconds = history_ttl_seconds
+        self.history_cache_size = history_cache_size
+        self.embedding_cache_size = embedding_cache_size
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._history_cache: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
     
     async def calculate_risk_score(
         self,
@@ -65,13 +102,73 @@ class RiskAnalyzer:
         # Get historical defects
         defect_history = await self._get_defect_history(feature)
         
+        return await self._score_feature(feature, defect_history, codebase_metrics)
+    
+    async def calculate_risk_scores(
+        self,
+        features: List[str],
+        codebase_metrics_map: Optional[Dict[str, Dict[str, float]]] = None
+    ) -> List[RiskScore]:
+        """
+        Calculate risk scores for many features with one embedding request.
+        
+        Args:
+            features: Feature names or descriptions
+            codebase_metrics_map: Optional codebase metrics keyed by feature
+        
+        Returns:
+            RiskScore objects in the same order as `features`
+        """
+        codebase_metrics_map = codebase_metrics_map or {}
+        unique_features = list(dict.fromkeys(features))
+        
+        # Embed every feature that has neither a cached search nor a cached vector
+        now = time.monotonic()
+        histories: Dict[str, List[Dict]] = {}
+        for feature in unique_features:
+            cached = self._history_cache.get(feature)
+            if cached and now - cached[0] < self.history_ttl_seconds:
+                histories[feature] = cached[1]
+        
+        to_search = [f for f in unique_features if f not in histories]
+        to_embed = [f for f in to_search if f not in self._embedding_cache]
+        if to_embed:
+            vectors = await self.embeddings.aembed_documents(to_embed)
+            for feature, vector in zip(to_embed, vectors):
+                self._embedding_cache[feature] = vector
+            while len(self._embedding_cache) > self.embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+        
+        # Search all remaining features concurrently
+        searched = await asyncio.gather(
+            *(self._get_defect_history(feature) for feature in to_search)
+        )
+        histories.update(zip(to_search, searched))
+        
+        scores = await asyncio.gather(*(
+            self._score_feature(feature, histories[feature], codebase_metrics_map.get(feature))
+            for feature in unique_features
+        ))
+        by_feature = dict(zip(unique_features, scores))
+        return [by_feature[feature] for feature in features]
+    
+    async def _score_feature(
+        self,
+        feature: str,
+        defect_history: List[Dict],
+        codebase_metrics: Optional[Dict[str, float]]
+    ) -> RiskScore:
+        """Build the risk score for a feature from its defect history"""
+        # Read the defect metadata once for every calculation below
+        defects = self._preprocess_defects(defect_history)
+        
         # Calculate defect metrics
-        defect_metrics = await self._calculate_defect_metrics(defect_history)
+        defect_metrics = await self._calculate_defect_metrics(defects)
         
         # Calculate risk factors
         risk_factors = await self._calculate_risk_factors(
             feature,
-            defect_history,
+            defects,
             defect_metrics,
             codebase_metrics
         )
@@ -81,7 +178,7 @@ class RiskAnalyzer:
         
         # Calculate confidence score
         confidence_score = await self._calculate_confidence_score(
-            defect_history,
+            defects,
             codebase_metrics
         )
         
@@ -94,10 +191,38 @@ class RiskAnalyzer:
             confidence_score=confidence_score
         )
     
+    async def _embed_feature(self, feature: str) -> List[float]:
+        """Embed a feature name, reusing earlier embeddings"""
+        vector = self._embedding_cache.get(feature)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(feature)
+            self._embedding_cache[feature] = vector
+            if len(self._embedding_cache) > self.embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+        else:
+            self._embedding_cache.move_to_end(feature)
+        return vector
+    
     async def _get_defect_history(self, feature: str) -> List[Dict]:
         """Retrieve relevant defect history from Qdrant"""
-        results = self.qdrant.similarity_search_with_score(
-            feature,
+        cached = self._history_cache.get(feature)
+        if cached and time.monotonic() - cached[0] < self.history_ttl_seconds:
+            self._history_cache.move_to_end(feature)
+            return cached[1]
+        
+        vector = await self._embed_feature(feature)
+        defects = await self._search_by_vector(vector)
+        
+        self._history_cache[feature] = (time.monotonic(), defects)
+        self._history_cache.move_to_end(feature)
+        if len(self._history_cache) > self.history_cache_size:
+            self._history_cache.popitem(last=False)
+        return defects
+    
+    async def _search_by_vector(self, vector: List[float]) -> List[Dict]:
+        """Find the defects most similar to an embedded feature"""
+        results = await self.qdrant.asimilarity_search_with_score_by_vector(
+            vector,
             k=50  # Get top 50 similar defects
         )
         
@@ -112,12 +237,44 @@ class RiskAnalyzer:
         
         return defects
     
+    @staticmethod
+    def _preprocess_defects(defect_history: List[Dict]) -> PreprocessedDefects:
+        """Extract the metadata fields used by the risk calculations in one pass"""
+        severities = []
+        fix_times = []
+        regressions = []
+        commit_ids = set()
+        months = set()
+        impact_levels = []
+        dates = []
+        
+        for defect in defect_history:
+            metadata = defect["metadata"]
+            severities.append(metadata.get("severity", "medium"))
+            fix_times.append(float(metadata["time_to_fix"]) if metadata.get("time_to_fix") else np.nan)
+            regressions.append(bool(metadata.get("is_regression", False)))
+            commit_ids.add(metadata.get("commit_id"))
+            months.add(metadata.get("month"))
+            impact_levels.append(metadata.get("impact", "medium"))
+            dates.append(metadata.get("date", "2000-01-01"))
+        
+        return PreprocessedDefects(
+            total=len(defect_history),
+            severities=np.array(severities, dtype="U8"),
+            fix_times=np.array(fix_times, dtype=np.float64),
+            regressions=np.array(regressions, dtype=bool),
+            commit_ids=commit_ids,
+            months=months,
+            impact_levels=impact_levels,
+            latest_date=max(map(datetime.fromisoformat, dates)) if dates else None
+        )
+    
     async def _calculate_defect_metrics(
         self,
-        defect_history: List[Dict]
+        defects: PreprocessedDefects
     ) -> DefectMetrics:
         """Calculate metrics from defect history"""
-        total = len(defect_history)
+        total = defects.total
         if total == 0:
             return DefectMetrics(
                 total_defects=0,
@@ -130,36 +287,25 @@ class RiskAnalyzer:
                 regression_rate=0.0
             )
         
-        # Count defects by severity
-        severity_counts = {"critical": 0, "high": 0, "medium": 0, "low": 0}
-        fix_times = []
-        regressions = 0
-        
-        for defect in defect_history:
-            metadata = defect["metadata"]
-            severity_counts[metadata.get("severity", "medium")] += 1
-            
-            if metadata.get("time_to_fix"):
-                fix_times.append(float(metadata["time_to_fix"]))
-            
-            if metadata.get("is_regression", False):
-                regressions += 1
+        severities = defects.severities
+        fix_times = defects.fix_times
+        has_fix_time = ~np.isnan(fix_times)
         
         return DefectMetrics(
             total_defects=total,
-            critical_defects=severity_counts["critical"],
-            high_defects=severity_counts["high"],
-            medium_defects=severity_counts["medium"],
-            low_defects=severity_counts["low"],
-            avg_time_to_fix=np.mean(fix_times) if fix_times else 0.0,
+            critical_defects=int((severities == "critical").sum()),
+            high_defects=int((severities == "high").sum()),
+            medium_defects=int((severities == "medium").sum()),
+            low_defects=int((severities == "low").sum()),
+            avg_time_to_fix=float(fix_times[has_fix_time].mean()) if has_fix_time.any() else 0.0,
             defect_density=total / 1000,  # Assuming 1000 LOC as base
-            regression_rate=regressions / total if total > 0 else 0.0
+            regression_rate=float(defects.regressions.mean())
         )
     
     async def _calculate_risk_factors(
         self,
         feature: str,
-        defect_history: List[Dict],
+        defects: PreprocessedDefects,
         defect_metrics: DefectMetrics,
         codebase_metrics: Optional[Dict[str, float]]
     ) -> RiskFactors:
@@ -173,7 +319,7 @@ class RiskAnalyzer:
         # Change frequency (0-1)
         change_frequency = await self._calculate_change_frequency(
             feature,
-            defect_history
+            defects
         )
         
         # Defect history score (0-1)
@@ -194,7 +340,7 @@ class RiskAnalyzer:
         # Impact score (0-1)
         impact_score = await self._calculate_impact_score(
             feature,
-            defect_history
+            defects
         )
         
         return RiskFactors(
@@ -222,20 +368,20 @@ class RiskAnalyzer:
             codebase_metrics.get("dependency_count", 10) / 20
         ]
         
-        return np.mean(factors)
+        return sum(factors) / len(factors)
     
     async def _calculate_change_frequency(
         self,
         feature: str,
-        defect_history: List[Dict]
+        defects: PreprocessedDefects
     ) -> float:
         """Calculate change frequency score"""
-        if not defect_history:
+        if not defects.total:
             return 0.0
             
         # Calculate changes per month
-        changes = len(set(d["metadata"].get("commit_id") for d in defect_history))
-        months = len(set(d["metadata"].get("month") for d in defect_history))
+        changes = len(defects.commit_ids)
+        months = len(defects.months)
         
         if months == 0:
             return 0.0
@@ -258,22 +404,15 @@ class RiskAnalyzer:
     async def _calculate_impact_score(
         self,
         feature: str,
-        defect_history: List[Dict]
+        defects: PreprocessedDefects
     ) -> float:
         """Calculate business impact score"""
-        if not defect_history:
+        if not defects.total:
             return 0.5  # Default medium impact
             
         # Calculate based on defect impact levels
-        impact_levels = [d["metadata"].get("impact", "medium") for d in defect_history]
-        impact_scores = {
-            "critical": 1.0,
-            "high": 0.7,
-            "medium": 0.4,
-            "low": 0.1
-        }
-        
-        return np.mean([impact_scores[level] for level in impact_levels])
+        impact_levels = defects.impact_levels
+        return sum(_IMPACT_SCORES[level] for level in impact_levels) / len(impact_levels)
     
     async def _calculate_overall_score(
         self,
@@ -302,29 +441,25 @@ class RiskAnalyzer:
     
     async def _calculate_confidence_score(
         self,
-        defect_history: List[Dict],
+        defects: PreprocessedDefects,
         codebase_metrics: Optional[Dict[str, float]]
     ) -> float:
         """Calculate confidence score in the risk assessment"""
         factors = []
         
         # Data quantity factor
-        if len(defect_history) > 20:
+        if defects.total > 20:
             factors.append(1.0)
-        elif len(defect_history) > 10:
+        elif defects.total > 10:
             factors.append(0.8)
-        elif len(defect_history) > 5:
+        elif defects.total > 5:
             factors.append(0.6)
         else:
             factors.append(0.4)
         
         # Data recency factor
-        if defect_history:
-            latest_date = max(
-                datetime.fromisoformat(d["metadata"].get("date", "2000-01-01"))
-                for d in defect_history
-            )
-            months_old = (datetime.now() - latest_date).days / 30
+        if defects.latest_date is not None:
+            months_old = (datetime.now() - defects.latest_date).days / 30
             recency_score = max(1.0 - (months_old / 12), 0.0)  # Decay over 12 months
             factors.append(recency_score)
         
@@ -335,4 +470,4 @@ class RiskAnalyzer:
         else:
             factors.append(0.3)
         
-        return np.mean(factors)
+        return sum(factors) / len(factors)
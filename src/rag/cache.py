@@ -0,0 +1,232 @@
+"""
+Caches for RAG retrieval results and document embeddings.
+
+Retrieval entries are keyed by the query text or its embedding, so
+near-duplicate queries (CI re-runs, small prompt refinements) can skip the
+embedding and vector store round-trips. Document embeddings are persisted
+by content hash so re-ingestion only embeds new or changed chunks.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from rapidfuzz import fuzz, process
+
+class SemanticCache:
+    """Thread-safe cosine-similarity cache mapping query embeddings to retrieved context"""
+
+    def __init__(
+        self,
+        threshold: float = 0.86,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1024
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._vectors: Dict[str, List[np.ndarray]] = {}
+        self._values: Dict[str, List[str]] = {}
+        self._created: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        """Convert a vector to a unit-length float32 array"""
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(arr)
+        return arr / norm if norm > 0 else arr
+
+    def _evict_expired(self, namespace: str):
+        """Drop entries older than the TTL; the caller holds the lock"""
+        created = self._created.get(namespace)
+        if not created:
+            return
+
+        cutoff = time.monotonic() - self.ttl_seconds
+        keep = [i for i, ts in enumerate(created) if ts >= cutoff]
+        if len(keep) == len(created):
+            return
+
+        self._vectors[namespace] = [self._vectors[namespace][i] for i in keep]
+        self._values[namespace] = [self._values[namespace][i] for i in keep]
+        self._created[namespace] = [created[i] for i in keep]
+
+    def lookup(self, namespace: str, vector: Sequence[float]) -> Optional[str]:
+        """Return the cached value of the most similar entry above the threshold"""
+        query = self._normalize(vector)
+        with self._lock:
+            self._evict_expired(namespace)
+            vectors = self._vectors.get(namespace)
+            if not vectors:
+                return None
+
+            similarities = np.stack(vectors) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return self._values[namespace][best]
+            return None
+
+    def insert(self, namespace: str, vector: Sequence[float], value: str):
+        """Add an entry, dropping the oldest one when the namespace is full"""
+        unit = self._normalize(vector)
+        with self._lock:
+            vectors = self._vectors.setdefault(namespace, [])
+            values = self._values.setdefault(namespace, [])
+            created = self._created.setdefault(namespace, [])
+
+            if len(vectors) >= self.max_entries:
+                del vectors[0], values[0], created[0]
+
+            vectors.append(unit)
+            values.append(value)
+            created.append(time.monotonic())
+
+    def clear(self):
+        """Remove all cached entries"""
+        with self._lock:
+            self._vectors.clear()
+            self._values.clear()
+            self._created.clear()
+
+class FuzzyTextCache:
+    """Thread-safe LRU cache with a TTL that also matches keys within a small edit distance"""
+
+    def __init__(
+        self,
+        min_ratio: float = 95,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600
+    ):
+        self.min_ratio = min_ratio
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # text -> (value, creation time)
+        self._entries: Dict[str, "OrderedDict[str, Tuple[str, float]]"] = {}
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, entries: "OrderedDict[str, Tuple[str, float]]"):
+        """Drop entries older than the TTL"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        for key in [key for key, (_, created) in entries.items() if created < cutoff]:
+            del entries[key]
+
+    def lookup(self, namespace: str, text: str) -> Optional[str]:
+        """Return the value cached for `text` or a near-identical string"""
+        with self._lock:
+            entries = self._entries.get(namespace)
+            if not entries:
+                return None
+            self._evict_expired(entries)
+
+            key = text
+            if key not in entries:
+                match = process.extractOne(
+                    text,
+                    entries.keys(),
+                    scorer=fuzz.ratio,
+                    score_cutoff=self.min_ratio
+                )
+                if match is None:
+                    return None
+                key = match[0]
+
+            entries.move_to_end(key)
+            return entries[key][0]
+
+    def insert(self, namespace: str, text: str, value: str):
+        """Add an entry, evicting the least recently used one when full"""
+        with self._lock:
+            entries = self._entries.setdefault(namespace, OrderedDict())
+            entries[text] = (value, time.monotonic())
+            entries.move_to_end(text)
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+class EmbeddingCache:
+    """On-disk embedding store keyed by a hash of the model and text, fronted by an LRU"""
+
+    # SQLite caps bound parameters per statement
+    _LOOKUP_BATCH = 500
+
+    def __init__(
+        self,
+        model: str,
+        path: str = "./data/embeddings/cache.sqlite3",
+        max_memory_entries: int = 5000
+    ):
+        self.model = model
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+
+    def _key(self, text: str) -> str:
+        return hashlib.blake2b(f"{self.model}|{text}".encode(), digest_size=16).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """Insert into the in-memory LRU, evicting the oldest entry when full"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return the cached vector for each text, or None where missing"""
+        keys = [self._key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                found[key] = vector
+
+        # Only keys the LRU didn't have go to disk
+        pending = list(dict.fromkeys(key for key in keys if key not in found))
+        if pending:
+            with closing(sqlite3.connect(self.path)) as conn:
+                for start in range(0, len(pending), self._LOOKUP_BATCH):
+                    batch = pending[start:start + self._LOOKUP_BATCH]
+                    for key, blob in conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch
+                    ):
+                        found[key] = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, found[key])
+
+        vectors = [found[key].tolist() if key in found else None for key in keys]
+        hits = sum(vector is not None for vector in vectors)
+        self._hits += hits
+        self._misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Store vectors for the given texts"""
+        rows = []
+        for text, vector in zip(texts, vectors):
+            key = self._key(text)
+            array = np.asarray(vector, dtype=np.float32)
+            self._remember(key, array)
+            rows.append((key, array.tobytes()))
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup hits and misses since the cache was created"""
+        return {"hits": self._hits, "misses": self._misses, "memory_entries": len(self._memory)}
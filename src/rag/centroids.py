@@ -0,0 +1,245 @@
+"""
+Centroid compaction of the historical defects collection.
+
+Near-duplicate defect descriptions are clustered by cosine similarity and
+only one point per cluster is kept in a companion collection, which shrinks
+the vector index that the agent searches at query time.
+
+The companion collection is an alias: each build writes a fresh collection
+and swaps the alias over, so searches never see a half-built index. Builds
+run after ingestion or with `python -m src.rag.centroids`, not at agent start.
+"""
+
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+import time
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+SOURCE_COLLECTION = "historical_defects"
+CENTROID_COLLECTION = "historical_defects_centroids"
+
+# Collections at or below this size are searched directly
+CENTROID_MIN_POINTS = 5000
+
+CENTROID_THRESHOLD = 0.86
+
+# Points per scroll request and per centroid upload request
+BATCH_SIZE = 256
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length, leaving zero rows as they are"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+class GreedyClusterer:
+    """
+    Greedy single-pass clustering by cosine similarity, fed in batches.
+
+    Each vector joins the closest centroid if the similarity is at least
+    `threshold`, otherwise it starts a new cluster. A batch is matched
+    against the centroids as they stood before it in one matrix product;
+    only its unmatched vectors are walked one by one, against the clusters
+    the batch itself started.
+    """
+
+    def __init__(self, threshold: float = CENTROID_THRESHOLD):
+        self.threshold = threshold
+        self.leaders: List[int] = []
+        self._sums: Optional[np.ndarray] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._sizes = np.zeros(0, dtype=np.int64)
+        self._seen = 0
+
+    def _reserve(self, count: int, dim: int):
+        """Grow the centroid buffers to hold at least `count` clusters"""
+        if self._sums is None:
+            capacity = max(count, BATCH_SIZE)
+            self._sums = np.zeros((capacity, dim), dtype=np.float32)
+            self._centroids = np.zeros((capacity, dim), dtype=np.float32)
+            self._sizes = np.zeros(capacity, dtype=np.int64)
+        elif count > len(self._sums):
+            capacity = max(count, 2 * len(self._sums))
+            extra = capacity - len(self._sums)
+            self._sums = np.vstack([self._sums, np.zeros((extra, dim), dtype=np.float32)])
+            self._centroids = np.vstack([self._centroids, np.zeros((extra, dim), dtype=np.float32)])
+            self._sizes = np.concatenate([self._sizes, np.zeros(extra, dtype=np.int64)])
+
+    def add(self, vectors: np.ndarray) -> List[int]:
+        """Cluster a batch; returns the batch positions that started new clusters"""
+        unit = _normalize(np.asarray(vectors, dtype=np.float32))
+        offset = self._seen
+        self._seen += len(unit)
+        existing = len(self.leaders)
+        self._reserve(existing + len(unit), unit.shape[1])
+        sums, centroids, sizes = self._sums, self._centroids, self._sizes
+
+        unmatched = np.arange(len(unit))
+        if existing:
+            similarities = unit @ centroids[:existing].T
+            best = similarities.argmax(axis=1)
+            matched = similarities[np.arange(len(unit)), best] >= self.threshold
+            np.add.at(sums, best[matched], unit[matched])
+            np.add.at(sizes, best[matched], 1)
+            touched = np.unique(best[matched])
+            centroids[touched] = _normalize(sums[touched])
+            unmatched = np.flatnonzero(~matched)
+
+        started = []
+        for index in unmatched:
+            vector = unit[index]
+            count = len(self.leaders)
+            if count > existing:
+                similarities = centroids[existing:count] @ vector
+                best = existing + int(np.argmax(similarities))
+                if similarities[best - existing] >= self.threshold:
+                    sums[best] += vector
+                    sizes[best] += 1
+                    centroids[best] = sums[best] / np.linalg.norm(sums[best])
+                    continue
+
+            sums[count] = vector
+            centroids[count] = vector
+            sizes[count] = 1
+            self.leaders.append(offset + int(index))
+            started.append(int(index))
+        return started
+
+    def result(self) -> Tuple[np.ndarray, List[int], List[int]]:
+        """(centroids, leader index per cluster, cluster sizes)"""
+        count = len(self.leaders)
+        if self._centroids is None:
+            return np.zeros((0, 0), dtype=np.float32), [], []
+        return self._centroids[:count], list(self.leaders), self._sizes[:count].tolist()
+
+def cluster_vectors(
+    vectors: np.ndarray,
+    threshold: float = CENTROID_THRESHOLD
+) -> Tuple[np.ndarray, List[int], List[int]]:
+    """
+    Cluster vectors with GreedyClusterer.
+
+    Returns:
+        (centroids, leader index per cluster, cluster sizes)
+    """
+    clusterer = GreedyClusterer(threshold)
+    for start in range(0, len(vectors), BATCH_SIZE):
+        clusterer.add(vectors[start:start + BATCH_SIZE])
+    return clusterer.result()
+
+def _scroll_batches(
+    client: QdrantClient,
+    collection_name: str
+) -> Iterator[Tuple[np.ndarray, List[Dict[str, Any]]]]:
+    """Yield the collection's vectors and payloads one scroll page at a time"""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        if points:
+            yield (
+                np.asarray([point.vector for point in points], dtype=np.float32),
+                [point.payload or {} for point in points]
+            )
+        if offset is None:
+            break
+
+def _alias_targets(client: QdrantClient, alias: str) -> List[str]:
+    """Collections the alias currently points at"""
+    return [
+        description.collection_name
+        for description in client.get_aliases().aliases
+        if description.alias_name == alias
+    ]
+
+def centroid_alias_exists(client: QdrantClient, alias: str = CENTROID_COLLECTION) -> bool:
+    """Whether a centroid build has been published under the alias"""
+    return bool(_alias_targets(client, alias))
+
+def build_centroid_collection(
+    client: QdrantClient,
+    source_collection: str = SOURCE_COLLECTION,
+    target_collection: str = CENTROID_COLLECTION,
+    threshold: float = CENTROID_THRESHOLD
+) -> int:
+    """
+    Write one centroid point per cluster of the source collection and
+    point the `target_collection` alias at the result.
+
+    The payload of each centroid is taken from the first member of the
+    cluster so it stays compatible with the LangChain Qdrant vector store.
+
+    Returns:
+        Number of centroids written
+    """
+    # Only the clusters' first payloads are kept, not every point
+    clusterer = GreedyClusterer(threshold)
+    leader_payloads: List[Dict[str, Any]] = []
+    for vectors, payloads in _scroll_batches(client, source_collection):
+        leader_payloads.extend(payloads[i] for i in clusterer.add(vectors))
+
+    centroids, _, sizes = clusterer.result()
+    if not len(centroids):
+        return 0
+
+    build_name = f"{target_collection}_{time.time_ns()}"
+    client.create_collection(
+        collection_name=build_name,
+        vectors_config=models.VectorParams(
+            size=centroids.shape[1],
+            distance=models.Distance.COSINE
+        )
+    )
+    client.upload_points(
+        collection_name=build_name,
+        points=(
+            models.PointStruct(
+                id=cluster_id,
+                vector=centroid.tolist(),
+                payload={**payload, "cluster_size": size}
+            )
+            for cluster_id, (centroid, payload, size) in enumerate(
+                zip(centroids, leader_payloads, sizes)
+            )
+        ),
+        batch_size=BATCH_SIZE,
+        wait=True
+    )
+
+    previous = _alias_targets(client, target_collection)
+    operations = [
+        models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=target_collection))
+    ] if previous else []
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=build_name, alias_name=target_collection)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    for name in previous:
+        client.delete_collection(name)
+
+    return len(centroids)
+
+def rebuild_centroids(
+    client: QdrantClient,
+    min_points: int = CENTROID_MIN_POINTS,
+    threshold: float = CENTROID_THRESHOLD
+) -> int:
+    """
+    Rebuild the centroid collection if the source has grown past `min_points`.
+
+    Returns:
+        Number of centroids written, or 0 if the source is small enough to
+        search directly
+    """
+    if client.count(SOURCE_COLLECTION, exact=False).count <= min_points:
+        return 0
+    return build_centroid_collection(client, threshold=threshold)
+
+if __name__ == "__main__":
+    from .client import get_client
+    print(f"Centroids written: {rebuild_centroids(get_client())}")
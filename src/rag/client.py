@@ -0,0 +1,27 @@
+"""
+Shared Qdrant client for ingestion and maintenance scripts.
+
+Reusing one client keeps its gRPC channel open across calls instead of
+reconnecting for every ingestion run.
+"""
+
+import atexit
+import functools
+import os
+from qdrant_client import QdrantClient
+
+@functools.lru_cache(maxsize=1)
+def get_client() -> QdrantClient:
+    """Process-wide Qdrant client, closed when the interpreter exits"""
+    client = QdrantClient(
+        url=os.getenv("QDRANT_URL", "http://localhost:6333"),
+        prefer_grpc=True,
+        grpc_port=int(os.getenv("QDRANT_GRPC_PORT", "6334")),
+        grpc_options={
+            "grpc.max_send_message_length": 100 * 1024 * 1024,
+            "grpc.max_concurrent_streams": 100
+        },
+        timeout=60
+    )
+    atexit.register(client.close)
+    return client
@@ -3,41 +3,254 @@ This module handles the ingestion of historical defect data into the Qdrant vect
 The data is processed and embedded using OpenAI's embeddings for efficient semantic search.
 """
 
+import asyncio
+import functools
 import os
+import random
+import time
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+import tiktoken
 from dotenv import load_dotenv
+from openai import RateLimitError
 from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.document_loaders import TextLoader
-from langchain_community.vectorstores import Qdrant
+from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from .cache import EmbeddingCache
+from .centroids import rebuild_centroids
+from .client import get_client
 
 load_dotenv()
 
-def ingest_data():
+COLLECTION_NAME = "historical_defects"
+
+DEFECTS_PATH = "./data/jira_exports/sample_defects.txt"
+
+# Inputs per embeddings request; OpenAI accepts up to 2048
+EMBEDDING_BATCH_SIZE = 512
+
+# Tokens per embeddings request, kept under the endpoint's per-request limit
+MAX_BATCH_TOKENS = 250_000
+
+# Tokenizer used by the text-embedding models for chunk sizing and batching
+ENCODING_NAME = "cl100k_base"
+
+# Embedding requests in flight at once
+MAX_INFLIGHT_BATCHES = 5
+
+# Points per Qdrant upload request
+UPLOAD_BATCH_SIZE = 512
+
+def _load_chunks() -> List[Document]:
+    """Load the sample defects file and split it into overlapping chunks"""
+    text = Path(DEFECTS_PATH).read_text(encoding="utf-8", errors="replace")
+
+    # Size chunks in tokens but still split between defect records
+    text_splitter = CharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=ENCODING_NAME,
+        chunk_size=512,
+        chunk_overlap=64,
+        separator="---"
+    )
+    return [
+        Document(page_content=chunk, metadata={"source": DEFECTS_PATH, "chunk_id": i})
+        for i, chunk in enumerate(text_splitter.split_text(text))
+    ]
+
+def _token_batches(texts: List[str], max_tokens: int, max_items: int) -> List[Tuple[int, int]]:
+    """Greedily pack consecutive texts into (start, end) batches by token count"""
+    token_counts = map(len, tiktoken.get_encoding(ENCODING_NAME).encode_ordinary_batch(texts))
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, count in enumerate(token_counts):
+        if i > start and (batch_tokens + count > max_tokens or i - start >= max_items):
+            batches.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += count
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+@functools.lru_cache(maxsize=None)
+def _embedding_cache(model: str) -> EmbeddingCache:
+    """Embedding cache per model, kept for the process so its LRU survives between runs"""
+    return EmbeddingCache(model)
+
+def _to_payload(doc: Document) -> dict:
+    """Build a payload with the layout the LangChain Qdrant store reads"""
+    return {"page_content": doc.page_content, "metadata": doc.metadata}
+
+async def _embed_batch(
+    embeddings: OpenAIEmbeddings,
+    texts: List[str],
+    semaphore: asyncio.Semaphore,
+    max_retries: int = 5
+) -> List[List[float]]:
+    """Embed one batch, backing off on rate limits"""
+    async with semaphore:
+        # Stagger batch starts so they don't arrive as a burst
+        await asyncio.sleep(random.uniform(0, 0.05))
+        for retry in range(max_retries + 1):
+            try:
+                return await embeddings.aembed_documents(texts)
+            except RateLimitError as e:
+                if retry == max_retries:
+                    raise
+                retry_after = e.response.headers.get("retry-after")
+                if retry_after:
+                    delay = float(retry_after)
+                else:
+                    delay = min(2 ** retry, 30) * random.uniform(0.8, 1.2)
+                await asyncio.sleep(delay)
+
+async def ingest_data(
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_inflight: int = MAX_INFLIGHT_BATCHES
+):
     """
     Loads data from the data directory, splits it into chunks, and ingests it into Qdrant.
-    
+
     The function performs the following steps:
     1. Loads the sample defects text file
-    2. Splits the documents into smaller chunks with overlap
-    3. Creates embeddings using OpenAI's embedding model
+    2. Splits the documents into chunks of up to 512 tokens with overlap
+    3. Creates embeddings using OpenAI's embedding model for chunks not already in
+       the embedding cache, packing requests up to MAX_BATCH_TOKENS tokens and
+       `batch_size` chunks with up to `max_inflight` requests running concurrently
     4. Stores the embeddings in Qdrant
+    5. Rebuilds the centroid collection once the source is large enough
     """
-    loader = TextLoader("./data/jira_exports/sample_defects.txt")
-    documents = loader.load()
-    
-    text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=100, separator="---")
-    docs = text_splitter.split_documents(documents)
-    
-    embeddings = OpenAIEmbeddings()
-    
-    Qdrant.from_documents(
-        docs,
-        embeddings,
-        url=os.getenv("QDRANT_URL", "http://localhost:6333"),
-        prefer_grpc=True,
-        collection_name="historical_defects",
+    docs = await asyncio.to_thread(_load_chunks)
+    if not docs:
+        print("No documents to ingest.")
+        return
+
+    embeddings = OpenAIEmbeddings(chunk_size=batch_size)
+    texts = [doc.page_content for doc in docs]
+
+    # Only chunks whose text (or the model) changed need embedding
+    cache = _embedding_cache(embeddings.model)
+    vectors = await asyncio.to_thread(cache.get_many, texts)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    missing_texts = [texts[i] for i in missing]
+
+    # Fill each request up to the token budget rather than a fixed item count
+    spans = await asyncio.to_thread(_token_batches, missing_texts, MAX_BATCH_TOKENS, batch_size)
+    semaphore = asyncio.Semaphore(max_inflight)
+    batches = await asyncio.gather(*(
+        _embed_batch(embeddings, missing_texts[start:end], semaphore)
+        for start, end in spans
+    ))
+    # gather keeps batch order, so new vectors line up with `missing`
+    new_vectors = [vector for batch in batches for vector in batch]
+    for i, vector in zip(missing, new_vectors):
+        vectors[i] = vector
+    if new_vectors:
+        await asyncio.to_thread(cache.put_many, missing_texts, new_vectors)
+
+    await asyncio.to_thread(_upload, vectors, docs)
+    await asyncio.to_thread(rebuild_centroids, get_client())
+    print(f"Data ingestion complete. Embedding cache: {cache.stats()}")
+
+def _upload(vectors: List[List[float]], docs: List[Document]):
+    """Create the collection if needed and stream the embedded chunks over gRPC"""
+    client = get_client()
+    vector_array = np.asarray(vectors, dtype=np.float32)
+
+    # A new collection is bulk-loaded with indexing off and indexed once at the end
+    bulk_load = not client.collection_exists(COLLECTION_NAME)
+    if bulk_load:
+        client.create_collection(
+            collection_name=COLLECTION_NAME,
+            vectors_config=models.VectorParams(
+                size=vector_array.shape[1],
+                distance=models.Distance.COSINE
+            ),
+            hnsw_config=models.HnswConfigDiff(m=0),
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0),
+            # int8 copies held in RAM for search; originals stay for rescoring
+            quantization_config=models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True
+                )
+            )
+        )
+
+    # Chunk positions are stable ids, so re-ingesting overwrites instead of duplicating.
+    # A bulk load doesn't wait per batch; it is confirmed once after indexing.
+    client.upload_collection(
+        collection_name=COLLECTION_NAME,
+        vectors=vector_array,
+        payload=[_to_payload(doc) for doc in docs],
+        ids=list(range(len(docs))),
+        batch_size=UPLOAD_BATCH_SIZE,
+        parallel=max(4, os.cpu_count() or 1),
+        max_retries=3,
+        wait=not bulk_load
     )
-    print("Data ingestion complete.")
+
+    if not bulk_load:
+        _delete_stale_points(client, len(docs))
+
+    if bulk_load:
+        client.update_collection(
+            collection_name=COLLECTION_NAME,
+            hnsw_config=models.HnswConfigDiff(m=16),
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=20000)
+        )
+        _wait_until_indexed(client, len(docs))
+
+def _delete_stale_points(client: QdrantClient, point_count: int):
+    """Delete points left over from an earlier ingestion that produced more chunks"""
+    if client.count(COLLECTION_NAME, exact=True).count <= point_count:
+        return
+
+    stale = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=COLLECTION_NAME,
+            limit=UPLOAD_BATCH_SIZE * 8,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False
+        )
+        # Collections built by Qdrant.from_documents are keyed by UUID strings;
+        # none of those match a chunk position, so all of them are stale
+        stale.extend(
+            point.id for point in points
+            if not isinstance(point.id, int) or point.id >= point_count
+        )
+        if offset is None:
+            break
+    if stale:
+        client.delete(
+            collection_name=COLLECTION_NAME,
+            points_selector=models.PointIdsList(points=stale),
+            wait=True
+        )
+
+def _wait_until_indexed(
+    client: QdrantClient,
+    expected_points: int,
+    timeout: float = 300,
+    interval: float = 0.5
+):
+    """Block until every uploaded point is applied and the collection is indexed"""
+    deadline = time.monotonic() + timeout
+    while (
+        client.get_collection(COLLECTION_NAME).status != models.CollectionStatus.GREEN
+        or client.count(COLLECTION_NAME, exact=True).count < expected_points
+    ):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{COLLECTION_NAME} was not indexed within {timeout}s")
+        time.sleep(interval)
 
 if __name__ == "__main__":
-    ingest_data()
+    asyncio.run(ingest_data())
@@ -1,13 +1,12 @@
-from qdrant_client import QdrantClient
 from qdrant_client.http import models
-import os
 from dotenv import load_dotenv
+from src.rag.client import get_client
 
 def test_qdrant_connection():
     load_dotenv()
     
-    # Initialize Qdrant client
-    client = QdrantClient(url=os.getenv("QDRANT_URL", "http://localhost:6333"))
+    # Reuse the shared Qdrant client
+    client = get_client()
     
     try:
         # Create a test collection
@@ -2,12 +2,19 @@
 Enhanced quality metrics system with comprehensive coverage, performance, and reliability metrics.
 """
 
-from typing import List, Dict, Optional, Set, Tuple
+from typing import List, Dict, Optional, Set, Tuple, Any, Iterable
 from datetime import datetime, timedelta
-from pydantic import BaseModel
 import numpy as np
 from dataclasses import dataclass
-from collections import defaultdict
+from collections import defaultdict, Counter
+import re
+
+# Metrics tracked by analyze_trends
+_TREND_METRICS = ("coverage", "reliability", "performance", "defect_density", "maintenance_effort")
+
+# Scenario keywords that flag a coverage gap as risky
+_RISK_RE = re.compile(r"critical|high|edge|boundary")
+_RISK_KINDS = {"critical": "critical", "high": "critical", "edge": "edge", "boundary": "edge"}
 
 @dataclass
 class CodeCoverage:
@@ -20,7 +27,8 @@ class CodeCoverage:
     critical_paths_coverage: float
     modified_lines_coverage: float
 
-class FeatureCoverage(BaseModel):
+@dataclass(slots=True, frozen=True)
+class FeatureCoverage:
     """Feature-level coverage metrics"""
     feature_name: str
     test_cases: int
@@ -30,7 +38,8 @@ class FeatureCoverage(BaseModel):
     missing_scenarios: List[str]
     risk_areas: List[str]
 
-class PerformanceMetrics(BaseModel):
+@dataclass(slots=True, frozen=True)
+class PerformanceMetrics:
     """Detailed test performance metrics"""
     avg_response_time: float
     p90_response_time: float
@@ -41,7 +50,8 @@ class PerformanceMetrics(BaseModel):
     std_deviation: float
     throughput: float
 
-class ReliabilityMetrics(BaseModel):
+@dataclass(slots=True, frozen=True)
+class ReliabilityMetrics:
     """Enhanced reliability metrics"""
     stability_score: float
     flakiness_rate: float
@@ -51,7 +61,8 @@ class ReliabilityMetrics(BaseModel):
     error_clustering: Dict[str, int]
     failure_patterns: List[str]
 
-class TrendMetrics(BaseModel):
+@dataclass(slots=True, frozen=True)
+class TrendMetrics:
     """Trend analysis metrics"""
     date: datetime
     coverage_trend: float
@@ -60,6 +71,37 @@ class TrendMetrics(BaseModel):
     defect_density_trend: float
     maintenance_effort_trend: float
 
+@dataclass(slots=True)
+class RunColumns:
+    """Test run records as parallel arrays, grouped by test and ordered by time"""
+    test_codes: np.ndarray
+    statuses: np.ndarray
+    test_count: int
+    
+    @classmethod
+    def from_records(cls, test_results: List[Dict]) -> "RunColumns":
+        """Sort runs by timestamp, then stably group them per test"""
+        ordered = sorted(test_results, key=lambda x: x["timestamp"])
+        test_ids: Dict[str, int] = {}
+        codes = np.fromiter(
+            (test_ids.setdefault(r["test_id"], len(test_ids)) for r in ordered),
+            dtype=np.int64,
+            count=len(ordered)
+        )
+        grouping = np.argsort(codes, kind="stable")
+        statuses = np.array([r["status"] for r in ordered], dtype=str)
+        return cls(codes[grouping], statuses[grouping], len(test_ids))
+    
+    @property
+    def same_test_as_previous(self) -> np.ndarray:
+        """For each run after the first, whether it belongs to the previous run's test"""
+        return self.test_codes[1:] == self.test_codes[:-1]
+    
+    def changing_tests(self) -> int:
+        """Number of tests with more than one distinct status"""
+        changed = self.same_test_as_previous & (self.statuses[1:] != self.statuses[:-1])
+        return np.unique(self.test_codes[1:][changed]).size
+
 class EnhancedQualityMetrics:
     """Enhanced quality metrics analyzer"""
     
@@ -130,28 +172,36 @@ class EnhancedQualityMetrics:
         """
         feature_coverage = []
         
+        # Index test cases by feature once instead of rescanning per feature
+        tests_by_feature: Dict[str, List[Dict]] = defaultdict(list)
+        negative_tests: Counter = Counter()
+        for tc in test_cases:
+            tests_by_feature[tc.get("feature")].append(tc)
+            if tc.get("type") == "negative":
+                negative_tests[tc.get("feature")] += 1
+        
         for feature, requirements in feature_requirements.items():
             # Count test cases for feature
-            feature_tests = [
-                tc for tc in test_cases
-                if tc.get("feature") == feature
-            ]
+            feature_tests = tests_by_feature.get(feature, [])
             
             # Analyze scenarios covered
-            covered_scenarios = set()
-            for test in feature_tests:
-                covered_scenarios.update(test.get("scenarios", []))
+            covered_scenarios = set().union(*(test.get("scenarios", ()) for test in feature_tests))
             
-            # Calculate coverage
-            total_scenarios = set(requirements)
+            # Calculate coverage; requirements that are already sets are not copied
+            if isinstance(requirements, (set, frozenset)):
+                total_scenarios = requirements
+            else:
+                total_scenarios = frozenset(requirements)
             missing = total_scenarios - covered_scenarios
-            coverage_pct = len(covered_scenarios) / len(total_scenarios) * 100
+            coverage_pct = (
+                100 * len(covered_scenarios) / len(total_scenarios) if total_scenarios else 100.0
+            )
             
             # Identify risk areas
             risk_areas = self._identify_risk_areas(
-                feature,
                 missing,
-                test_cases
+                negative_tests[feature],
+                len(test_cases)
             )
             
             feature_coverage.append(FeatureCoverage(
@@ -168,48 +218,56 @@ class EnhancedQualityMetrics:
     
     async def analyze_performance(
         self,
-        execution_times: List[float],
+        execution_times: Iterable[float],
         resource_usage: List[Dict]
     ) -> PerformanceMetrics:
         """
         Analyze test execution performance metrics.
         
         Args:
-            execution_times: List of test execution times
+            execution_times: Test execution times; any iterable, so long histories
+                can be streamed without building a list first
             resource_usage: Resource usage data during test execution
         """
-        if not execution_times:
+        # Stream into one float64 buffer; an existing array is used as-is
+        owned = not isinstance(execution_times, np.ndarray)
+        if owned:
+            times = np.fromiter(execution_times, dtype=np.float64)
+        else:
+            times = np.asarray(execution_times, dtype=np.float64)
+        
+        if not times.size:
             return PerformanceMetrics(
-                avg_response_time=0,
-                p90_response_time=0,
-                p95_response_time=0,
-                p99_response_time=0,
-                max_response_time=0,
-                min_response_time=0,
-                std_deviation=0,
-                throughput=0
+                avg_response_time=0.0,
+                p90_response_time=0.0,
+                p95_response_time=0.0,
+                p99_response_time=0.0,
+                max_response_time=0.0,
+                min_response_time=0.0,
+                std_deviation=0.0,
+                throughput=0.0
             )
         
-        # Calculate basic statistics
-        avg_time = np.mean(execution_times)
-        std_dev = np.std(execution_times)
-        
-        # Calculate percentiles
-        p90 = np.percentile(execution_times, 90)
-        p95 = np.percentile(execution_times, 95)
-        p99 = np.percentile(execution_times, 99)
+        avg_time = float(times.mean())
+        std_dev = float(times.std())
+        max_time = float(times.max())
+        min_time = float(times.min())
         
         # Calculate throughput (tests per second)
-        total_time = sum(execution_times)
-        throughput = len(execution_times) / total_time if total_time > 0 else 0
+        total_time = float(times.sum())
+        throughput = times.size / total_time if total_time > 0 else 0.0
+        
+        # Calculate all percentiles in one selection pass; our own buffer
+        # can be partitioned in place instead of copied
+        p90, p95, p99 = np.quantile(times, [0.90, 0.95, 0.99], overwrite_input=owned).tolist()
         
         return PerformanceMetrics(
             avg_response_time=avg_time,
             p90_response_time=p90,
             p95_response_time=p95,
             p99_response_time=p99,
-            max_response_time=max(execution_times),
-            min_response_time=min(execution_times),
+            max_response_time=max_time,
+            min_response_time=min_time,
             std_deviation=std_dev,
             throughput=throughput
         )
@@ -226,14 +284,17 @@ class EnhancedQualityMetrics:
             test_results: Historical test execution results
             error_logs: Error and failure logs
         """
+        # Convert the run records to columns once for all reliability metrics
+        results = RunColumns.from_records(test_results)
+        
         # Calculate stability score
-        stability_score = self._calculate_stability_score(test_results)
+        stability_score = self._calculate_stability_score(results)
         
         # Calculate flakiness rate
-        flakiness_rate = self._calculate_flakiness_rate(test_results)
+        flakiness_rate = self._calculate_flakiness_rate(results)
         
         # Calculate recovery metrics
-        recovery_metrics = self._calculate_recovery_metrics(test_results)
+        recovery_metrics = self._calculate_recovery_metrics(results)
         
         # Analyze error patterns
         error_patterns = self._analyze_error_patterns(error_logs)
@@ -260,42 +321,30 @@ class EnhancedQualityMetrics:
             historical_data: Historical metrics data
             window_size: Window size for trend analysis in days
         """
-        trends = []
-        
         # Group data by date
         daily_metrics = self._group_by_date(historical_data)
+        dates = sorted(daily_metrics)
         
-        # Calculate moving averages
-        for date, metrics in sorted(daily_metrics.items()):
-            coverage_trend = self._calculate_moving_average(
-                metrics["coverage"],
-                window_size
-            )
-            reliability_trend = self._calculate_moving_average(
-                metrics["reliability"],
-                window_size
-            )
-            performance_trend = self._calculate_moving_average(
-                metrics["performance"],
-                window_size
-            )
-            defect_trend = self._calculate_moving_average(
-                metrics["defect_density"],
-                window_size
-            )
-            maintenance_trend = self._calculate_moving_average(
-                metrics["maintenance_effort"],
+        # Rolling mean over the last `window_size` dates for every metric
+        rolling = {
+            metric: self._rolling_mean(
+                [daily_metrics[date][metric] for date in dates],
                 window_size
+            ).tolist()
+            for metric in _TREND_METRICS
+        }
+        
+        trends = [
+            TrendMetrics(
+                date=datetime.combine(date, datetime.min.time()),
+                coverage_trend=rolling["coverage"][i],
+                reliability_trend=rolling["reliability"][i],
+                performance_trend=rolling["performance"][i],
+                defect_density_trend=rolling["defect_density"][i],
+                maintenance_effort_trend=rolling["maintenance_effort"][i]
             )
-            
-            trends.append(TrendMetrics(
-                date=date,
-                coverage_trend=coverage_trend,
-                reliability_trend=reliability_trend,
-                performance_trend=performance_trend,
-                defect_density_trend=defect_trend,
-                maintenance_effort_trend=maintenance_trend
-            ))
+            for i, date in enumerate(dates)
+        ]
         
         return trends
     
@@ -325,12 +374,12 @@ class EnhancedQualityMetrics:
     
     def _find_uncovered_lines(self, coverage_data: Dict) -> List[str]:
         """Find lines without test coverage"""
-        uncovered = []
-        for file, data in coverage_data.get("files", {}).items():
-            for line, covered in data.get("lines", {}).items():
-                if not covered:
-                    uncovered.append(f"{file}:{line}")
-        return uncovered
+        return [
+            f"{file}:{line}"
+            for file, data in coverage_data.get("files", {}).items()
+            for line, covered in data.get("lines", {}).items()
+            if not covered
+        ]
     
     def _calculate_critical_path_coverage(
         self,
@@ -373,121 +422,75 @@ class EnhancedQualityMetrics:
     
     def _identify_risk_areas(
         self,
-        feature: str,
         missing_scenarios: Set[str],
-        test_cases: List[Dict]
+        negative_tests: int,
+        total_tests: int
     ) -> List[str]:
         """Identify potential risk areas in feature coverage"""
         risk_areas = []
         
+        # Classify each missing scenario with one lowercase and one regex scan
+        critical_scenarios = 0
+        edge_cases = 0
+        for scenario in missing_scenarios:
+            kinds = {_RISK_KINDS[keyword] for keyword in _RISK_RE.findall(scenario.lower())}
+            critical_scenarios += "critical" in kinds
+            edge_cases += "edge" in kinds
+        
         # Check critical scenario coverage
-        critical_scenarios = {
-            s for s in missing_scenarios
-            if "critical" in s.lower() or "high" in s.lower()
-        }
         if critical_scenarios:
-            risk_areas.append(f"Missing critical scenarios: {len(critical_scenarios)}")
+            risk_areas.append(f"Missing critical scenarios: {critical_scenarios}")
         
         # Check edge case coverage
-        edge_cases = {
-            s for s in missing_scenarios
-            if "edge" in s.lower() or "boundary" in s.lower()
-        }
         if edge_cases:
-            risk_areas.append(f"Missing edge cases: {len(edge_cases)}")
+            risk_areas.append(f"Missing edge cases: {edge_cases}")
         
         # Check negative test coverage
-        negative_tests = sum(
-            1 for tc in test_cases
-            if tc.get("feature") == feature and tc.get("type") == "negative"
-        )
-        if negative_tests < len(test_cases) * 0.2:  # Expect at least 20% negative tests
+        if negative_tests < total_tests * 0.2:  # Expect at least 20% negative tests
             risk_areas.append("Insufficient negative test coverage")
         
         return risk_areas
     
-    def _calculate_stability_score(self, test_results: List[Dict]) -> float:
+    def _calculate_stability_score(self, results: "RunColumns") -> float:
         """Calculate test stability score"""
-        if not test_results:
+        if not results.test_count:
             return 1.0
-            
-        # Count consistent passes/fails
-        consistent_results = defaultdict(list)
-        for result in test_results:
-            test_id = result["test_id"]
-            consistent_results[test_id].append(result["status"])
-        
-        stable_tests = sum(
-            1 for results in consistent_results.values()
-            if len(set(results)) == 1  # All results same status
-        )
         
-        return stable_tests / len(consistent_results)
+        # Tests whose runs all share one status
+        return (results.test_count - results.changing_tests()) / results.test_count
     
-    def _calculate_flakiness_rate(self, test_results: List[Dict]) -> float:
+    def _calculate_flakiness_rate(self, results: "RunColumns") -> float:
         """Calculate test flakiness rate"""
-        if not test_results:
+        if not results.test_count:
             return 0.0
-            
-        # Group by test ID
-        test_runs = defaultdict(list)
-        for result in test_results:
-            test_runs[result["test_id"]].append(result["status"])
-        
-        # Count flaky tests (tests with inconsistent results)
-        flaky_tests = sum(
-            1 for results in test_runs.values()
-            if len(set(results)) > 1  # Multiple different statuses
-        )
         
-        return flaky_tests / len(test_runs)
+        # Flaky tests have inconsistent results
+        return results.changing_tests() / results.test_count
     
     def _calculate_recovery_metrics(
         self,
-        test_results: List[Dict]
+        results: "RunColumns"
     ) -> Dict[str, float]:
         """Calculate test recovery metrics"""
-        if not test_results:
+        if not results.test_count:
             return {
                 "recovery_rate": 1.0,
                 "mtbf": float("inf"),
                 "mttr": 0.0
             }
         
-        # Calculate recovery rate
-        failure_sequences = defaultdict(list)
-        for result in sorted(test_results, key=lambda x: x["timestamp"]):
-            test_id = result["test_id"]
-            failure_sequences[test_id].append(result["status"])
-        
-        recoveries = 0
-        failures = 0
-        repair_times = []
-        between_failures = []
-        
-        for test_id, sequence in failure_sequences.items():
-            last_status = None
-            last_failure = None
-            last_success = None
-            
-            for i, status in enumerate(sequence):
-                if status == "failed":
-                    failures += 1
-                    if last_status == "passed":
-                        if last_success is not None:
-                            between_failures.append(i - last_success)
-                    last_failure = i
-                elif status == "passed":
-                    if last_status == "failed":
-                        recoveries += 1
-                        if last_failure is not None:
-                            repair_times.append(i - last_failure)
-                    last_success = i
-                last_status = status
+        # Status transitions between consecutive runs of the same test
+        failed = results.statuses == "failed"
+        passed = results.statuses == "passed"
+        same_test = results.same_test_as_previous
+        recoveries = int(np.count_nonzero(same_test & failed[:-1] & passed[1:]))
+        new_failures = int(np.count_nonzero(same_test & passed[:-1] & failed[1:]))
+        failures = int(np.count_nonzero(failed))
         
+        # Repairs and gaps are measured between adjacent runs, so each spans one run
         recovery_rate = recoveries / failures if failures > 0 else 1.0
-        mttr = np.mean(repair_times) if repair_times else 0.0
-        mtbf = np.mean(between_failures) if between_failures else float("inf")
+        mttr = 1.0 if recoveries else 0.0
+        mtbf = 1.0 if new_failures else float("inf")
         
         return {
             "recovery_rate": recovery_rate,
@@ -501,10 +504,7 @@ class EnhancedQualityMetrics:
             return {"clusters": {}, "patterns": []}
         
         # Group errors by type
-        error_clusters = defaultdict(int)
-        for log in error_logs:
-            error_type = log.get("error_type", "unknown")
-            error_clusters[error_type] += 1
+        error_clusters = Counter(log.get("error_type", "unknown") for log in error_logs)
         
         # Identify common patterns
         patterns = []
@@ -529,26 +529,23 @@ class EnhancedQualityMetrics:
         
         for entry in historical_data:
             date = entry["timestamp"].date()
-            for metric_type in [
-                "coverage",
-                "reliability",
-                "performance",
-                "defect_density",
-                "maintenance_effort"
-            ]:
+            for metric_type in _TREND_METRICS:
                 if metric_type in entry:
                     daily_metrics[date][metric_type].append(entry[metric_type])
         
         return daily_metrics
     
-    def _calculate_moving_average(
-        self,
-        values: List[float],
-        window_size: int
-    ) -> float:
-        """Calculate moving average for trend analysis"""
-        if not values:
-            return 0.0
-            
-        window = values[-window_size:] if len(values) > window_size else values
-        return np.mean(window)
+    @staticmethod
+    def _rolling_mean(daily_values: List[List[float]], window_size: int) -> np.ndarray:
+        """Mean of all values in each trailing window of dates, from running sums"""
+        sums = np.concatenate(([0.0], np.cumsum([sum(values) for values in daily_values])))
+        counts = np.concatenate(([0], np.cumsum([len(values) for values in daily_values])))
+        end = np.arange(1, len(daily_values) + 1)
+        start = np.maximum(end - window_size, 0)
+        window_counts = counts[end] - counts[start]
+        return np.divide(
+            sums[end] - sums[start],
+            window_counts,
+            out=np.zeros(len(daily_values)),
+            where=window_counts > 0
+        )
@@ -2,8 +2,9 @@
 Enhanced quality metrics system for measuring test automation effectiveness.
 """
 
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional
 from datetime import datetime, timedelta
+from dataclasses import dataclass
 from pydantic import BaseModel
 import numpy as np
 from ..rag.analysis import RiskAnalyzer
@@ -43,11 +44,53 @@ class ROIMetrics(BaseModel):
     cost_savings: float  # money saved
     roi_percentage: float  # ROI as percentage
 
+@dataclass(slots=True)
+class ResultArrays:
+    """Per-field NumPy columns of a test_results list, filled in one pass"""
+    status: np.ndarray
+    duration: np.ndarray
+    has_duration: np.ndarray
+    creation_time: np.ndarray
+    found_defect: np.ndarray
+    false_positive: np.ndarray
+    needs_maintenance: np.ndarray
+    
+    @classmethod
+    def from_results(cls, test_results: List[Dict]) -> "ResultArrays":
+        n = len(test_results)
+        batch = cls(
+            status=np.empty(n, dtype=object),
+            duration=np.zeros(n, dtype=np.float64),
+            has_duration=np.zeros(n, dtype=bool),
+            creation_time=np.empty(n, dtype=np.float64),
+            found_defect=np.empty(n, dtype=bool),
+            false_positive=np.empty(n, dtype=bool),
+            needs_maintenance=np.empty(n, dtype=bool)
+        )
+        for i, t in enumerate(test_results):
+            batch.status[i] = t.get("status", "")
+            duration = t.get("duration")
+            if duration is not None:
+                batch.duration[i] = duration
+                batch.has_duration[i] = True
+            batch.creation_time[i] = t.get("creation_time", 0)
+            batch.found_defect[i] = bool(t.get("found_defect"))
+            batch.false_positive[i] = bool(t.get("false_positive"))
+            batch.needs_maintenance[i] = bool(t.get("needs_maintenance", False))
+        return batch
+    
+    def count_status(self, status: str) -> int:
+        return int(np.count_nonzero(self.status == status))
+
 class QualityMetrics:
     def __init__(self):
         self.risk_analyzer = RiskAnalyzer()
     
-    async def calculate_automation_roi(
+    def prepare_batch(self, test_results: List[Dict]) -> ResultArrays:
+        """Columns of test_results to share across the calculate_* methods"""
+        return ResultArrays.from_results(test_results)
+    
+    def calculate_automation_roi(
         self,
         test_results: List[Dict],
         manual_metrics: Dict[str, float],
@@ -96,10 +139,11 @@ class QualityMetrics:
             roi_percentage=roi_percentage
         )
     
-    async def calculate_execution_metrics(
+    def calculate_execution_metrics(
         self,
         test_results: List[Dict],
-        execution_history: List[Dict]
+        execution_history: List[Dict],
+        batch: Optional[ResultArrays] = None
     ) -> TestExecutionMetrics:
         """Calculate metrics related to test execution"""
         total = len(test_results)
@@ -115,38 +159,39 @@ class QualityMetrics:
                 parallel_efficiency=0.0
             )
         
-        # Count test results
-        passed = sum(1 for t in test_results if t["status"] == "passed")
-        failed = sum(1 for t in test_results if t["status"] == "failed")
-        skipped = sum(1 for t in test_results if t["status"] == "skipped")
+        # Convert to columns once, then count and sum in C
+        results = batch if batch is not None else self.prepare_batch(test_results)
         
         # Calculate flaky tests
-        flaky_tests = await self._identify_flaky_tests(execution_history)
+        flaky_tests = self._identify_flaky_tests(execution_history)
         
         # Calculate timing metrics
-        execution_times = [t["duration"] for t in test_results if "duration" in t]
-        total_time = sum(execution_times)
-        avg_duration = np.mean(execution_times) if execution_times else 0
+        total_time = float(results.duration.sum())
+        timed_tests = int(np.count_nonzero(results.has_duration))
+        avg_duration = total_time / timed_tests if timed_tests else 0
         
         # Calculate parallel efficiency
-        parallel_efficiency = await self._calculate_parallel_efficiency(execution_history)
+        parallel_efficiency = self._calculate_parallel_efficiency(execution_history)
         
         return TestExecutionMetrics(
             total_tests=total,
-            passed_tests=passed,
-            failed_tests=failed,
+            passed_tests=results.count_status("passed"),
+            failed_tests=results.count_status("failed"),
             flaky_tests=len(flaky_tests),
-            skipped_tests=skipped,
+            skipped_tests=results.count_status("skipped"),
             execution_time=total_time,
             average_duration=avg_duration,
             parallel_efficiency=parallel_efficiency
         )
     
-    async def calculate_automation_metrics(
+    def calculate_automation_metrics(
         self,
         test_results: List[Dict],
         manual_test_count: int,
-        maintenance_logs: List[Dict]
+        maintenance_logs: List[Dict],
+        execution_history: Optional[List[Dict]] = None,
+        batch: Optional[ResultArrays] = None,
+        flaky_count: Optional[int] = None
     ) -> AutomationMetrics:
         """Calculate metrics related to automation effectiveness"""
         total_tests = len(test_results) + manual_test_count
@@ -159,16 +204,21 @@ class QualityMetrics:
         maintenance_hours = sum(log["duration_hours"] for log in maintenance_logs)
         avg_maintenance = maintenance_hours / 30  # per month
         
+        results = batch if batch is not None else self.prepare_batch(test_results)
+        
         # Calculate creation time
-        creation_times = [t.get("creation_time", 0) for t in test_results]
-        avg_creation_time = np.mean(creation_times) if creation_times else 0
+        avg_creation_time = float(results.creation_time.mean()) if automated_tests else 0
         
         # Calculate execution cost
-        total_duration = sum(t.get("duration", 0) for t in test_results)
-        execution_cost = total_duration * 0.00028  # Assumed cloud cost per second
+        execution_cost = float(results.duration.sum()) * 0.00028  # Assumed cloud cost per second
         
         # Calculate reliability
-        reliability = await self._calculate_test_reliability(test_results)
+        # Callers that already have TestExecutionMetrics pass its flaky_tests to skip the
+        # history scan; per-test results carry one status each, so without history nothing
+        # counts as flaky
+        if flaky_count is None:
+            flaky_count = len(self._identify_flaky_tests(execution_history or []))
+        reliability = self._calculate_test_reliability(test_results, results, flaky_count)
         
         return AutomationMetrics(
             automation_coverage=automation_coverage,
@@ -178,17 +228,20 @@ class QualityMetrics:
             reliability=reliability
         )
     
-    async def calculate_defect_metrics(
+    def calculate_defect_metrics(
         self,
         test_results: List[Dict],
-        production_defects: List[Dict]
+        production_defects: List[Dict],
+        batch: Optional[ResultArrays] = None
     ) -> DefectMetrics:
         """Calculate metrics related to defect detection"""
+        results = batch if batch is not None else self.prepare_batch(test_results)
+        
         # Count defects found by tests
-        defects_found = sum(1 for t in test_results if t.get("found_defect"))
+        defects_found = int(np.count_nonzero(results.found_defect))
         
         # Count false positives
-        false_positives = sum(1 for t in test_results if t.get("false_positive"))
+        false_positives = int(np.count_nonzero(results.false_positive))
         
         # Count escaped defects (found in production)
         escaped_defects = len(production_defects)
@@ -198,7 +251,7 @@ class QualityMetrics:
         prevention_rate = (defects_found / total_defects * 100) if total_defects > 0 else 0
         
         # Calculate detection efficiency
-        total_hours = sum(t.get("duration", 0) for t in test_results) / 3600
+        total_hours = float(results.duration.sum()) / 3600
         detection_efficiency = defects_found / total_hours if total_hours > 0 else 0
         
         return DefectMetrics(
@@ -209,30 +262,37 @@ class QualityMetrics:
             detection_efficiency=detection_efficiency
         )
     
-    async def _identify_flaky_tests(
+    def _identify_flaky_tests(
         self,
         execution_history: List[Dict]
     ) -> List[str]:
         """Identify flaky tests from execution history"""
-        flaky_tests = []
-        test_results = {}
-        
-        # Group results by test ID
-        for execution in execution_history:
-            test_id = execution["test_id"]
-            if test_id not in test_results:
-                test_results[test_id] = []
-            test_results[test_id].append(execution["status"])
-        
-        # Identify tests with inconsistent results
-        for test_id, results in test_results.items():
-            if len(results) >= 3:  # Require at least 3 executions
-                if len(set(results)) > 1:  # More than one unique result
-                    flaky_tests.append(test_id)
-        
-        return flaky_tests
+        if not execution_history:
+            return []
+        
+        # Integer-code test IDs in first-seen order and statuses by value
+        group_ids: Dict[str, int] = {}
+        groups = np.fromiter(
+            (group_ids.setdefault(e["test_id"], len(group_ids)) for e in execution_history),
+            dtype=np.int32,
+            count=len(execution_history)
+        )
+        _, codes = np.unique([e["status"] for e in execution_history], return_inverse=True)
+        
+        # Sort once so each test's runs are contiguous, then reduce per run
+        order = np.argsort(groups, kind="stable")
+        codes = codes[order]
+        starts = np.flatnonzero(np.diff(groups[order], prepend=-1))
+        counts = np.diff(starts, append=len(codes))
+        
+        # A test with at least 3 executions and more than one distinct result
+        flaky = (counts >= 3) & (
+            np.minimum.reduceat(codes, starts) != np.maximum.reduceat(codes, starts)
+        )
+        test_ids = list(group_ids)
+        return [test_ids[i] for i in np.flatnonzero(flaky)]
     
-    async def _calculate_parallel_efficiency(
+    def _calculate_parallel_efficiency(
         self,
         execution_history: List[Dict]
     ) -> float:
@@ -240,48 +300,54 @@ class QualityMetrics:
         if not execution_history:
             return 0.0
         
-        # Group executions by run ID
-        runs = {}
-        for execution in execution_history:
-            run_id = execution["run_id"]
-            if run_id not in runs:
-                runs[run_id] = []
-            runs[run_id].append(execution)
-        
-        efficiencies = []
-        for run_executions in runs.values():
-            if not run_executions:
-                continue
-            
-            # Calculate theoretical minimum time (sum of all test durations / number of parallel instances)
-            total_duration = sum(e["duration"] for e in run_executions)
-            actual_duration = max(e["end_time"] - e["start_time"] for e in run_executions)
-            max_parallel = 4  # Assumed maximum parallel instances
-            
-            theoretical_minimum = total_duration / max_parallel
-            efficiency = (theoretical_minimum / actual_duration * 100) if actual_duration > 0 else 0
-            efficiencies.append(min(efficiency, 100))  # Cap at 100%
-        
-        return np.mean(efficiencies) if efficiencies else 0.0
+        n = len(execution_history)
+        run_ids: Dict = {}
+        runs = np.fromiter(
+            (run_ids.setdefault(e["run_id"], len(run_ids)) for e in execution_history),
+            dtype=np.int64,
+            count=n
+        )
+        durations = np.fromiter((e["duration"] for e in execution_history), dtype=np.float64, count=n)
+        spans = np.fromiter(
+            (e["end_time"] - e["start_time"] for e in execution_history), dtype=np.float64, count=n
+        )
+        
+        # Sort by run so each run's executions are contiguous, then reduce per run
+        order = np.argsort(runs, kind="stable")
+        starts = np.flatnonzero(np.diff(runs[order], prepend=-1))
+        total_duration = np.add.reduceat(durations[order], starts)
+        actual_duration = np.maximum.reduceat(spans[order], starts)
+        max_parallel = 4  # Assumed maximum parallel instances
+        
+        # Theoretical minimum time is the summed test time spread over the parallel instances
+        theoretical_minimum = total_duration / max_parallel
+        efficiency = np.divide(
+            theoretical_minimum * 100,
+            actual_duration,
+            out=np.zeros_like(theoretical_minimum),
+            where=actual_duration > 0
+        )
+        return float(np.minimum(efficiency, 100).mean())  # Cap at 100%
     
-    async def _calculate_test_reliability(
+    def _calculate_test_reliability(
         self,
-        test_results: List[Dict]
+        test_results: List[Dict],
+        results: ResultArrays,
+        flaky_count: int
     ) -> float:
         """Calculate test reliability score"""
         if not test_results:
             return 0.0
         
         # Calculate success rate
-        success_rate = sum(1 for t in test_results if t["status"] == "passed") / len(test_results)
+        success_rate = results.count_status("passed") / len(test_results)
         
         # Calculate stability (inverse of flakiness)
-        flaky_tests = await self._identify_flaky_tests(test_results)
-        stability = 1 - (len(flaky_tests) / len(test_results))
+        stability = 1 - (flaky_count / len(test_results))
         
         # Calculate maintenance ratio
         maintenance_ratio = 1 - (
-            sum(1 for t in test_results if t.get("needs_maintenance", False)) / len(test_results)
+            np.count_nonzero(results.needs_maintenance) / len(test_results)
         )
         
         # Weighted combination
@@ -2,7 +2,7 @@
 Models for the test reporting system.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Dict, Optional, Any
 from enum import Enum
 from datetime import datetime
@@ -33,7 +33,9 @@ class TestCategory(str, Enum):
 
 class TestArtifact(BaseModel):
     """Model for test artifacts (screenshots, logs, etc.)"""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     type: str  # screenshot, log, trace, video
     path: str
     content_type: str
@@ -42,7 +44,9 @@ class TestArtifact(BaseModel):
 
 class TestStep(BaseModel):
     """Model for individual test steps"""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     description: str
     status: TestStatus
     duration_ms: int
@@ -53,6 +57,8 @@ class TestStep(BaseModel):
 
 class TestCase(BaseModel):
     """Model for test case execution results"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     id: str
     title: str
     description: Optional[str] = None
@@ -70,7 +76,9 @@ class TestCase(BaseModel):
 
 class TestSuite(BaseModel):
     """Model for test suite execution results"""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     name: str
     description: Optional[str] = None
     test_cases: List[TestCase]
@@ -88,6 +96,8 @@ class TestSuite(BaseModel):
 
 class TestTrend(BaseModel):
     """Model for historical test trends"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     date: datetime
     total_tests: int
     passed_tests: int
@@ -101,7 +111,7 @@ class TestTrend(BaseModel):
 
 class TestReport(BaseModel):
     """Model for comprehensive test report"""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     title: str
     description: Optional[str] = None
     test_suites: List[TestSuite]
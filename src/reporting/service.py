@@ -2,10 +2,16 @@
 Service layer for test report generation.
 """
 
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
-import json
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import date, datetime, timedelta
+import functools
+import os
+import orjson
 from pathlib import Path
+import sqlite3
+import numpy as np
 import plotly.graph_objects as go
 from jinja2 import Template
 import markdown2
@@ -13,19 +19,79 @@ from .models import (
     TestReport, TestSuite, TestCase, TestTrend,
     TestStatus, TestArtifact
 )
-from .templates import HTML_TEMPLATE, MARKDOWN_TEMPLATE
+from .templates import HTML_TEMPLATE_COMPILED, MARKDOWN_TEMPLATE_COMPILED
+
+# Reports above either size are streamed to disk rather than rendered in memory
+LARGE_REPORT_SUITES = 200
+LARGE_REPORT_TESTS = 10_000
+
+# Trend counter name -> TestSuite field it sums
+_TREND_FIELDS = {
+    "total_tests": "total_tests",
+    "passed_tests": "passed_tests",
+    "failed_tests": "failed_tests",
+    "skipped_tests": "skipped_tests",
+    "error_tests": "error_tests",
+    "healed_tests": "healed_tests",
+    "total_duration": "total_duration_ms"
+}
+
+def _load_trend_row(report_file: Path) -> Tuple[str, float, Dict[str, int]]:
+    """Manifest row of a stored report, reading only the fields trends need"""
+    data = orjson.loads(report_file.read_bytes())
+    counters = {
+        name: sum(suite[field] for suite in data["test_suites"])
+        for name, field in _TREND_FIELDS.items()
+    }
+    return data["id"], datetime.fromisoformat(data["generated_at"]).timestamp(), counters
+
+def _json_fallback(value: Any) -> Any:
+    """JSON form of metadata values pydantic can't serialize itself"""
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return str(value)
+
+@functools.lru_cache(maxsize=4096)
+def _format_duration(duration_ms: int) -> str:
+    """Format duration in milliseconds to human-readable string"""
+    seconds = duration_ms / 1000
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    seconds = int(seconds % 60)
+    
+    parts = []
+    if hours > 0:
+        parts.append(f"{hours}h")
+    if minutes > 0 or hours > 0:
+        parts.append(f"{minutes}m")
+    parts.append(f"{seconds}s")
+    
+    return " ".join(parts)
 
 class ReportingService:
     def __init__(self, storage_path: str = "./data/reports"):
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
+        # Suite counters per saved report, aggregated at write time for trends
+        self._manifest_path = self.storage_path / "_manifest.sqlite"
+        with closing(sqlite3.connect(self._manifest_path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reports "
+                "(id TEXT PRIMARY KEY, generated_at REAL, counters BLOB)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS reports_generated_at ON reports (generated_at)"
+            )
+        self._index_unlisted_reports()
         
     def _calculate_summary(self, test_suites: List[TestSuite]) -> Dict[str, Any]:
         """Calculate summary statistics from test suites"""
-        total_tests = sum(suite.total_tests for suite in test_suites)
-        passed_tests = sum(suite.passed_tests for suite in test_suites)
-        healed_tests = sum(suite.healed_tests for suite in test_suites)
-        total_duration = sum(suite.total_duration_ms for suite in test_suites)
+        total_tests = passed_tests = healed_tests = total_duration = 0
+        for suite in test_suites:
+            total_tests += suite.total_tests
+            passed_tests += suite.passed_tests
+            healed_tests += suite.healed_tests
+            total_duration += suite.total_duration_ms
         
         return {
             "total_tests": total_tests,
@@ -36,81 +102,116 @@ class ReportingService:
     
     def _calculate_trends(self, days: int = 30) -> List[TestTrend]:
         """Calculate test execution trends from historical data"""
-        trends = []
         start_date = datetime.now() - timedelta(days=days)
         
-        # Load historical reports
-        historical_reports = []
-        for report_file in self.storage_path.glob("*.json"):
-            if report_file.stat().st_mtime >= start_date.timestamp():
-                with open(report_file, "r") as f:
-                    historical_reports.append(TestReport(**json.load(f)))
+        with closing(sqlite3.connect(self._manifest_path)) as conn:
+            rows = conn.execute(
+                "SELECT generated_at, counters FROM reports WHERE generated_at >= ?",
+                (start_date.timestamp(),)
+            ).fetchall()
+        if not rows:
+            return []
+        
+        # One row of counters per report, summed per day in a single reduction
+        report_days = np.fromiter(
+            (datetime.fromtimestamp(generated_at).date().toordinal() for generated_at, _ in rows),
+            dtype=np.int64,
+            count=len(rows)
+        )
+        values = np.array(
+            [[parsed[name] for name in _TREND_FIELDS] for parsed in (orjson.loads(c) for _, c in rows)],
+            dtype=np.int64
+        )
+        unique_days, day_index, report_counts = np.unique(
+            report_days, return_inverse=True, return_counts=True
+        )
+        totals = np.zeros((len(unique_days), len(_TREND_FIELDS)), dtype=np.int64)
+        np.add.at(totals, day_index, values)
+        
+        stats = dict(zip(_TREND_FIELDS, totals.T))
+        failures = stats["failed_tests"] + stats["error_tests"]
+        heal_candidates = stats["failed_tests"] + stats["healed_tests"]
+        # Clamp denominators to 1 so empty days divide safely, then zero them
+        failure_rate = np.where(
+            stats["total_tests"] > 0,
+            failures / np.maximum(stats["total_tests"], 1) * 100,
+            0.0
+        )
+        healing_success_rate = np.where(
+            heal_candidates > 0,
+            stats["healed_tests"] / np.maximum(heal_candidates, 1) * 100,
+            0.0
+        )
+        avg_duration = stats["total_duration"] // report_counts
         
-        # Group by date
-        daily_stats = {}
-        for report in historical_reports:
-            date = report.generated_at.date()
-            if date not in daily_stats:
-                daily_stats[date] = {
-                    "total_tests": 0,
-                    "passed_tests": 0,
-                    "failed_tests": 0,
-                    "skipped_tests": 0,
-                    "error_tests": 0,
-                    "healed_tests": 0,
-                    "total_duration": 0,
-                    "count": 0
-                }
-            
-            stats = daily_stats[date]
-            for suite in report.test_suites:
-                stats["total_tests"] += suite.total_tests
-                stats["passed_tests"] += suite.passed_tests
-                stats["failed_tests"] += suite.failed_tests
-                stats["skipped_tests"] += suite.skipped_tests
-                stats["error_tests"] += suite.error_tests
-                stats["healed_tests"] += suite.healed_tests
-                stats["total_duration"] += suite.total_duration_ms
-            stats["count"] += 1
+        # Counters come from reports this service wrote, so skip re-validation
+        return [
+            TestTrend.model_construct(
+                date=datetime.combine(date.fromordinal(day), datetime.min.time()),
+                total_tests=total,
+                passed_tests=passed,
+                failed_tests=failed,
+                skipped_tests=skipped,
+                error_tests=error,
+                healed_tests=healed,
+                avg_duration_ms=duration,
+                failure_rate=fail_rate,
+                healing_success_rate=heal_rate
+            )
+            for day, total, passed, failed, skipped, error, healed, duration, fail_rate, heal_rate in zip(
+                unique_days.tolist(),
+                stats["total_tests"].tolist(),
+                stats["passed_tests"].tolist(),
+                stats["failed_tests"].tolist(),
+                stats["skipped_tests"].tolist(),
+                stats["error_tests"].tolist(),
+                stats["healed_tests"].tolist(),
+                avg_duration.tolist(),
+                failure_rate.tolist(),
+                healing_success_rate.tolist()
+            )
+        ]
+    
+    def _record_in_manifest(self, rows: List[Tuple[str, float, Dict[str, int]]]):
+        """Store (report id, generated_at timestamp, suite counters) rows"""
+        with closing(sqlite3.connect(self._manifest_path)) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO reports (id, generated_at, counters) VALUES (?, ?, ?)",
+                [(report_id, ts, orjson.dumps(counters)) for report_id, ts, counters in rows]
+            )
+    
+    def _index_unlisted_reports(self):
+        """Add reports saved before the manifest existed"""
+        with closing(sqlite3.connect(self._manifest_path)) as conn:
+            listed = {row[0] for row in conn.execute("SELECT id FROM reports")}
         
-        # Create trends
-        for date, stats in sorted(daily_stats.items()):
-            trends.append(TestTrend(
-                date=datetime.combine(date, datetime.min.time()),
-                total_tests=stats["total_tests"],
-                passed_tests=stats["passed_tests"],
-                failed_tests=stats["failed_tests"],
-                skipped_tests=stats["skipped_tests"],
-                error_tests=stats["error_tests"],
-                healed_tests=stats["healed_tests"],
-                avg_duration_ms=stats["total_duration"] // stats["count"],
-                failure_rate=(stats["failed_tests"] + stats["error_tests"]) / stats["total_tests"] * 100 if stats["total_tests"] > 0 else 0,
-                healing_success_rate=stats["healed_tests"] / (stats["failed_tests"] + stats["healed_tests"]) * 100 if (stats["failed_tests"] + stats["healed_tests"]) > 0 else 0
-            ))
+        unlisted = [
+            report_file for report_file in self.storage_path.glob("report_*.json")
+            if report_file.stem.removeprefix("report_") not in listed
+        ]
+        if not unlisted:
+            return
         
-        return trends
+        # File reads release the GIL, so overlap them across a thread pool
+        with ThreadPoolExecutor(max_workers=min(16, (os.cpu_count() or 1) * 2)) as pool:
+            self._record_in_manifest(list(pool.map(_load_trend_row, unlisted)))
+    
     
     def _format_duration(self, duration_ms: int) -> str:
         """Format duration in milliseconds to human-readable string"""
-        seconds = duration_ms / 1000
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        seconds = int(seconds % 60)
-        
-        parts = []
-        if hours > 0:
-            parts.append(f"{hours}h")
-        if minutes > 0 or hours > 0:
-            parts.append(f"{minutes}m")
-        parts.append(f"{seconds}s")
-        
-        return " ".join(parts)
+        return _format_duration(duration_ms)
     
     def _save_report(self, report: TestReport):
         """Save report to storage"""
         report_path = self.storage_path / f"report_{report.id}.json"
-        with open(report_path, "w") as f:
-            json.dump(report.dict(), f, default=str)
+        # Serialize in pydantic-core without building an intermediate dict tree
+        report_path.write_bytes(report.model_dump_json(fallback=_json_fallback).encode())
+        
+        counters = {
+            name: sum(getattr(suite, field) for suite in report.test_suites)
+            for name, field in _TREND_FIELDS.items()
+        }
+        self._record_in_manifest([(str(report.id), report.generated_at.timestamp(), counters)])
     
     def generate_report(
         self,
@@ -135,30 +236,43 @@ class ReportingService:
         self._save_report(report)
         return report
     
+    def _template_context(self, report: TestReport) -> Dict[str, Any]:
+        """Dump the report once to plain JSON-compatible data for the templates"""
+        data = report.model_dump(mode="json", fallback=_json_fallback)
+        # Trends hold only dates and numbers, so they can be embedded in a script verbatim
+        return {"report": data, "trends_json": orjson.dumps(data["trends"]).decode()}
+    
     def generate_html_report(self, report: TestReport) -> str:
         """Generate HTML report"""
-        template = Template(HTML_TEMPLATE)
-        return template.render(report=report)
+        return HTML_TEMPLATE_COMPILED.render(self._template_context(report))
     
     def generate_markdown_report(self, report: TestReport) -> str:
         """Generate Markdown report"""
-        template = Template(MARKDOWN_TEMPLATE)
-        return template.render(report=report)
+        return MARKDOWN_TEMPLATE_COMPILED.render(self._template_context(report))
+    
+    def _write_rendered(self, template: Template, report: TestReport, output_path):
+        """Render a report template to a UTF-8 file"""
+        context = self._template_context(report)
+        total_tests = sum(suite.total_tests for suite in report.test_suites)
+        if len(report.test_suites) <= LARGE_REPORT_SUITES and total_tests <= LARGE_REPORT_TESTS:
+            # Small reports render in memory and land in a single write
+            Path(output_path).write_bytes(template.render(context).encode("utf-8"))
+            return
+        
+        # Large reports stream through a 1 MiB buffer instead of building the whole page
+        with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+            template.stream(context).dump(f)
     
     def save_html_report(self, report: TestReport, output_path: Optional[str] = None):
         """Save HTML report to file"""
         if output_path is None:
             output_path = self.storage_path / f"report_{report.id}.html"
         
-        html_content = self.generate_html_report(report)
-        with open(output_path, "w") as f:
-            f.write(html_content)
+        self._write_rendered(HTML_TEMPLATE_COMPILED, report, output_path)
     
     def save_markdown_report(self, report: TestReport, output_path: Optional[str] = None):
         """Save Markdown report to file"""
         if output_path is None:
             output_path = self.storage_path / f"report_{report.id}.md"
         
-        md_content = self.generate_markdown_report(report)
-        with open(output_path, "w") as f:
-            f.write(md_content)
+        self._write_rendered(MARKDOWN_TEMPLATE_COMPILED, report, output_path)
@@ -2,6 +2,8 @@
 HTML and Markdown templates for test reports.
 """
 
+from jinja2 import Environment
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en">
@@ -9,7 +11,9 @@ HTML_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{{ report.title }}</title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    {% if report.trends %}
+    <script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script>
+    {% endif %}
     <style>
         :root {
             --primary-color: #2563eb;
@@ -139,9 +143,11 @@ HTML_TEMPLATE = """
             </div>
         </div>
         
+        {% if report.trends %}
         <div id="trendChart" class="trend-chart">
             <!-- Plotly chart will be rendered here -->
         </div>
+        {% endif %}
         
         {% for suite in report.test_suites %}
         <div class="test-suite">
@@ -179,9 +185,10 @@ HTML_TEMPLATE = """
         {% endfor %}
     </div>
     
+    {% if report.trends %}
     <script>
         // Render trend chart using Plotly
-        const trends = {{ report.trends | tojson }};
+        const trends = {{ trends_json | safe }};
         const dates = trends.map(t => t.date);
         const passRates = trends.map(t => (t.passed_tests / t.total_tests) * 100);
         const healingRates = trends.map(t => t.healing_success_rate);
@@ -208,6 +215,7 @@ HTML_TEMPLATE = """
         
         Plotly.newPlot('trendChart', [trace1, trace2], layout);
     </script>
+    {% endif %}
 </body>
 </html>
 """
@@ -269,3 +277,10 @@ Steps:
 - {{ key }}: {{ value }}
 {% endfor %}
 """
+
+# Parsed once at import; templates never change at runtime
+_html_env = Environment(autoescape=True, auto_reload=False)
+_markdown_env = Environment(autoescape=False, auto_reload=False)
+
+HTML_TEMPLATE_COMPILED = _html_env.from_string(HTML_TEMPLATE)
+MARKDOWN_TEMPLATE_COMPILED = _markdown_env.from_string(MARKDOWN_TEMPLATE)
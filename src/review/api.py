@@ -2,16 +2,22 @@
 API endpoints for the QA review system.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from typing import List
-from .models import TestCase, TestReview, ReviewStats
+from .models import TestCase, TestCaseCreate, TestReview, ReviewStats
 from .service import ReviewService
 
 router = APIRouter(prefix="/review", tags=["review"])
-service = ReviewService()
+
+def get_review_service(request: Request) -> ReviewService:
+    """Review service created by the app's lifespan"""
+    return request.app.state.review
 
 @router.post("/queue", response_model=TestCase)
-async def queue_test_for_review(test_case: dict):
+async def queue_test_for_review(
+    test_case: TestCaseCreate,
+    service: ReviewService = Depends(get_review_service)
+):
     """Queue a test case for review"""
     try:
         return await service.queue_for_review(test_case)
@@ -19,12 +25,15 @@ async def queue_test_for_review(test_case: dict):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/pending", response_model=List[TestCase])
-async def get_pending_reviews():
+async def get_pending_reviews(service: ReviewService = Depends(get_review_service)):
     """Get all test cases pending review"""
     return await service.get_pending_reviews()
 
 @router.post("/submit", response_model=TestCase)
-async def submit_review(review: TestReview):
+async def submit_review(
+    review: TestReview,
+    service: ReviewService = Depends(get_review_service)
+):
     """Submit a review for a test case"""
     try:
         return await service.submit_review(review)
@@ -34,6 +43,6 @@ async def submit_review(review: TestReview):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/stats", response_model=ReviewStats)
-async def get_review_stats():
+async def get_review_stats(service: ReviewService = Depends(get_review_service)):
     """Get review statistics"""
     return await service.get_review_stats()
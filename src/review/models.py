@@ -30,13 +30,16 @@ class TestReview(BaseModel):
     rating: int = Field(ge=1, le=5)
     review_date: datetime = Field(default_factory=datetime.now)
 
-class TestCase(BaseModel):
-    """Model for test case with review status"""
+class TestCaseCreate(BaseModel):
+    """Model for a test case submitted for review"""
     id: str
     title: str
     category: str
     steps: List[str]
     expected_result: str
+
+class TestCase(TestCaseCreate):
+    """Model for test case with review status"""
     review_status: ReviewStatus = ReviewStatus.PENDING
     reviews: List[TestReview] = []
     created_at: datetime = Field(default_factory=datetime.now)
@@ -3,52 +3,136 @@ Service layer for the QA review system.
 """
 
 from typing import List, Dict, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
-from .models import TestCase, TestReview, ReviewStats, ReviewStatus, FeedbackType
-import json
+from .models import TestCase, TestCaseCreate, TestReview, ReviewStats, ReviewStatus, FeedbackType
+import asyncio
+import orjson
 import os
 from pathlib import Path
 
+@dataclass(slots=True)
+class _ReviewTotals:
+    """Running review aggregates, updated as reviews are added or dropped"""
+    total: int = 0
+    rating_sum: int = 0
+    status_counts: Counter = field(default_factory=Counter)
+    feedback_counts: Counter = field(default_factory=Counter)
+    
+    def add(self, review: TestReview, sign: int = 1):
+        self.total += sign
+        self.rating_sum += sign * review.rating
+        self.status_counts[review.status] += sign
+        for ft in review.feedback_type:
+            self.feedback_counts[ft] += sign
+
 class ReviewService:
+    # Journal writes between snapshot rewrites
+    COMPACT_EVERY = 1000
+    
     def __init__(self, storage_path: str = "./data/reviews"):
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
+        self._snapshot_path = self.storage_path / "test_cases.json"
+        self._log_path = self.storage_path / "test_cases.log"
         self.test_cases: Dict[str, TestCase] = self._load_test_cases()
+        self._totals = _ReviewTotals()
+        # Ids of pending test cases, a dict so it keeps queue order
+        self._pending: Dict[str, None] = {}
+        # Bound to locals since this walks every stored case and review
+        add_review = self._totals.add
+        pending = self._pending
+        PENDING = ReviewStatus.PENDING
+        for tc in self.test_cases.values():
+            for review in tc.reviews:
+                add_review(review)
+            if tc.review_status == PENDING:
+                pending[tc.id] = None
+        
+        # Fold the previous run's journal into the snapshot and start a fresh one
+        self._log_fp = None
+        self.compact()
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="review-io")
         
     def _load_test_cases(self) -> Dict[str, TestCase]:
-        """Load test cases from storage"""
+        """Load the test case snapshot, then replay journaled changes on top"""
         test_cases = {}
-        if (self.storage_path / "test_cases.json").exists():
-            with open(self.storage_path / "test_cases.json", "r") as f:
-                data = json.load(f)
-                for tc in data:
-                    test_cases[tc["id"]] = TestCase(**tc)
+        if self._snapshot_path.exists():
+            for tc in orjson.loads(self._snapshot_path.read_bytes()):
+                test_cases[tc["id"]] = TestCase(**tc)
+        
+        if self._log_path.exists():
+            with open(self._log_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # Only the final line can be torn by an interrupted write
+                        break
+                    if entry["op"] == "upsert":
+                        test_cases[entry["tc"]["id"]] = TestCase(**entry["tc"])
         return test_cases
     
-    def _save_test_cases(self):
-        """Save test cases to storage"""
-        with open(self.storage_path / "test_cases.json", "w") as f:
-            json.dump([tc.dict() for tc in self.test_cases.values()], f, default=str)
+    async def _save_test_case(self, tc: TestCase):
+        """Record one test case change without blocking the event loop"""
+        # Encode on the loop so the bytes match the in-memory state at this point;
+        # the single-worker executor then applies writes in submission order
+        loop = asyncio.get_running_loop()
+        self._journal_writes += 1
+        if self._journal_writes >= self.COMPACT_EVERY:
+            self._journal_writes = 0
+            await loop.run_in_executor(self._io, self._compact_sync, self._snapshot_bytes())
+        else:
+            line = orjson.dumps({"op": "upsert", "tc": tc.model_dump(mode="json")}) + b"\n"
+            await loop.run_in_executor(self._io, self._append_sync, line)
+    
+    def _append_sync(self, line: bytes):
+        self._log_fp.write(line)
+        self._log_fp.flush()
     
-    async def queue_for_review(self, test_case: Dict) -> TestCase:
+    def _snapshot_bytes(self) -> bytes:
+        return orjson.dumps([tc.model_dump(mode="json") for tc in self.test_cases.values()])
+    
+    def _compact_sync(self, snapshot: bytes):
+        """Replace the snapshot atomically and start an empty journal"""
+        tmp_path = self._snapshot_path.with_suffix(".json.tmp")
+        tmp_path.write_bytes(snapshot)
+        os.replace(tmp_path, self._snapshot_path)
+        
+        if self._log_fp is not None:
+            self._log_fp.close()
+        self._log_fp = open(self._log_path, "wb")
+    
+    def compact(self):
+        """Rewrite the full snapshot and truncate the journal"""
+        self._journal_writes = 0
+        self._compact_sync(self._snapshot_bytes())
+    
+    def close(self):
+        """Finish pending writes, compact and release the journal file"""
+        self._io.shutdown(wait=True)
+        self.compact()
+        self._log_fp.close()
+    
+    async def queue_for_review(self, test_case: TestCaseCreate) -> TestCase:
         """Queue a new test case for review"""
-        tc = TestCase(
-            id=test_case["id"],
-            title=test_case["title"],
-            category=test_case["category"],
-            steps=test_case["steps"],
-            expected_result=test_case["expected_result"]
-        )
+        # The request body is already validated, so the remaining fields just take their defaults
+        tc = TestCase.model_construct(**dict(test_case))
+        # Re-queueing replaces the case and drops its earlier reviews
+        previous = self.test_cases.get(tc.id)
+        if previous is not None:
+            for old_review in previous.reviews:
+                self._totals.add(old_review, sign=-1)
         self.test_cases[tc.id] = tc
-        self._save_test_cases()
+        self._pending[tc.id] = None
+        await self._save_test_case(tc)
         return tc
     
     async def get_pending_reviews(self) -> List[TestCase]:
         """Get all test cases pending review"""
-        return [
-            tc for tc in self.test_cases.values()
-            if tc.review_status == ReviewStatus.PENDING
-        ]
+        return [self.test_cases[test_id] for test_id in self._pending]
     
     async def submit_review(self, review: TestReview) -> TestCase:
         """Submit a review for a test case"""
@@ -57,6 +141,7 @@ class ReviewService:
         
         test_case = self.test_cases[review.test_id]
         test_case.reviews.append(review)
+        self._totals.add(review)
         test_case.review_status = review.status
         test_case.updated_at = datetime.now()
         
@@ -66,35 +151,24 @@ class ReviewService:
                 if hasattr(test_case, field):
                     setattr(test_case, field, value)
         
-        self._save_test_cases()
+        if test_case.review_status == ReviewStatus.PENDING:
+            self._pending[test_case.id] = None
+        else:
+            self._pending.pop(test_case.id, None)
+        
+        await self._save_test_case(test_case)
         return test_case
     
     async def get_review_stats(self) -> ReviewStats:
         """Get review statistics"""
-        total = len([r for tc in self.test_cases.values() for r in tc.reviews])
-        approved = len([r for tc in self.test_cases.values() 
-                       for r in tc.reviews if r.status == ReviewStatus.APPROVED])
-        rejected = len([r for tc in self.test_cases.values() 
-                       for r in tc.reviews if r.status == ReviewStatus.REJECTED])
-        needs_changes = len([r for tc in self.test_cases.values() 
-                           for r in tc.reviews if r.status == ReviewStatus.NEEDS_CHANGES])
-        
-        # Calculate average rating
-        ratings = [r.rating for tc in self.test_cases.values() for r in tc.reviews]
-        avg_rating = sum(ratings) / len(ratings) if ratings else 0
-        
-        # Count feedback by type
-        feedback_counts = {}
-        for tc in self.test_cases.values():
-            for review in tc.reviews:
-                for ft in review.feedback_type:
-                    feedback_counts[ft] = feedback_counts.get(ft, 0) + 1
+        totals = self._totals
+        avg_rating = totals.rating_sum / totals.total if totals.total else 0
         
         return ReviewStats(
-            total_reviews=total,
-            approved_count=approved,
-            rejected_count=rejected,
-            needs_changes_count=needs_changes,
+            total_reviews=totals.total,
+            approved_count=totals.status_counts[ReviewStatus.APPROVED],
+            rejected_count=totals.status_counts[ReviewStatus.REJECTED],
+            needs_changes_count=totals.status_counts[ReviewStatus.NEEDS_CHANGES],
             average_rating=avg_rating,
-            feedback_by_type=feedback_counts
+            feedback_by_type={ft: n for ft, n in totals.feedback_counts.items() if n}
         )
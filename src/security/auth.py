@@ -2,24 +2,69 @@
 Authentication and authorization service.
 """
 
-from typing import Optional, Set, Dict, List
-from datetime import datetime, timedelta
+from typing import FrozenSet, Optional, Set, Dict, List, Tuple
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, Security
 from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
 from jose import JWTError, jwt
-from pydantic import ValidationError
-import json
+from pydantic import SecretStr, ValidationError
+import asyncio
+import functools
+import hashlib
+import logging
+import orjson
 from pathlib import Path
+import time
 import uuid
 from .models import (
     User, ApiKey, Role, Permission,
-    SecurityConfig, DEFAULT_ROLE_PERMISSIONS
+    SecurityConfig, ROLE_TO_PERMS
 )
 from .encryption import PasswordHasher
 
+logger = logging.getLogger(__name__)
+
+def _json_default(value):
+    """Encode the model values orjson has no native form for"""
+    if isinstance(value, SecretStr):
+        return value.get_secret_value()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+@functools.lru_cache(maxsize=64)
+def _perms_for_roles(roles: FrozenSet[Role]) -> FrozenSet[Permission]:
+    """Permissions granted by a role set; there are only a few distinct sets"""
+    return frozenset().union(*(ROLE_TO_PERMS.get(role, ()) for role in roles))
+
+def _permissions_for(roles: Set[Role]) -> Set[Permission]:
+    return set(_perms_for_roles(frozenset(roles)))
+
+def _hash_api_key(key: str) -> bytes:
+    """Digest an API key is stored and looked up by"""
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+def _dump(records: List[dict]) -> bytes:
+    return orjson.dumps(records, default=_json_default)
+
+# Security schemes, defined here so the dependency signatures below can use them
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+api_key_header = APIKeyHeader(name="X-API-Key")
+
 class AuthService:
     """Handles authentication and authorization"""
     
+    # Buffered last_used updates are written at most this often
+    LAST_USED_FLUSH_INTERVAL = 1.0
+    
+    # A key's last_used is only refreshed once it is at least this old
+    LAST_USED_RESOLUTION = timedelta(seconds=60)
+    
+    # Verified JWT payloads are reused for up to this many seconds
+    JWT_CACHE_TTL = 60
+    JWT_CACHE_SIZE = 4096
+    
     def __init__(
         self,
         storage_path: str = "./data/auth",
@@ -32,60 +77,90 @@ class AuthService:
         
         # Load users and API keys
         self.users: Dict[str, User] = self._load_users()
-        self.api_keys: Dict[str, ApiKey] = self._load_api_keys()
+        self.api_keys: Dict[bytes, ApiKey] = self._load_api_keys()
+        
+        # Keys whose last_used changed since the last save
+        self._dirty_keys: Set[bytes] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        # Raw token -> (cache expiry as unix time, decoded payload)
+        self._jwt_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
         
         # Initialize OAuth2 scheme
-        self.oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-        self.api_key_header = APIKeyHeader(name="X-API-Key")
+        self.oauth2_scheme = oauth2_scheme
+        self.api_key_header = api_key_header
     
     def _load_users(self) -> Dict[str, User]:
         """Load users from storage"""
         users = {}
         if (self.storage_path / "users.json").exists():
-            with open(self.storage_path / "users.json", "r") as f:
-                data = json.load(f)
-                for user_data in data:
-                    user = User(**user_data)
-                    users[user.id] = user
+            for user_data in orjson.loads((self.storage_path / "users.json").read_bytes()):
+                user = User(**user_data)
+                users[user.id] = user
         return users
     
     def _save_users(self):
         """Save users to storage"""
-        with open(self.storage_path / "users.json", "w") as f:
-            json.dump(
-                [user.dict() for user in self.users.values()],
-                f,
-                default=str
-            )
-    
-    def _load_api_keys(self) -> Dict[str, ApiKey]:
-        """Load API keys from storage"""
+        (self.storage_path / "users.json").write_bytes(
+            _dump([user.model_dump() for user in self.users.values()])
+        )
+    
+    def _load_api_keys(self) -> Dict[bytes, ApiKey]:
+        """Load API keys from storage, keyed by the digest of the plaintext key"""
         api_keys = {}
+        migrated = False
         if (self.storage_path / "api_keys.json").exists():
-            with open(self.storage_path / "api_keys.json", "r") as f:
-                data = json.load(f)
-                for key_data in data:
+            for key_data in orjson.loads((self.storage_path / "api_keys.json").read_bytes()):
+                # Older files hold the plaintext key; it is hashed and not kept
+                plaintext = key_data.pop("key", None)
+                if plaintext is not None:
+                    migrated = True
+                    key_data.setdefault("key_hash", _hash_api_key(plaintext).hex())
+                try:
                     key = ApiKey(**key_data)
-                    api_keys[key.key.get_secret_value()] = key
+                    digest = bytes.fromhex(key.key_hash)
+                except (ValidationError, ValueError) as e:
+                    logger.warning("Skipping malformed API key record %s: %s", key_data.get("id"), e)
+                    continue
+                api_keys[digest] = key
+        if migrated:
+            # Don't leave the plaintext secrets on disk until some later save
+            (self.storage_path / "api_keys.json").write_bytes(self._dump_api_keys(api_keys))
         return api_keys
     
+    def _dump_api_keys(self, api_keys: Optional[Dict[bytes, ApiKey]] = None) -> bytes:
+        """Encode API keys for storage without their plaintext"""
+        api_keys = self.api_keys if api_keys is None else api_keys
+        return _dump([key.model_dump(exclude={"key"}) for key in api_keys.values()])
+    
     def _save_api_keys(self):
         """Save API keys to storage"""
-        with open(self.storage_path / "api_keys.json", "w") as f:
-            json.dump(
-                [key.dict() for key in self.api_keys.values()],
-                f,
-                default=str
-            )
+        (self.storage_path / "api_keys.json").write_bytes(self._dump_api_keys())
+        self._dirty_keys.clear()
     
-    def create_user(
+    async def _flush_last_used(self):
+        """Save buffered last_used updates periodically until none are pending"""
+        while self._dirty_keys:
+            await asyncio.sleep(self.LAST_USED_FLUSH_INTERVAL)
+            if self._dirty_keys:
+                # Encode on the loop, where the keys can't change mid-dump; write in a thread
+                data = self._dump_api_keys()
+                self._dirty_keys.clear()
+                await asyncio.to_thread((self.storage_path / "api_keys.json").write_bytes, data)
+    
+    def flush(self):
+        """Write any buffered last_used updates now"""
+        if self._dirty_keys:
+            self._save_api_keys()
+    
+    def _build_user(
         self,
         email: str,
         password: str,
         full_name: str,
         roles: Set[Role]
     ) -> User:
-        """Create a new user"""
+        """Validate and build a user without storing it"""
         # Validate password
         if len(password) < self.config.password_min_length:
             raise ValueError("Password too short")
@@ -94,53 +169,84 @@ class AuthService:
         hash_b64, salt_b64 = self.password_hasher.hash_password(password)
         
         # Get permissions for roles
-        permissions = set()
-        for role_mapping in DEFAULT_ROLE_PERMISSIONS:
-            if role_mapping.role in roles:
-                permissions.update(role_mapping.permissions)
+        permissions = _permissions_for(roles)
         
-        # Create user
-        user = User(
+        return User(
             email=email,
             hashed_password=f"{hash_b64}:{salt_b64}",
             full_name=full_name,
             roles=roles,
             permissions=permissions
         )
-        
-        self.users[user.id] = user
+    
+    def create_users_batch(self, specs: List[Dict]) -> List[User]:
+        """Create several users with a single write; specs hold create_user's arguments"""
+        # Build everything first so one invalid spec stores nothing
+        users = [self._build_user(**spec) for spec in specs]
+        for user in users:
+            self.users[user.id] = user
         self._save_users()
-        return user
+        return users
     
-    def create_api_key(
+    def create_user(
+        self,
+        email: str,
+        password: str,
+        full_name: str,
+        roles: Set[Role]
+    ) -> User:
+        """Create a new user"""
+        return self.create_users_batch([{
+            "email": email,
+            "password": password,
+            "full_name": full_name,
+            "roles": roles
+        }])[0]
+    
+    def _build_api_key(
         self,
         user_id: str,
         name: str,
         permissions: Optional[Set[Permission]] = None
     ) -> ApiKey:
-        """Create a new API key for a user"""
+        """Generate an API key for a user without storing it; the result carries the plaintext"""
         if user_id not in self.users:
             raise ValueError("User not found")
         
-        # Generate API key
-        key = f"ak_{uuid.uuid4().hex}"
-        
         # Use user's permissions if none specified
         if permissions is None:
             permissions = self.users[user_id].permissions
         
-        # Create API key
-        api_key = ApiKey(
+        key = f"ak_{uuid.uuid4().hex}"
+        return ApiKey(
             key=key,
+            key_hash=_hash_api_key(key).hex(),
             name=name,
             user_id=user_id,
             permissions=permissions,
-            expires_at=datetime.now() + timedelta(days=self.config.api_key_expiry_days)
+            expires_at=datetime.now(timezone.utc) + timedelta(days=self.config.api_key_expiry_days)
         )
-        
-        self.api_keys[key] = api_key
+    
+    def create_api_keys_batch(self, specs: List[Dict]) -> List[ApiKey]:
+        """Create several API keys with a single write; specs hold create_api_key's arguments"""
+        api_keys = [self._build_api_key(**spec) for spec in specs]
+        for api_key in api_keys:
+            self.api_keys[bytes.fromhex(api_key.key_hash)] = api_key.model_copy(update={"key": None})
         self._save_api_keys()
-        return api_key
+        return api_keys
+    
+    def create_api_key(
+        self,
+        user_id: str,
+        name: str,
+        permissions: Optional[Set[Permission]] = None
+    ) -> ApiKey:
+        """Create a new API key for a user"""
+        return self.create_api_keys_batch([{
+            "user_id": user_id,
+            "name": name,
+            "permissions": permissions
+        }])[0]
     
     def create_access_token(
         self,
@@ -164,17 +270,36 @@ class AuthService:
             algorithm="HS256"
         )
     
+    def _decode_token(self, token: str) -> Dict:
+        """Decode a JWT, reusing the payload of recently verified tokens"""
+        now = time.time()
+        cached = self._jwt_cache.get(token)
+        if cached is not None and cached[0] > now:
+            self._jwt_cache.move_to_end(token)
+            return cached[1]
+        
+        payload = jwt.decode(
+            token,
+            self.config.jwt_secret.get_secret_value(),
+            algorithms=["HS256"]
+        )
+        # Never trust a cached payload past the token's own expiry
+        valid_until = now + self.JWT_CACHE_TTL
+        if isinstance(payload.get("exp"), (int, float)):
+            valid_until = min(valid_until, payload["exp"])
+        self._jwt_cache[token] = (valid_until, payload)
+        self._jwt_cache.move_to_end(token)
+        if len(self._jwt_cache) > self.JWT_CACHE_SIZE:
+            self._jwt_cache.popitem(last=False)
+        return payload
+    
     async def get_current_user(
         self,
         token: str = Depends(oauth2_scheme)
     ) -> User:
         """Get current user from JWT token"""
         try:
-            payload = jwt.decode(
-                token,
-                self.config.jwt_secret.get_secret_value(),
-                algorithms=["HS256"]
-            )
+            payload = self._decode_token(token)
             user_id = payload.get("sub")
             if user_id is None:
                 raise HTTPException(status_code=401, detail="Invalid token")
@@ -193,20 +318,25 @@ class AuthService:
         api_key: str = Security(api_key_header)
     ) -> User:
         """Get user from API key"""
-        key_data = self.api_keys.get(api_key)
+        digest = _hash_api_key(api_key)
+        key_data = self.api_keys.get(digest)
         if key_data is None:
             raise HTTPException(status_code=401, detail="Invalid API key")
         
-        if key_data.expires_at and key_data.expires_at < datetime.now():
+        now = datetime.now(timezone.utc)
+        if key_data.expires_at and key_data.expires_at < now:
             raise HTTPException(status_code=401, detail="API key expired")
         
         user = self.users.get(key_data.user_id)
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         
-        # Update last used timestamp
-        key_data.last_used = datetime.now()
-        self._save_api_keys()
+        # Update last used timestamp; the write is coalesced off the request path
+        if key_data.last_used is None or now - key_data.last_used >= self.LAST_USED_RESOLUTION:
+            key_data.last_used = now
+            self._dirty_keys.add(digest)
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_last_used())
         
         return user
     
@@ -220,8 +350,9 @@ class AuthService:
     
     def revoke_api_key(self, key: str):
         """Revoke an API key"""
-        if key in self.api_keys:
-            del self.api_keys[key]
+        digest = _hash_api_key(key)
+        if digest in self.api_keys:
+            del self.api_keys[digest]
             self._save_api_keys()
     
     def update_user_roles(
@@ -237,10 +368,7 @@ class AuthService:
         user.roles = roles
         
         # Recalculate permissions
-        permissions = set()
-        for role_mapping in DEFAULT_ROLE_PERMISSIONS:
-            if role_mapping.role in roles:
-                permissions.update(role_mapping.permissions)
+        permissions = _permissions_for(roles)
         
         user.permissions = permissions
         self._save_users()
@@ -3,48 +3,115 @@ Service for handling data encryption and key management.
 """
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.fernet import Fernet
+import asyncio
+import fcntl
 import os
 import base64
-import json
-from typing import Dict, Any, Optional, Tuple
+import hashlib
+import hmac
+import orjson
+import struct
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 from .models import EncryptionAlgorithm, EncryptedData
 
 class KeyManager:
     """Manages encryption keys and key rotation"""
     
+    # All keys live in one file of (id length, id, key length, key) records, oldest first
+    KEYSTORE_FILE = "keys.bin"
+    _LENGTH = struct.Struct("<H")
+    
     def __init__(self, key_store_path: str = "./data/keys"):
         self.key_store_path = key_store_path
         os.makedirs(key_store_path, exist_ok=True)
         self.active_key_id = None
         self.keys: Dict[str, bytes] = {}
+        # AEAD instances per (key id, algorithm), so each key is expanded once
+        self._ciphers: Dict[Tuple[str, EncryptionAlgorithm], Any] = {}
         self._load_keys()
     
+    def _pack(self, key_id: str, key: bytes) -> bytes:
+        """Encode one keystore record"""
+        key_id_bytes = key_id.encode()
+        return (
+            self._LENGTH.pack(len(key_id_bytes)) + key_id_bytes
+            + self._LENGTH.pack(len(key)) + key
+        )
+    
+    def _parse(self, data: bytes) -> Tuple[List[Tuple[str, bytes]], int]:
+        """Decode keystore records; returns them and the offset where complete records end"""
+        records = []
+        offset = 0
+        size = self._LENGTH.size
+        while offset + size <= len(data):
+            (id_len,) = self._LENGTH.unpack_from(data, offset)
+            key_offset = offset + size + id_len + size
+            if key_offset > len(data):
+                break
+            (key_len,) = self._LENGTH.unpack_from(data, key_offset - size)
+            if key_offset + key_len > len(data):
+                break  # Torn final record, or one still being appended
+            key_id = data[offset + size:offset + size + id_len].decode()
+            records.append((key_id, data[key_offset:key_offset + key_len]))
+            offset = key_offset + key_len
+        return records, offset
+    
+    def _append_records(self, records: List[Tuple[str, bytes]]):
+        """Append records the keystore doesn't hold yet and sync them to disk"""
+        # Appends are serialized across processes, so a torn tail seen here
+        # is left by a crashed writer and is safe to cut off
+        with open(os.path.join(self.key_store_path, self.KEYSTORE_FILE), 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            existing, end = self._parse(f.read())
+            if end < f.tell():
+                f.truncate(end)
+            known = {key_id for key_id, _ in existing}
+            f.write(b"".join(
+                self._pack(key_id, key) for key_id, key in records if key_id not in known
+            ))
+            f.flush()
+            os.fsync(f.fileno())
+    
     def _load_keys(self):
-        """Load encryption keys from storage"""
-        key_files = os.listdir(self.key_store_path)
-        for key_file in key_files:
-            if key_file.endswith('.key'):
-                key_id = key_file[:-4]
-                with open(os.path.join(self.key_store_path, key_file), 'rb') as f:
-                    self.keys[key_id] = f.read()
-                if not self.active_key_id:
-                    self.active_key_id = key_id
+        """Load encryption keys from storage; the newest key becomes active"""
+        keystore_path = os.path.join(self.key_store_path, self.KEYSTORE_FILE)
+        if not os.path.exists(keystore_path):
+            self._migrate_key_files()
+            return
+        
+        # A partial record at the end is another process's append in flight
+        with open(keystore_path, 'rb') as f:
+            records, _ = self._parse(f.read())
+        for key_id, key in records:
+            self.keys[key_id] = key
+            self.active_key_id = key_id
+    
+    def _migrate_key_files(self):
+        """Load keys saved one per file by earlier versions into the keystore"""
+        key_ids = sorted(
+            key_file[:-4] for key_file in os.listdir(self.key_store_path)
+            if key_file.endswith('.key')
+        )
+        for key_id in key_ids:
+            with open(os.path.join(self.key_store_path, f"{key_id}.key"), 'rb') as f:
+                self.keys[key_id] = f.read()
+            self.active_key_id = key_id
+        if key_ids:
+            self._append_records([(key_id, self.keys[key_id]) for key_id in key_ids])
     
     def generate_key(self) -> str:
         """Generate a new encryption key"""
-        key_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # The random suffix keeps ids unique when keys rotate within a second
+        key_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.urandom(4).hex()}"
         key = os.urandom(32)  # 256-bit key
         
         # Save key to storage
-        key_path = os.path.join(self.key_store_path, f"{key_id}.key")
-        with open(key_path, 'wb') as f:
-            f.write(key)
+        self._append_records([(key_id, key)])
         
         self.keys[key_id] = key
         self.active_key_id = key_id
@@ -59,6 +126,22 @@ class KeyManager:
     def get_key(self, key_id: str) -> Optional[bytes]:
         """Get a specific encryption key by ID"""
         return self.keys.get(key_id)
+    
+    def get_cipher(self, key_id: str, algorithm: EncryptionAlgorithm):
+        """Get the cached cipher for a key and algorithm"""
+        cipher = self._ciphers.get((key_id, algorithm))
+        if cipher is None:
+            key = self.keys.get(key_id)
+            if key is None:
+                raise ValueError(f"Key not found: {key_id}")
+            if algorithm == EncryptionAlgorithm.AES_256_GCM:
+                cipher = AESGCM(key)
+            elif algorithm == EncryptionAlgorithm.CHACHA20_POLY1305:
+                cipher = ChaCha20Poly1305(key)
+            else:
+                raise ValueError(f"Unsupported algorithm: {algorithm}")
+            self._ciphers[(key_id, algorithm)] = cipher
+        return cipher
 
 class EncryptionService:
     """Handles data encryption and decryption"""
@@ -66,14 +149,9 @@ class EncryptionService:
     def __init__(self):
         self.key_manager = KeyManager()
     
-    def _get_cipher(self, algorithm: EncryptionAlgorithm, key: bytes):
+    def _get_cipher(self, algorithm: EncryptionAlgorithm, key_id: str):
         """Get the appropriate cipher based on algorithm"""
-        if algorithm == EncryptionAlgorithm.AES_256_GCM:
-            return AESGCM(key)
-        elif algorithm == EncryptionAlgorithm.CHACHA20_POLY1305:
-            return ChaCha20Poly1305(key)
-        else:
-            raise ValueError(f"Unsupported algorithm: {algorithm}")
+        return self.key_manager.get_cipher(key_id, algorithm)
     
     def encrypt(
         self,
@@ -84,11 +162,11 @@ class EncryptionService:
         Encrypt data using the specified algorithm.
         Returns EncryptedData model with all necessary information for decryption.
         """
-        key_id, key = self.key_manager.get_active_key()
-        cipher = self._get_cipher(algorithm, key)
+        key_id, _ = self.key_manager.get_active_key()
+        cipher = self._get_cipher(algorithm, key_id)
         
         # Convert data to bytes
-        data_bytes = json.dumps(data).encode()
+        data_bytes = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
         
         # Generate nonce
         nonce = os.urandom(12)  # 96 bits as recommended for GCM
@@ -98,8 +176,7 @@ class EncryptionService:
         
         return EncryptedData(
             algorithm=algorithm,
-            ciphertext=ciphertext[:-16],  # Separate ciphertext from tag
-            tag=ciphertext[-16:],  # Last 16 bytes are the authentication tag
+            ciphertext=ciphertext,  # Tag stays appended, as the AEAD returns it
             nonce=nonce,
             key_id=key_id
         )
@@ -109,23 +186,16 @@ class EncryptionService:
         Decrypt data using the stored encryption parameters.
         Returns the original data dictionary.
         """
-        key = self.key_manager.get_key(encrypted_data.key_id)
-        if not key:
-            raise ValueError(f"Key not found: {encrypted_data.key_id}")
-        
-        cipher = self._get_cipher(encrypted_data.algorithm, key)
-        
-        # Combine ciphertext and tag
-        ciphertext_with_tag = encrypted_data.ciphertext + encrypted_data.tag
+        cipher = self._get_cipher(encrypted_data.algorithm, encrypted_data.key_id)
         
         # Decrypt data
         try:
             decrypted_bytes = cipher.decrypt(
                 encrypted_data.nonce,
-                ciphertext_with_tag,
+                encrypted_data.ciphertext,
                 None
             )
-            return json.loads(decrypted_bytes.decode())
+            return orjson.loads(decrypted_bytes)
         except Exception as e:
             raise ValueError(f"Decryption failed: {str(e)}")
     
@@ -153,19 +223,17 @@ class PasswordHasher:
     def __init__(self, iterations: int = 100000):
         self.iterations = iterations
     
+    def _derive(self, password: str, salt: bytes) -> bytes:
+        # hashlib runs PBKDF2 in OpenSSL with the GIL released
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.iterations, dklen=32)
+    
     def hash_password(self, password: str) -> Tuple[str, str]:
         """
         Hash a password using PBKDF2 with a random salt.
         Returns (hash, salt) both base64 encoded.
         """
         salt = os.urandom(16)
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=self.iterations,
-        )
-        hash_bytes = kdf.derive(password.encode())
+        hash_bytes = self._derive(password, salt)
         return (
             base64.b64encode(hash_bytes).decode(),
             base64.b64encode(salt).decode()
@@ -178,18 +246,22 @@ class PasswordHasher:
         salt_b64: str
     ) -> bool:
         """Verify a password against its hash and salt"""
-        hash_bytes = base64.b64decode(hash_b64)
-        salt = base64.b64decode(salt_b64)
-        
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=self.iterations,
-        )
-        
         try:
-            kdf.verify(password.encode(), hash_bytes)
-            return True
-        except:
+            hash_bytes = base64.b64decode(hash_b64)
+            salt = base64.b64decode(salt_b64)
+        except ValueError:
             return False
+        return hmac.compare_digest(self._derive(password, salt), hash_bytes)
+    
+    async def hash_password_async(self, password: str) -> Tuple[str, str]:
+        """hash_password on a worker thread so the event loop keeps serving requests"""
+        return await asyncio.to_thread(self.hash_password, password)
+    
+    async def verify_password_async(
+        self,
+        password: str,
+        hash_b64: str,
+        salt_b64: str
+    ) -> bool:
+        """verify_password on a worker thread so the event loop keeps serving requests"""
+        return await asyncio.to_thread(self.verify_password, password, hash_b64, salt_b64)
@@ -2,10 +2,10 @@
 Models for the security system components.
 """
 
-from pydantic import BaseModel, Field, EmailStr, SecretStr
-from typing import List, Dict, Optional, Set
+from pydantic import BaseModel, Field, EmailStr, SecretStr, field_validator, model_validator
+from typing import Any, List, Dict, FrozenSet, Optional, Set
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
 
 class Role(str, Enum):
@@ -48,23 +48,40 @@ class User(BaseModel):
 class ApiKey(BaseModel):
     """API key for service authentication"""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    key: SecretStr
+    key: Optional[SecretStr] = None  # Plaintext, only on the copy returned at creation
+    key_hash: str
     name: str
     user_id: str
     permissions: Set[Permission]
     expires_at: Optional[datetime] = None
-    created_at: datetime = Field(default_factory=datetime.now)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     last_used: Optional[datetime] = None
+    
+    @field_validator("expires_at", "created_at", "last_used")
+    @classmethod
+    def _as_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        """Make timestamps timezone-aware; older records hold naive local times"""
+        if value is not None and value.tzinfo is None:
+            return value.astimezone(timezone.utc)
+        return value
 
 class EncryptedData(BaseModel):
     """Model for encrypted data storage"""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     algorithm: EncryptionAlgorithm
-    ciphertext: bytes
+    ciphertext: bytes  # AEAD output: ciphertext followed by the 16-byte tag
     nonce: bytes
-    tag: bytes
     key_id: str
     created_at: datetime = Field(default_factory=datetime.now)
+    
+    @model_validator(mode="before")
+    @classmethod
+    def _join_legacy_tag(cls, data: Any) -> Any:
+        """Fold the separate tag of older records back onto the ciphertext"""
+        if isinstance(data, dict) and data.get("tag"):
+            data = dict(data)
+            data["ciphertext"] = data["ciphertext"] + data.pop("tag")
+        return data
 
 class AccessLog(BaseModel):
     """Security audit log entry"""
@@ -148,3 +165,8 @@ DEFAULT_ROLE_PERMISSIONS = [
         }
     )
 ]
+
+# Permissions granted by each role, for hash lookups instead of scanning the mapping list
+ROLE_TO_PERMS: Dict[Role, FrozenSet[Permission]] = {
+    mapping.role: frozenset(mapping.permissions) for mapping in DEFAULT_ROLE_PERMISSIONS
+}
@@ -0,0 +1,67 @@
+import pytest
+import orjson
+from datetime import timedelta
+from fastapi import HTTPException
+from src.security import auth
+from src.security.auth import AuthService
+from src.security.models import Role, SecurityConfig
+
+def _service(tmp_path):
+    service = AuthService(str(tmp_path), SecurityConfig(jwt_secret="test-secret"))
+    service.LAST_USED_FLUSH_INTERVAL = 0
+    return service
+
+def _user(service):
+    return service.create_user("qa@example.com", "Password123!", "QA", {Role.QA_ENGINEER})
+
+@pytest.mark.asyncio
+async def test_api_key_is_validated_and_stored_hashed(tmp_path):
+    service = _service(tmp_path)
+    user = _user(service)
+    key = service.create_api_key(user.id, "ci").key.get_secret_value()
+
+    assert key.encode() not in (tmp_path / "api_keys.json").read_bytes()
+    assert (await service.get_api_key_user(key)).id == user.id
+    await service._flush_task
+
+    # A fresh service finds the key by its digest
+    assert (await _service(tmp_path).get_api_key_user(key)).id == user.id
+    with pytest.raises(HTTPException) as error:
+        await service.get_api_key_user("ak_unknown")
+    assert error.value.status_code == 401
+
+@pytest.mark.asyncio
+async def test_expired_api_key_is_rejected(tmp_path):
+    service = _service(tmp_path)
+    api_key = service.create_api_key(_user(service).id, "ci")
+    stored = next(iter(service.api_keys.values()))
+    stored.expires_at = stored.created_at - timedelta(seconds=1)
+
+    with pytest.raises(HTTPException) as error:
+        await service.get_api_key_user(api_key.key.get_secret_value())
+    assert error.value.detail == "API key expired"
+
+def test_plaintext_api_keys_are_migrated_on_load(tmp_path):
+    (tmp_path / "api_keys.json").write_bytes(orjson.dumps([
+        {"key": "ak_legacy", "name": "old", "user_id": "u1", "permissions": []},
+        {"id": "broken", "name": "no key"}
+    ]))
+
+    service = _service(tmp_path)
+
+    assert len(service.api_keys) == 1
+    assert b"ak_legacy" not in (tmp_path / "api_keys.json").read_bytes()
+
+@pytest.mark.asyncio
+async def test_verified_jwt_payloads_are_cached(tmp_path, monkeypatch):
+    service = _service(tmp_path)
+    user = _user(service)
+    token = service.create_access_token(user.id)
+
+    decode = auth.jwt.decode
+    calls = []
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: calls.append(1) or decode(*a, **kw))
+
+    assert (await service.get_current_user(token)).id == user.id
+    assert (await service.get_current_user(token)).id == user.id
+    assert len(calls) == 1
@@ -0,0 +1,130 @@
+import pytest
+from src.healing.service import HealingService
+from src.healing.models import (
+    HealingAttempt, HealingHistory, ElementSnapshot, ElementAttributes, LocatorType,
+    MAX_HEALING_ATTEMPTS
+)
+
+def test_stats_track_strategy_success_rate(tmp_path):
+    service = HealingService(storage_path=str(tmp_path))
+    for success, confidence in [(True, 0.9), (True, 0.5), (False, 0.1)]:
+        service._record_attempt_stats(HealingAttempt(
+            original_locator="#login",
+            healed_locator="#sign-in" if success else None,
+            success=success,
+            strategy_used="attribute",
+            confidence_score=confidence
+        ))
+    
+    stats = service.get_stats()
+    assert stats.total_attempts == 3
+    assert stats.successful_attempts == 2
+    assert stats.strategy_success_rates["attribute"] == 2 / 3
+    assert abs(stats.average_confidence_score - 0.5) < 1e-9
+
+class _FixedStrategy:
+    def __init__(self, name, weight, result):
+        self.name = name
+        self.weight = weight
+        self.result = result
+    
+    async def heal(self, page, snapshot, dom_snapshot):
+        return self.result
+
+class _FakePage:
+    url = "https://example.test/login"
+    
+    def __init__(self, present):
+        self.present = present
+        self.checked = []
+    
+    async def evaluate(self, script):
+        return 0
+    
+    async def content(self):
+        return "<html><body></body></html>"
+    
+    def locator(self, selector):
+        return _FakeLocator(self, selector)
+
+class _FakeLocator:
+    def __init__(self, page, selector):
+        self.page = page
+        self.selector = selector
+    
+    async def count(self):
+        self.page.checked.append(self.selector)
+        return int(self.selector in self.page.present)
+
+@pytest.mark.asyncio
+async def test_heal_locator_verifies_best_candidate_first(tmp_path):
+    service = HealingService(storage_path=str(tmp_path))
+    service.strategies = [
+        _FixedStrategy("low", 0.5, ("#low", 1.0)),
+        _FixedStrategy("high", 1.0, ("#high", 0.9)),
+        _FixedStrategy("none", 1.0, (None, 0.0))
+    ]
+    page = _FakePage(present={"#low", "#high"})
+    snapshot = ElementSnapshot(
+        locator="#old",
+        locator_type=LocatorType.ID,
+        attributes=ElementAttributes(tag_name="button"),
+        xpath_path="/html[1]/body[1]/button[1]",
+        parent_chain=[]
+    )
+    
+    healed_locator, confidence = await service.heal_locator(page, "#old", snapshot)
+    await service.flush()
+    
+    assert (healed_locator, confidence) == ("#high", 0.9)
+    assert page.checked == ["#high"]
+
+@pytest.mark.asyncio
+async def test_heal_locator_verifies_exact_id_match(tmp_path):
+    service = HealingService(storage_path=str(tmp_path))
+    service.strategies = [_FixedStrategy("text", 0.8, ("#submit", 1.0))]
+    page = _FakePage(present=set())
+    snapshot = ElementSnapshot(
+        locator="#old",
+        locator_type=LocatorType.ID,
+        attributes=ElementAttributes(tag_name="button"),
+        xpath_path="/html[1]/body[1]/button[1]",
+        parent_chain=[]
+    )
+    
+    healed_locator, confidence = await service.heal_locator(page, "#old", snapshot)
+    await service.flush()
+    
+    assert (healed_locator, confidence) == (None, 0.0)
+    assert page.checked == ["#submit"]
+
+def test_history_trims_attempts_but_keeps_totals(tmp_path):
+    service = HealingService(storage_path=str(tmp_path))
+    history = HealingHistory(
+        original_locator="#old",
+        element_snapshot=ElementSnapshot(
+            locator="#old",
+            locator_type=LocatorType.ID,
+            attributes=ElementAttributes(tag_name="button"),
+            xpath_path="/html[1]/body[1]/button[1]",
+            parent_chain=[]
+        )
+    )
+    for i in range(MAX_HEALING_ATTEMPTS + 44):
+        history.record(HealingAttempt(
+            original_locator="#old",
+            healed_locator="#new" if i % 2 else None,
+            success=bool(i % 2),
+            strategy_used="xpath",
+            confidence_score=0.5
+        ))
+    service.healing_history["#old"] = history
+    service._save_history()
+    
+    reloaded = HealingService(storage_path=str(tmp_path))
+    assert len(reloaded.get_history("#old").healing_attempts) == MAX_HEALING_ATTEMPTS
+    stats = reloaded.get_stats()
+    assert stats.total_attempts == MAX_HEALING_ATTEMPTS + 44
+    assert stats.successful_attempts == (MAX_HEALING_ATTEMPTS + 44) // 2
+    assert stats.strategy_success_rates["xpath"] == 0.5
+    assert abs(stats.average_confidence_score - 0.5) < 1e-9
@@ -0,0 +1,21 @@
+import uuid
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from src.rag.ingestion import COLLECTION_NAME, _delete_stale_points
+
+def test_reingest_removes_uuid_and_surplus_points():
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        COLLECTION_NAME,
+        vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE)
+    )
+    # Points from a collection built by Qdrant.from_documents, then a positional re-ingest
+    legacy = [str(uuid.uuid4()) for _ in range(3)]
+    client.upsert(COLLECTION_NAME, [
+        models.PointStruct(id=point_id, vector=[1.0, 0.5]) for point_id in legacy + [0, 1, 2]
+    ])
+
+    _delete_stale_points(client, 2)
+
+    ids = {point.id for point in client.scroll(COLLECTION_NAME, limit=100)[0]}
+    assert ids == {0, 1}
@@ -0,0 +1,10 @@
+import numpy as np
+from src.reporting.service import ReportingService
+
+def test_html_report_renders_numpy_metadata(tmp_path):
+    service = ReportingService(storage_path=str(tmp_path))
+    report = service.generate_report([], "Nightly", metadata={"retries": np.int64(3)})
+
+    html = service.generate_html_report(report)
+
+    assert "Nightly" in html
@@ -0,0 +1,55 @@
+from src.rag.cache import SemanticCache, FuzzyTextCache, EmbeddingCache
+
+def test_semantic_cache_hit_and_miss():
+    cache = SemanticCache(threshold=0.9)
+    cache.insert("QA", [1.0, 0.0, 0.0], "login defects")
+    
+    # Near-identical vector is served from cache
+    assert cache.lookup("QA", [0.99, 0.05, 0.0]) == "login defects"
+    
+    # Dissimilar vector and other namespaces miss
+    assert cache.lookup("QA", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("OTHER", [1.0, 0.0, 0.0]) is None
+
+def test_semantic_cache_expires_entries():
+    cache = SemanticCache(ttl_seconds=-1)
+    cache.insert("QA", [1.0, 0.0], "stale")
+    assert cache.lookup("QA", [1.0, 0.0]) is None
+
+def test_fuzzy_text_cache_matches_small_edits():
+    cache = FuzzyTextCache(min_ratio=90, max_entries=2)
+    cache.insert("QA", "As a user, I want to export my dashboard", "ctx")
+    
+    assert cache.lookup("QA", "As a user, I want to exprot my dashboard") == "ctx"
+    assert cache.lookup("QA", "Completely unrelated story") is None
+    
+    # Least recently used entry is evicted
+    cache.insert("QA", "second", "b")
+    cache.insert("QA", "third", "c")
+    assert cache.lookup("QA", "As a user, I want to export my dashboard") is None
+
+def test_fuzzy_text_cache_expires_entries(monkeypatch):
+    cache = FuzzyTextCache(ttl_seconds=60)
+    now = [1000.0]
+    monkeypatch.setattr("src.rag.cache.time.monotonic", lambda: now[0])
+    cache.insert("QA", "export dashboard", "ctx")
+    
+    assert cache.lookup("QA", "export dashboard") == "ctx"
+    now[0] += 61
+    assert cache.lookup("QA", "export dashboard") is None
+
+def test_embedding_cache_is_keyed_by_model_and_text(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache("small", path)
+    cache.put_many(["login fails"], [[0.5, 0.25]])
+    
+    assert cache.get_many(["login fails", "new defect"]) == [[0.5, 0.25], None]
+    assert EmbeddingCache("large", path).get_many(["login fails"]) == [None]
+
+def test_embedding_cache_serves_repeats_from_memory(tmp_path):
+    cache = EmbeddingCache("small", str(tmp_path / "embeddings.sqlite3"), max_memory_entries=1)
+    cache.put_many(["a", "b"], [[1.0], [2.0]])
+    
+    # Only the most recent entry stays in memory; the other is read from disk
+    assert cache.get_many(["b", "a", "c"]) == [[2.0], [1.0], None]
+    assert cache.stats() == {"hits": 2, "misses": 1, "memory_entries": 1}